@@ -0,0 +1,161 @@
+import random
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, delete, func
+from app import app, db
+from models import (Course, Lesson, Quiz, Question, QuizAttempt, QuestionStat, QuizStat,
+                    QuizScoreBucket, CourseCompletionStat, Enrollment)
+from db_helpers import upsert_insert
+from progress import course_completion_stats
+
+SCORE_BUCKETS = 10
+
+
+def score_bucket(percentage):
+    return min(int(percentage // (100 / SCORE_BUCKETS)), SCORE_BUCKETS - 1)
+
+
+def _increment(model, key_columns, rows, counter_columns):
+    # One multi-row INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col
+    if not rows:
+        return
+    stmt = upsert_insert(model.__table__).values(rows)
+    table = model.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + stmt.excluded[column] for column in counter_columns},
+    )
+    db.session.execute(stmt)
+
+
+def record_attempt(user_id, quiz, results):
+    """Store a graded attempt and fold it into the running aggregates.
+
+    ``results`` is a list of ``(question_id, is_correct)`` pairs.
+    """
+    total = len(results)
+    score = sum(1 for _, is_correct in results if is_correct)
+    percentage = (score / total) * 100 if total else 0.0
+    shard = random.randrange(app.config['ANALYTICS_SHARDS'])
+
+    db.session.add(QuizAttempt(user_id=user_id, quiz_id=quiz.id, score=score, total=total))
+    _increment(QuestionStat, ['question_id', 'shard'], [
+        {'question_id': question_id, 'shard': shard, 'attempts': 1, 'correct': int(is_correct)}
+        for question_id, is_correct in results
+    ], ['attempts', 'correct'])
+    _increment(QuizStat, ['quiz_id', 'shard'], [
+        {'quiz_id': quiz.id, 'shard': shard, 'attempts': 1, 'percentage_sum': percentage}
+    ], ['attempts', 'percentage_sum'])
+    _increment(QuizScoreBucket, ['quiz_id', 'bucket', 'shard'], [
+        {'quiz_id': quiz.id, 'bucket': score_bucket(percentage), 'shard': shard, 'count': 1}
+    ], ['count'])
+    db.session.commit()
+    return score, total, percentage
+
+
+def _fold_shards(model, key_columns, counter_columns):
+    # DELETE ... RETURNING takes the shard rows atomically, so increments that
+    # land while we compact are never lost: they simply create a fresh shard.
+    returned = [model.__table__.c[name] for name in key_columns + counter_columns]
+    rows = db.session.execute(delete(model).where(model.shard > 0).returning(*returned)).all()
+    totals = defaultdict(lambda: [0] * len(counter_columns))
+    for row in rows:
+        key = tuple(row[:len(key_columns)])
+        for i, value in enumerate(row[len(key_columns):]):
+            totals[key][i] += value
+    folded = []
+    for key, values in totals.items():
+        entry = dict(zip(key_columns, key))
+        entry['shard'] = 0
+        entry.update(zip(counter_columns, values))
+        folded.append(entry)
+    for start in range(0, len(folded), 500):
+        _increment(model, key_columns + ['shard'], folded[start:start + 500], counter_columns)
+    return len(rows)
+
+
+def refresh_course_completion(course_id):
+    stats = course_completion_stats(course_id)
+    stmt = upsert_insert(CourseCompletionStat.__table__).values(
+        course_id=course_id, students=stats['students'], average=stats['average'],
+        histogram=stats['histogram'], refreshed_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['course_id'],
+        set_={name: stmt.excluded[name] for name in ('students', 'average', 'histogram', 'refreshed_at')},
+    )
+    db.session.execute(stmt)
+
+
+def compact_analytics():
+    """Fold sharded counters into shard 0 and refresh course completion rows."""
+    folded = _fold_shards(QuestionStat, ['question_id'], ['attempts', 'correct'])
+    folded += _fold_shards(QuizStat, ['quiz_id'], ['attempts', 'percentage_sum'])
+    folded += _fold_shards(QuizScoreBucket, ['quiz_id', 'bucket'], ['count'])
+    db.session.commit()
+
+    course_ids = db.session.execute(
+        select(Enrollment.course_id).distinct()
+        .join(Course, Course.id == Enrollment.course_id)
+        .where(Course.deleted_at.is_(None))
+    ).scalars().all()
+    for course_id in course_ids:
+        refresh_course_completion(course_id)
+        db.session.commit()
+    return folded, len(course_ids)
+
+
+def course_dashboard(course_id):
+    """Read the precomputed aggregates for every quiz in a course.
+
+    Each quiz/question contributes at most ANALYTICS_SHARDS rows, so the cost
+    is independent of how many attempts have been graded.
+    """
+    quiz_rows = db.session.execute(
+        select(Quiz.id, Lesson.title, func.sum(QuizStat.attempts), func.sum(QuizStat.percentage_sum))
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .outerjoin(QuizStat, QuizStat.quiz_id == Quiz.id)
+        .where(Lesson.course_id == course_id)
+        .group_by(Quiz.id, Lesson.title, Lesson.position)
+        .order_by(Lesson.position)
+    ).all()
+    quiz_ids = [row[0] for row in quiz_rows]
+
+    buckets = defaultdict(lambda: [0] * SCORE_BUCKETS)
+    for quiz_id, bucket, count in db.session.execute(
+        select(QuizScoreBucket.quiz_id, QuizScoreBucket.bucket, func.sum(QuizScoreBucket.count))
+        .where(QuizScoreBucket.quiz_id.in_(quiz_ids))
+        .group_by(QuizScoreBucket.quiz_id, QuizScoreBucket.bucket)
+    ):
+        buckets[quiz_id][bucket] = int(count)
+
+    questions = defaultdict(list)
+    for quiz_id, question_id, content, attempts, correct in db.session.execute(
+        select(Question.quiz_id, Question.id, Question.content,
+               func.sum(QuestionStat.attempts), func.sum(QuestionStat.correct))
+        .outerjoin(QuestionStat, QuestionStat.question_id == Question.id)
+        .where(Question.quiz_id.in_(quiz_ids))
+        .group_by(Question.quiz_id, Question.id, Question.content)
+        .order_by(Question.id)
+    ):
+        attempts = int(attempts or 0)
+        questions[quiz_id].append({
+            'id': question_id,
+            'content': content,
+            'attempts': attempts,
+            'percent_correct': (int(correct or 0) * 100.0 / attempts) if attempts else None,
+        })
+
+    quizzes = []
+    for quiz_id, lesson_title, attempts, percentage_sum in quiz_rows:
+        attempts = int(attempts or 0)
+        quizzes.append({
+            'id': quiz_id,
+            'lesson_title': lesson_title,
+            'attempts': attempts,
+            'average': (percentage_sum / attempts) if attempts else None,
+            'histogram': buckets[quiz_id],
+            'questions': questions[quiz_id],
+        })
+    completion = db.session.get(CourseCompletionStat, course_id)
+    return {'quizzes': quizzes, 'completion': completion}
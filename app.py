@@ -16,10 +16,66 @@ migrate = Migrate()
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY") or "a secret key"
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///eduplatform.db"
+# With DB_POOL_PING_IDLE_SECONDS set, only connections that sat idle longer
+# than that are pinged on checkout (see pool_metrics.py) instead of all of them.
+app.config["DB_POOL_PING_IDLE_SECONDS"] = float(os.environ.get("DB_POOL_PING_IDLE_SECONDS") or 0)
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
-    "pool_pre_ping": True,
+    "pool_pre_ping": not app.config["DB_POOL_PING_IDLE_SECONDS"],
 }
+# Workers drop pool snapshots here for /metrics and `manage.py pool_stats`.
+app.config["POOL_STATS_DIR"] = os.environ.get("POOL_STATS_DIR") or os.path.join(app.instance_path, 'pool_stats')
+app.config["POOL_STATS_INTERVAL"] = float(os.environ.get("POOL_STATS_INTERVAL") or 10)
+# Bearer token for scraping /metrics; admins can always view it.
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+app.config["ANALYTICS_SHARDS"] = int(os.environ.get("ANALYTICS_SHARDS") or 8)
+# How long (seconds) a worker keeps its hostname -> school map before
+# reloading it, i.e. how soon other workers notice a new school.
+app.config["TENANT_CACHE_TTL"] = float(os.environ.get("TENANT_CACHE_TTL") or 30)
+
+# Server-side sessions: "sql" (default), "redis" or "cookie" for Flask's
+# signed-cookie sessions. The LRU tier holds recently used sessions in-process
+# for SESSION_LRU_TTL seconds.
+app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND") or "sql"
+app.config["SESSION_REDIS_URL"] = os.environ.get("SESSION_REDIS_URL") or "redis://localhost:6379/0"
+app.config["SESSION_LRU_SIZE"] = int(os.environ.get("SESSION_LRU_SIZE") or 10000)
+app.config["SESSION_LRU_TTL"] = float(os.environ.get("SESSION_LRU_TTL") or 5)
+
+# Background tasks (see task_queue.py); times are in seconds.
+app.config["TASK_VISIBILITY_TIMEOUT"] = int(os.environ.get("TASK_VISIBILITY_TIMEOUT") or 300)
+app.config["TASK_RETRY_BASE_SECONDS"] = int(os.environ.get("TASK_RETRY_BASE_SECONDS") or 10)
+app.config["TASK_RETRY_MAX_SECONDS"] = int(os.environ.get("TASK_RETRY_MAX_SECONDS") or 3600)
+
+# Video link metadata (see video_metadata.py). The fetcher is "module:Class"
+# so tests and deployments can swap in their own; timeouts are in seconds.
+app.config["VIDEO_METADATA_FETCHER"] = os.environ.get("VIDEO_METADATA_FETCHER") or "video_metadata:OEmbedFetcher"
+app.config["VIDEO_METADATA_CACHE_DIR"] = os.environ.get("VIDEO_METADATA_CACHE_DIR") or os.path.join(app.instance_path, 'video_cache')
+app.config["VIDEO_METADATA_CACHE_TTL"] = int(os.environ.get("VIDEO_METADATA_CACHE_TTL") or 7 * 24 * 3600)
+app.config["VIDEO_METADATA_TIMEOUT"] = float(os.environ.get("VIDEO_METADATA_TIMEOUT") or 5)
+app.config["VIDEO_METADATA_CONCURRENCY"] = int(os.environ.get("VIDEO_METADATA_CONCURRENCY") or 4)
+
+# Allocation profiling (see memory_profiling.py): comma-separated endpoint
+# names to always profile, and/or the fraction of other requests to sample.
+app.config["MEMORY_PROFILE_ENDPOINTS"] = os.environ.get("MEMORY_PROFILE_ENDPOINTS") or ""
+app.config["MEMORY_PROFILE_SAMPLE_RATE"] = float(os.environ.get("MEMORY_PROFILE_SAMPLE_RATE") or 0)
+app.config["MEMORY_PROFILE_TOP"] = int(os.environ.get("MEMORY_PROFILE_TOP") or 10)
+app.config["MEMORY_PROFILE_FRAMES"] = int(os.environ.get("MEMORY_PROFILE_FRAMES") or 5)
+app.config["MEMORY_PROFILE_TRACE_ALWAYS"] = os.environ.get("MEMORY_PROFILE_TRACE_ALWAYS") == "1"
+app.config["MEMORY_PROFILE_DIR"] = os.environ.get("MEMORY_PROFILE_DIR") or os.path.join(app.instance_path, 'memory_profiles')
+
+# Sampling CPU profiler (see cpu_profiler.py); off until started from
+# /admin/profiler or `manage.py cpu_profile`.
+app.config["CPU_PROFILE_INTERVAL"] = float(os.environ.get("CPU_PROFILE_INTERVAL") or 0.01)
+app.config["CPU_PROFILE_DIR"] = os.environ.get("CPU_PROFILE_DIR") or os.path.join(app.instance_path, 'cpu_profiles')
+
+# Course recommendations (see recommendations.py), rebuilt by
+# `manage.py refresh_recommendations`. TEXT_WEIGHT is the share of title and
+# description similarity in the blend; the rest comes from enrollments and
+# quiz attempts.
+app.config["RECOMMENDATION_NEIGHBORS"] = int(os.environ.get("RECOMMENDATION_NEIGHBORS") or 20)
+app.config["RECOMMENDATIONS_PER_USER"] = int(os.environ.get("RECOMMENDATIONS_PER_USER") or 20)
+app.config["RECOMMENDATION_TEXT_WEIGHT"] = float(os.environ.get("RECOMMENDATION_TEXT_WEIGHT") or 0.3)
+app.config["RECOMMENDATION_QUIZ_WEIGHT"] = float(os.environ.get("RECOMMENDATION_QUIZ_WEIGHT") or 0.5)
 
 # Configure Flask-Uploads
 app.config['UPLOADED_IMAGES_DEST'] = os.path.join(app.root_path, 'static/uploads')
@@ -34,11 +90,31 @@ login_manager.login_view = 'login'
 @login_manager.user_loader
 def load_user(user_id):
     from models import User
-    return User.query.get(int(user_id))
+    # A query rather than get() so the tenant filter applies even when the
+    # user is already in the identity map.
+    return User.query.filter_by(id=int(user_id)).first()
 
 with app.app_context():
+    from pool_metrics import instrument_engine
+    db_pool_metrics = instrument_engine(
+        db.engine,
+        ping_idle_seconds=app.config["DB_POOL_PING_IDLE_SECONDS"],
+        stats_dir=app.config["POOL_STATS_DIR"],
+        interval=app.config["POOL_STATS_INTERVAL"],
+    )
     import models
     db.create_all()
+    from tenancy import ensure_default_tenant
+    ensure_default_tenant()
+
+from session_store import init_session_interface
+init_session_interface(app)
+
+from memory_profiling import init_memory_profiler
+memory_profiler = init_memory_profiler(app)
+
+from cpu_profiler import init_cpu_profiler
+cpu_profiler = init_cpu_profiler(app)
 
 from routes import *
 
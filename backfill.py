@@ -0,0 +1,85 @@
+"""Chunked data backfills with checkpoints.
+
+A backfill walks one table in primary-key order, ``batch_size`` ids at a
+time, and hands each batch of ids to its function. Every batch commits in
+its own transaction together with the checkpoint row, so a run can be
+stopped at any point (or limited with ``max_batches``) and picks up after
+the last committed batch next time. Run them with ``manage.py backfill``.
+"""
+import time
+from datetime import datetime
+from sqlalchemy import select, update
+from app import db
+from models import BackfillCheckpoint, Course, Lesson, User
+from content import render_lesson
+
+BACKFILLS = {}
+
+
+def backfill(name, model):
+    """Register ``fn(ids)`` as backfill ``name`` over ``model``'s rows."""
+    def decorator(fn):
+        fn.backfill_model = model
+        BACKFILLS[name] = fn
+        return fn
+    return decorator
+
+
+def get_checkpoint(name):
+    return db.session.get(BackfillCheckpoint, name)
+
+
+def reset_checkpoint(name):
+    db.session.execute(db.delete(BackfillCheckpoint).where(BackfillCheckpoint.name == name))
+    db.session.commit()
+
+
+def run_backfill(name, batch_size=1000, sleep=0, max_batches=None):
+    """Process batches until the table is exhausted or ``max_batches`` ran.
+
+    Returns the checkpoint; ``finished_at`` is set once the last id is done.
+    """
+    fn = BACKFILLS[name]
+    model = fn.backfill_model
+    checkpoint = get_checkpoint(name)
+    if checkpoint is None:
+        checkpoint = BackfillCheckpoint(name=name, last_id=0, rows=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    batches = 0
+    while checkpoint.finished_at is None and (max_batches is None or batches < max_batches):
+        ids = db.session.execute(
+            select(model.id).where(model.id > checkpoint.last_id).order_by(model.id).limit(batch_size),
+            execution_options={'all_tenants': True},
+        ).scalars().all()
+        if ids:
+            fn(ids)
+            checkpoint.last_id = ids[-1]
+            checkpoint.rows += len(ids)
+        if len(ids) < batch_size:
+            checkpoint.finished_at = datetime.utcnow()
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+        batches += 1
+        if sleep and checkpoint.finished_at is None:
+            # Leave room for production traffic between batches.
+            time.sleep(sleep)
+    return checkpoint
+
+
+@backfill('course_tenant', Course)
+def course_tenant(ids):
+    """Move courses into their teacher's school."""
+    teacher_tenant = select(User.tenant_id).where(User.id == Course.teacher_id).scalar_subquery()
+    db.session.execute(
+        update(Course).where(Course.id.in_(ids), Course.tenant_id != teacher_tenant)
+        .values(tenant_id=teacher_tenant)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@backfill('lesson_content', Lesson)
+def lesson_content(ids):
+    """Compile lessons saved before content rendering existed (or by an older renderer)."""
+    for lesson in Lesson.query.filter(Lesson.id.in_(ids)):
+        render_lesson(lesson)
@@ -0,0 +1,103 @@
+"""Measure the overhead of the sampling CPU profiler on request handling.
+
+Usage: python benchmarks/bench_cpu_profiler.py [--requests N] [--repeat N] [--max-overhead PCT]
+
+Replays course pages through the test client with the profiler stopped and
+running, alternating the two so drift affects both equally, and compares the
+cheapest run of each. Runs are measured in process CPU time, which includes
+the sampler thread and is far less noisy than wall time on shared machines.
+Also reports the cost of a single sample, which bounds the overhead at any
+load: cost per sample / interval. Exits non-zero if either figure exceeds
+--max-overhead.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, cpu_profiler
+from models import User, Course, Lesson
+from werkzeug.security import generate_password_hash
+
+
+def seed():
+    teacher = User.query.filter_by(email='bench-teacher@example.com').first()
+    if teacher is None:
+        teacher = User(username='bench-teacher', email='bench-teacher@example.com', is_teacher=True,
+                       password_hash=generate_password_hash('password123'))
+        course = Course(title='Benchmarking', description='Profiling course pages', teacher=teacher)
+        course.lessons = [Lesson(title=f'Lesson {i}', content=f'Lesson *{i}* ' * 50, position=i) for i in range(30)]
+        db.session.add_all([teacher, course])
+        db.session.commit()
+    return Course.query.filter_by(teacher_id=teacher.id).first().id
+
+
+def run_requests(client, paths, requests):
+    start = time.process_time()
+    for _ in range(requests):
+        for path in paths:
+            client.get(path)
+    return time.process_time() - start
+
+
+def sample_cost(depth=60, samples=2000):
+    """Seconds of CPU one sample takes with a single request ``depth`` frames deep."""
+    from cpu_profiler import SamplingProfiler
+    profiler = SamplingProfiler()
+
+    def recurse(n):
+        if n:
+            return recurse(n - 1)
+        profiler.enter('bench')
+        start = time.process_time()
+        for _ in range(samples):
+            profiler.sample()
+        elapsed = time.process_time() - start
+        profiler.exit()
+        return elapsed / samples
+
+    return recurse(depth)
+
+
+def measure_overhead(requests=200, repeat=5, interval=0.01):
+    """Return (seconds without profiler, seconds with profiler, overhead %)."""
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        course_id = seed()
+    paths = ['/', f'/course/{course_id}']
+    client = app.test_client()
+    run_requests(client, paths, requests // 10)  # warm up
+    baseline, profiled = [], []
+    for _ in range(repeat):
+        baseline.append(run_requests(client, paths, requests))
+        cpu_profiler.start(interval=interval)
+        try:
+            profiled.append(run_requests(client, paths, requests))
+        finally:
+            cpu_profiler.stop()
+    off, on = min(baseline), min(profiled)
+    return off, on, (on - off) / off * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--max-overhead', type=float, default=2.0)
+    args = parser.parse_args()
+    cost = sample_cost()
+    bound = cost / args.interval * 100
+    print(f"one sample: {cost * 1e6:.1f} us   -> at most {bound:.2f}% of a core at {args.interval * 1000:g} ms intervals")
+    off, on, overhead = measure_overhead(args.requests, args.repeat, args.interval)
+    samples = cpu_profiler.sample_count
+    print(f"profiler off {off:.3f}s   on {on:.3f}s   overhead {overhead:+.2f}%   ({samples} samples in last run)")
+    if overhead > args.max_overhead or bound > args.max_overhead:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
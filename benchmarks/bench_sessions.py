@@ -0,0 +1,73 @@
+"""Compare signed-cookie sessions with the server-side session store.
+
+Usage: python benchmarks/bench_sessions.py [--requests N]
+
+Logs a user in through the test client and replays requests against a few
+endpoints, reporting mean latency and the size of the cookie sent back by
+the browser on every request.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.sessions import SecureCookieSessionInterface
+from app import app, db
+from models import User
+from session_store import LRUCache, SQLSessionStore, ServerSideSessionInterface
+from werkzeug.security import generate_password_hash
+
+ENDPOINTS = ['/', '/profile', '/static/css/custom.css']
+
+
+def make_interfaces():
+    return {
+        'cookie': SecureCookieSessionInterface(),
+        'server (LRU hit)': ServerSideSessionInterface(SQLSessionStore(), LRUCache(ttl=3600)),
+        'server (no LRU)': ServerSideSessionInterface(SQLSessionStore(), LRUCache(maxsize=0)),
+    }
+
+
+def run(name, interface, requests):
+    app.session_interface = interface
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'password123'})
+    cookie = client.get_cookie('session')
+    cookie_bytes = len(cookie.value) if cookie else 0
+    for path in ENDPOINTS:
+        client.get(path)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        elapsed = (time.perf_counter() - start) / requests
+        print(f"{name:<18} {path:<26} {elapsed * 1e6:>9.1f} us/request   cookie {cookie_bytes:>4} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        if not User.query.filter_by(email='bench@example.com').first():
+            db.session.add(User(username='bench', email='bench@example.com',
+                                password_hash=generate_password_hash('password123')))
+            db.session.commit()
+
+    # Each request must get its own app context (flask_login caches the user
+    # on g), so the runs happen outside the setup context above.
+    original = app.session_interface
+    try:
+        for name, interface in make_interfaces().items():
+            run(name, interface, args.requests)
+    finally:
+        app.session_interface = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import hashlib
+import html
+import re
+import markdown
+import nh3
+from sqlalchemy import select, update, or_
+from app import db
+from models import Lesson
+
+# Bump whenever the Markdown extensions, the sanitizer allow-list or the
+# excerpt rules change; `manage.py rerender_lessons` then rebuilds every
+# lesson whose stored renderer_version is older.
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists', 'nl2br']
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'del', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 'strong', 'sub', 'sup', 'table', 'tbody', 'td',
+    'th', 'thead', 'tr', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'title'},
+    'td': {'align'},
+    'th': {'align'},
+}
+EXCERPT_LENGTH = 200
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_excerpt(clean_html, length=EXCERPT_LENGTH):
+    text = html.unescape(nh3.clean(clean_html, tags=set()))
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(' ', 1)[0]
+    return cut.rstrip(' .,;:') + '…'
+
+
+def render_content(text):
+    """Compile lesson Markdown to sanitized HTML and a plain-text excerpt."""
+    raw_html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    clean_html = nh3.clean(raw_html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                           url_schemes={'http', 'https', 'mailto'}, link_rel='noopener noreferrer nofollow')
+    return clean_html, make_excerpt(clean_html)
+
+
+def rendered_fields(text, current_hash=None, current_version=None):
+    """Column values for a lesson's compiled content, or None if up to date."""
+    digest = content_hash(text)
+    if digest == current_hash and current_version == RENDERER_VERSION:
+        return None
+    clean_html, excerpt = render_content(text)
+    return {'content_html': clean_html, 'content_excerpt': excerpt,
+            'content_hash': digest, 'renderer_version': RENDERER_VERSION}
+
+
+def render_lesson(lesson):
+    fields = rendered_fields(lesson.content, lesson.content_hash, lesson.renderer_version)
+    if fields:
+        for name, value in fields.items():
+            setattr(lesson, name, value)
+    return bool(fields)
+
+
+def rerender_lessons(batch_size=500, force=False):
+    """Re-render stale lessons in keyset-paginated batches.
+
+    Only id/content/hash are read and the results are written back with one
+    executemany UPDATE per batch. Returns the number of lessons updated.
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        stmt = select(Lesson.id, Lesson.content, Lesson.content_hash, Lesson.renderer_version).where(Lesson.id > last_id)
+        if not force:
+            stmt = stmt.where(or_(Lesson.renderer_version.is_(None), Lesson.renderer_version != RENDERER_VERSION))
+        rows = db.session.execute(stmt.order_by(Lesson.id).limit(batch_size)).all()
+        if not rows:
+            return updated
+        changes = []
+        for row in rows:
+            fields = rendered_fields(row.content, None if force else row.content_hash, row.renderer_version)
+            if fields:
+                changes.append(dict(fields, id=row.id))
+        if changes:
+            db.session.execute(update(Lesson), changes)
+        db.session.commit()
+        updated += len(changes)
+        last_id = rows[-1].id
@@ -0,0 +1,95 @@
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select, delete, func
+from app import db
+from models import (Course, Lesson, Quiz, Question, Enrollment, QuizAttempt, QuestionStat, QuizStat,
+                    QuizScoreBucket, CourseCompletionStat, CourseNeighbor, UserRecommendation)
+from task_queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 100
+
+
+def soft_delete_course(course):
+    """Hide a course immediately and schedule the purge of its contents."""
+    course.deleted_at = datetime.utcnow()
+    enqueue('purge_course', {'course_id': course.id})
+
+
+def purge_status(course_id):
+    lessons = db.session.scalar(select(func.count(Lesson.id)).where(Lesson.course_id == course_id))
+    enrollments = db.session.scalar(select(func.count(Enrollment.id)).where(Enrollment.course_id == course_id))
+    return {'lessons': lessons, 'enrollments': enrollments}
+
+
+def _purge_lesson_batch(course_id, batch_size):
+    lesson_rows = db.session.execute(
+        select(Lesson.id, Lesson.file_attachment_filename)
+        .where(Lesson.course_id == course_id)
+        .order_by(Lesson.id)
+        .limit(batch_size)
+    ).all()
+    if not lesson_rows:
+        return 0
+    lesson_ids = [row.id for row in lesson_rows]
+    quiz_ids = db.session.execute(select(Quiz.id).where(Quiz.lesson_id.in_(lesson_ids))).scalars().all()
+    if quiz_ids:
+        question_ids = select(Question.id).where(Question.quiz_id.in_(quiz_ids))
+        db.session.execute(delete(QuestionStat).where(QuestionStat.question_id.in_(question_ids)))
+        db.session.execute(delete(Question).where(Question.quiz_id.in_(quiz_ids)))
+        for model in (QuizStat, QuizScoreBucket, QuizAttempt):
+            db.session.execute(delete(model).where(model.quiz_id.in_(quiz_ids)))
+        db.session.execute(delete(Quiz).where(Quiz.id.in_(quiz_ids)))
+    db.session.execute(delete(Lesson).where(Lesson.id.in_(lesson_ids)))
+    for row in lesson_rows:
+        if row.file_attachment_filename:
+            enqueue('delete_upload', {'filename': row.file_attachment_filename})
+    return len(lesson_ids)
+
+
+def _purge_enrollment_batch(course_id, batch_size):
+    ids = db.session.execute(
+        select(Enrollment.id).where(Enrollment.course_id == course_id).limit(batch_size * 10)
+    ).scalars().all()
+    if ids:
+        db.session.execute(delete(Enrollment).where(Enrollment.id.in_(ids)))
+    return len(ids)
+
+
+def purge_course(course_id, batch_size=PURGE_BATCH_SIZE, time_budget=None):
+    """Delete a soft-deleted course's children in bounded batches.
+
+    Every batch is its own transaction of set-based DELETEs, so locks are
+    short-lived and an interrupted purge simply resumes from what is left.
+    Returns True once the course row itself is gone; False if ``time_budget``
+    (seconds) ran out first.
+    """
+    started = time.monotonic()
+    course = db.session.get(Course, course_id)
+    if course is None:
+        return True
+    if course.deleted_at is None:
+        raise ValueError(f"Course {course_id} has not been deleted.")
+
+    while True:
+        removed = _purge_lesson_batch(course_id, batch_size) or _purge_enrollment_batch(course_id, batch_size)
+        if not removed:
+            break
+        db.session.commit()
+        logger.info("Purging course %s: %s", course_id, purge_status(course_id))
+        if time_budget is not None and time.monotonic() - started > time_budget:
+            return False
+
+    image_filename = db.session.scalar(select(Course.image_filename).where(Course.id == course_id))
+    db.session.execute(delete(CourseCompletionStat).where(CourseCompletionStat.course_id == course_id))
+    db.session.execute(delete(CourseNeighbor).where(
+        (CourseNeighbor.course_id == course_id) | (CourseNeighbor.neighbor_id == course_id)))
+    db.session.execute(delete(UserRecommendation).where(UserRecommendation.course_id == course_id))
+    db.session.execute(delete(Course).where(Course.id == course_id))
+    if image_filename:
+        enqueue('delete_upload', {'filename': image_filename})
+    db.session.commit()
+    logger.info("Purged course %s", course_id)
+    return True
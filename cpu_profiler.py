@@ -0,0 +1,235 @@
+"""Sampling CPU profiler for live workers.
+
+A daemon thread wakes every ``interval`` seconds, reads the stack of every
+thread that is serving a request (``sys._current_frames``) and counts it
+under the request's endpoint. Nothing is hooked into function calls, so the
+cost is one stack walk per busy thread per tick whatever the code does. A
+thread sampler is used rather than SIGPROF because signals only ever
+interrupt the main thread, and threaded workers serve requests elsewhere.
+
+Profiles export as collapsed stacks (``endpoint;outer;...;inner count``,
+the input format of flamegraph.pl and speedscope) or as speedscope's own
+JSON. A worker is started and stopped from /admin/profiler, or all workers
+at once with ``manage.py cpu_profile``, which drops a request file in
+CPU_PROFILE_DIR that each worker picks up within a few seconds.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import request
+
+TRIGGER_FILE = 'profile-requested'
+
+
+def frame_label(code):
+    return f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.01, max_depth=64, output_dir=None, trigger_interval=5):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.output_dir = output_dir
+        self.trigger_interval = trigger_interval
+        # Stacks are counted as tuples of code object ids (cheap to hash) and
+        # only turned into labels on export; _codes keeps those codes alive
+        # so their ids cannot be reused.
+        self._stacks = Counter()
+        self._codes = {}
+        # Held by the sampler while it records a tick and by readers while
+        # they copy, so a request never iterates the dicts mid-update.
+        self._lock = threading.Lock()
+        # Thread id -> endpoint of the request it is serving.
+        self.active = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._deadline = None
+        self._last_trigger_check = 0.0
+        self._last_trigger = time.time()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None, interval=None):
+        """Start sampling (a no-op if already running); stops by itself after
+        ``duration`` seconds and writes the profile to ``output_dir``."""
+        if self.running:
+            return False
+        if interval:
+            self.interval = interval
+        with self._lock:
+            self._stacks.clear()
+            self._codes.clear()
+        self._deadline = time.monotonic() + duration if duration else None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cpu-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                self._thread = None
+                if self.output_dir:
+                    self.write(self.output_dir)
+                return
+
+    def sample(self):
+        frames = sys._current_frames()
+        codes = {}
+        stacks = []
+        for thread_id, endpoint in list(self.active.items()):
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = [endpoint]
+            depth = self.max_depth
+            while frame is not None and depth:
+                code = frame.f_code
+                codes[id(code)] = code
+                stack.append(id(code))
+                frame = frame.f_back
+                depth -= 1
+            stacks.append(tuple(stack))
+        with self._lock:
+            self._codes.update(codes)
+            self._stacks.update(stacks)
+
+    def _snapshot(self):
+        with self._lock:
+            return dict(self._stacks), dict(self._codes)
+
+    @property
+    def sample_count(self):
+        stacks, _ = self._snapshot()
+        return sum(stacks.values())
+
+    @property
+    def counts(self):
+        """Samples per stack, as (endpoint, outermost label, ..., innermost label)."""
+        stacks, codes = self._snapshot()
+        labels = {code_id: frame_label(code) for code_id, code in codes.items()}
+        counts = Counter()
+        for (endpoint, *code_ids), count in stacks.items():
+            stack = [endpoint or '(unknown endpoint)']
+            stack.extend(labels[code_id] for code_id in reversed(code_ids))
+            counts[tuple(stack)] += count
+        return counts
+
+    def enter(self, endpoint):
+        self.active[threading.get_ident()] = endpoint
+
+    def exit(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def collapsed(self):
+        return to_collapsed(self.counts)
+
+    def speedscope(self):
+        return to_speedscope(self.counts, self.interval, name=f'worker {os.getpid()}')
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(base + '.collapsed', 'w') as f:
+            f.write(self.collapsed())
+        with open(base + '.speedscope.json', 'w') as f:
+            json.dump(self.speedscope(), f)
+        return [base + '.collapsed', base + '.speedscope.json']
+
+    def check_trigger(self):
+        """Start if ``request_profile`` was called since the last trigger."""
+        now = time.monotonic()
+        if not self.output_dir or now - self._last_trigger_check < self.trigger_interval:
+            return
+        self._last_trigger_check = now
+        try:
+            with open(os.path.join(self.output_dir, TRIGGER_FILE)) as f:
+                options = json.load(f)
+        except (OSError, ValueError):
+            return
+        if options['requested_at'] > self._last_trigger:
+            self._last_trigger = options['requested_at']
+            self.start(duration=options['duration'], interval=options['interval'])
+
+
+def request_profile(directory, duration, interval):
+    """Ask every worker sharing ``directory`` to profile for ``duration`` seconds."""
+    os.makedirs(directory, exist_ok=True)
+    requested_at = time.time()
+    path = os.path.join(directory, TRIGGER_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'requested_at': requested_at, 'duration': duration, 'interval': interval}, f)
+    os.replace(path + '.tmp', path)
+    return requested_at
+
+
+def to_collapsed(counts):
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def parse_collapsed(text, counts=None):
+    counts = Counter() if counts is None else counts
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            counts[tuple(stack.split(';'))] += int(count)
+    return counts
+
+
+def to_speedscope(counts, interval, name='profile'):
+    """A speedscope "sampled" profile; weights are seconds of CPU samples."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in sorted(counts.items()):
+        sample = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count * interval)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'exporter': 'eduplatform cpu_profiler',
+    }
+
+
+def init_cpu_profiler(app):
+    profiler = SamplingProfiler(interval=app.config['CPU_PROFILE_INTERVAL'], output_dir=app.config['CPU_PROFILE_DIR'])
+
+    @app.before_request
+    def track_request_thread():
+        profiler.check_trigger()
+        if profiler.running:
+            profiler.enter(request.endpoint)
+
+    @app.teardown_request
+    def untrack_request_thread(exc=None):
+        if profiler.active:
+            profiler.exit()
+
+    return profiler
@@ -0,0 +1,29 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def upsert_insert(table):
+    # INSERT that supports on_conflict_do_nothing / on_conflict_do_update
+    # on the backends we deploy to (Postgres in production, SQLite locally).
+    name = dialect_name()
+    if name == 'postgresql':
+        return postgresql.insert(table)
+    if name == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {name}")
+
+
+def chunked(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
@@ -0,0 +1,82 @@
+from datetime import datetime
+from sqlalchemy import select, delete, literal
+from app import db
+from models import User, Course, Enrollment
+from db_helpers import upsert_insert, chunked
+
+BULK_ENROLL_BATCH_SIZE = 1000
+
+
+def enroll(user_id, course_id):
+    stmt = upsert_insert(Enrollment.__table__).values(
+        user_id=user_id, course_id=course_id, enrolled_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['user_id', 'course_id'])
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def unenroll(user_id, course_id):
+    result = db.session.execute(
+        delete(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def get_enrollment(user_id, course_id):
+    stmt = select(Enrollment).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
+    return db.session.execute(stmt).scalar_one_or_none()
+
+
+def is_enrolled(user_id, course_id):
+    stmt = select(Enrollment.id).where(Enrollment.user_id == user_id, Enrollment.course_id == course_id)
+    return db.session.execute(stmt).first() is not None
+
+
+def my_courses_query(user_id):
+    # Walks ix_enrollment_user_enrolled in order; only the Course rows of the
+    # requested page are fetched.
+    return (
+        select(Course)
+        .join(Enrollment, Enrollment.course_id == Course.id)
+        .where(Enrollment.user_id == user_id, Course.deleted_at.is_(None))
+        .order_by(Enrollment.enrolled_at.desc(), Enrollment.course_id.desc())
+    )
+
+
+def roster_query(course_id):
+    return (
+        select(User)
+        .join(Enrollment, Enrollment.user_id == User.id)
+        .where(Enrollment.course_id == course_id)
+        .order_by(Enrollment.enrolled_at, Enrollment.user_id)
+    )
+
+
+def bulk_enroll(course_id, user_ids, batch_size=BULK_ENROLL_BATCH_SIZE):
+    """Enroll a stream of user ids into a course in a single transaction.
+
+    ``user_ids`` may be any iterable (e.g. lines of a file); it is consumed in
+    batches so the whole cohort never has to be held in memory. Unknown user
+    ids, users from another tenant and existing enrollments are skipped.
+    Returns the number of new rows.
+    """
+    table = Enrollment.__table__
+    course_tenant = select(Course.tenant_id).where(Course.id == course_id).scalar_subquery()
+    enrolled_at = datetime.utcnow()
+    created = 0
+    try:
+        for batch in chunked(user_ids, batch_size):
+            source = select(
+                User.id, literal(course_id), literal(enrolled_at)
+            ).where(User.id.in_(batch), User.tenant_id == course_tenant)
+            stmt = upsert_insert(table).from_select(
+                ['user_id', 'course_id', 'enrolled_at'], source
+            ).on_conflict_do_nothing(index_elements=['user_id', 'course_id'])
+            created += db.session.execute(stmt).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created
@@ -1,7 +1,11 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, BooleanField, TextAreaField, SubmitField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, URL, Optional
+from wtforms import Form, FieldList, FormField, StringField, PasswordField, BooleanField, TextAreaField, SubmitField, SelectField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, URL, Optional, ValidationError
+from sqlalchemy import select
+from app import db
+from models import User
+from grading import QUESTION_TYPES, build_question, split_answers
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=2, max=20)])
@@ -11,6 +15,21 @@ class RegistrationForm(FlaskForm):
     is_teacher = BooleanField('Register as a teacher')
     submit = SubmitField('Sign Up')
 
+    # Usernames and emails are unique across every school, so the check
+    # looks past the current tenant.
+    def _taken(self, column, value):
+        return db.session.execute(
+            select(User.id).where(column == value), execution_options={'all_tenants': True}
+        ).first() is not None
+
+    def validate_username(self, field):
+        if self._taken(User.username, field.data):
+            raise ValidationError('That username is taken. Please choose a different one.')
+
+    def validate_email(self, field):
+        if self._taken(User.email, field.data):
+            raise ValidationError('Email already registered.')
+
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -30,7 +49,30 @@ class LessonForm(FlaskForm):
     file_attachment = FileField('File Attachment', validators=[Optional(), FileAllowed(['pdf', 'doc', 'docx'], 'Documents only!')])
     submit = SubmitField('Save Lesson')
 
+class QuestionForm(Form):
+    question = TextAreaField('Question', validators=[Optional()])
+    question_type = SelectField('Question Type', choices=QUESTION_TYPES, default='text')
+    choices = TextAreaField('Choices (one per line)', validators=[Optional()])
+    correct_answer = TextAreaField('Correct Answer (one per line for multi-select)')
+    tolerance = StringField('Tolerance (e.g. 0.01 or 1%)', validators=[Optional(), Length(max=20)])
+
+    def is_blank(self):
+        return not (self.question.data or '').strip() and not (self.correct_answer.data or '').strip()
+
+    def to_row(self):
+        return build_question(self.question.data, self.correct_answer.data, self.question_type.data,
+                              split_answers(self.choices.data or ''), self.tolerance.data)
+
+    def validate_correct_answer(self, field):
+        if self.is_blank():
+            return
+        try:
+            self.to_row()
+        except ValueError as e:
+            raise ValidationError(str(e))
+
 class QuizForm(FlaskForm):
-    question = TextAreaField('Question', validators=[DataRequired()])
-    correct_answer = StringField('Correct Answer', validators=[DataRequired()])
-    submit = SubmitField('Add Question')
+    questions = FieldList(FormField(QuestionForm), min_entries=3)
+    paste_format = SelectField('Paste Format', choices=[('csv', 'CSV'), ('json', 'JSON')], default='csv')
+    bulk_paste = TextAreaField('Paste Questions', validators=[Optional()])
+    submit = SubmitField('Add Questions')
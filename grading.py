@@ -0,0 +1,195 @@
+import json
+import logging
+import math
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Submitted answers longer than this are marked wrong without being graded,
+# so a pattern prone to catastrophic backtracking can't pin a worker on a
+# huge input. Correct answers are at most 255 characters.
+MAX_ANSWER_LENGTH = 1000
+
+# question_type -> factory(correct_answer, options) returning a grader.
+# A grader takes the submitted answer (a string, or a list of strings for
+# multi-select) and returns True when it is correct.
+GRADERS = {}
+
+QUESTION_TYPES = [
+    ('text', 'Free text'),
+    ('multiple_choice', 'Multiple choice'),
+    ('multi_select', 'Multi-select'),
+    ('numeric', 'Numeric'),
+    ('regex', 'Pattern (regular expression)'),
+]
+
+CHOICE_TYPES = {'multiple_choice', 'multi_select'}
+
+
+def register_grader(question_type):
+    def decorator(factory):
+        GRADERS[question_type] = factory
+        return factory
+    return decorator
+
+
+def _normalize(value):
+    return ' '.join(str(value).split()).casefold()
+
+
+def _as_list(answer):
+    if answer is None:
+        return []
+    if isinstance(answer, str):
+        return [answer]
+    return list(answer)
+
+
+def _first(answer):
+    values = _as_list(answer)
+    return values[0] if values else ''
+
+
+def split_answers(correct_answer):
+    return [line.strip() for line in correct_answer.splitlines() if line.strip()]
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def parse_options(options):
+    """The options JSON as a read-only mapping (lists become tuples); every
+    caller shares the cached result, so it must not be mutable."""
+    return _freeze(json.loads(options) if options else {})
+
+
+def dump_options(choices=None, tolerance=None):
+    options = {}
+    if choices:
+        options['choices'] = choices
+    if tolerance:
+        options['tolerance'] = tolerance
+    return json.dumps(options) if options else None
+
+
+@register_grader('text')
+def text_grader(correct_answer, options):
+    expected = _normalize(correct_answer)
+    return lambda answer: _normalize(_first(answer)) == expected
+
+
+@register_grader('multiple_choice')
+def multiple_choice_grader(correct_answer, options):
+    choices = {_normalize(choice) for choice in options.get('choices', [])}
+    expected = _normalize(correct_answer)
+    if choices and expected not in choices:
+        raise ValueError('The correct answer must be one of the choices.')
+    return lambda answer: _normalize(_first(answer)) == expected
+
+
+@register_grader('multi_select')
+def multi_select_grader(correct_answer, options):
+    choices = {_normalize(choice) for choice in options.get('choices', [])}
+    expected = frozenset(_normalize(value) for value in split_answers(correct_answer))
+    if not expected:
+        raise ValueError('At least one correct choice is required.')
+    if choices and not expected <= choices:
+        raise ValueError('Every correct answer must be one of the choices.')
+    return lambda answer: frozenset(_normalize(value) for value in _as_list(answer) if value) == expected
+
+
+def _parse_number(value):
+    number = float(str(value).strip().replace(',', ''))
+    if not math.isfinite(number):
+        raise ValueError(f'{value!r} is not a finite number.')
+    return number
+
+
+@register_grader('numeric')
+def numeric_grader(correct_answer, options):
+    expected = _parse_number(correct_answer)
+    tolerance = str(options.get('tolerance') or '0').strip()
+    if tolerance.endswith('%'):
+        allowed = abs(expected) * _parse_number(tolerance[:-1]) / 100
+    else:
+        allowed = abs(_parse_number(tolerance))
+
+    def grade(answer):
+        try:
+            return abs(_parse_number(_first(answer)) - expected) <= allowed
+        except ValueError:
+            return False
+    return grade
+
+
+@register_grader('regex')
+def regex_grader(correct_answer, options):
+    try:
+        pattern = re.compile(correct_answer, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f'Invalid pattern: {e}') from e
+
+    def grade(answer):
+        answer = _first(answer).strip()
+        return len(answer) <= MAX_ANSWER_LENGTH and pattern.fullmatch(answer) is not None
+    return grade
+
+
+@lru_cache(maxsize=4096)
+def compile_grader(question_type, correct_answer, options=None):
+    """Build (once per process) the grader for a question definition.
+
+    The cache is keyed on the definition itself, so editing a question
+    transparently yields a freshly compiled grader.
+    """
+    try:
+        factory = GRADERS[question_type or 'text']
+    except KeyError:
+        raise ValueError(f'Unknown question type: {question_type}') from None
+    return factory(correct_answer, parse_options(options))
+
+
+def grade(question, answer):
+    """Grade a submission; a stored question that no longer compiles (e.g. a
+    pattern saved before it was validated) marks every answer wrong rather
+    than failing the submission."""
+    try:
+        grader = compile_grader(question.question_type, question.correct_answer, question.options)
+    except ValueError as e:
+        logger.warning("Question %s cannot be graded: %s", getattr(question, 'id', None), e)
+        return False
+    return grader(answer)
+
+
+def build_question(content, correct_answer, question_type='text', choices=None, tolerance=None):
+    """Validate one question definition and return its column values."""
+    content = (content or '').strip()
+    correct_answer = (correct_answer or '').strip()
+    question_type = (question_type or 'text').strip() or 'text'
+    if not content:
+        raise ValueError('Question text is required.')
+    if not correct_answer:
+        raise ValueError('A correct answer is required.')
+    if len(correct_answer) > 255:
+        raise ValueError('The correct answer must be at most 255 characters.')
+    if question_type not in GRADERS:
+        raise ValueError(f'Unknown question type: {question_type}')
+    if question_type in CHOICE_TYPES:
+        if not choices or len(choices) < 2:
+            raise ValueError('Provide at least two choices.')
+    else:
+        choices = None
+    if question_type != 'numeric':
+        tolerance = None
+    options = dump_options(choices=choices, tolerance=tolerance)
+    compile_grader(question_type, correct_answer, options)
+    return {'content': content, 'correct_answer': correct_answer,
+            'question_type': question_type, 'options': options}
@@ -0,0 +1,71 @@
+import os
+from datetime import datetime
+import analytics
+import course_purge
+import recommendations
+from app import app, db
+from models import Lesson
+from task_queue import task, enqueue
+from video_metadata import load_fetcher
+
+_video_fetcher = None
+
+
+def video_fetcher():
+    # One per process so the concurrency limit is shared by every caller.
+    global _video_fetcher
+    if _video_fetcher is None:
+        _video_fetcher = load_fetcher(app.config)
+    return _video_fetcher
+
+
+def store_video_metadata(lesson, metadata):
+    lesson.video_title = metadata.get('title')
+    lesson.video_duration = metadata.get('duration')
+    lesson.video_thumbnail_url = metadata.get('thumbnail_url')
+    lesson.video_metadata_fetched_at = datetime.utcnow()
+
+
+def schedule_video_metadata(lesson):
+    """Forget metadata for the lesson's old link and queue a fetch for the new one.
+
+    The lesson must have an id (flush first when creating it).
+    """
+    lesson.video_title = lesson.video_duration = lesson.video_thumbnail_url = None
+    lesson.video_metadata_fetched_at = None
+    if lesson.video_link:
+        enqueue('fetch_video_metadata', {'lesson_id': lesson.id, 'url': lesson.video_link})
+
+
+@task('delete_upload', max_attempts=3)
+def delete_upload(filename):
+    try:
+        os.remove(os.path.join(app.config['UPLOADED_IMAGES_DEST'], filename))
+    except FileNotFoundError:
+        pass
+
+
+@task('purge_course', priority=5, visibility_timeout=600)
+def purge_course(course_id):
+    # Work in slices so one huge course never monopolises a worker; the
+    # follow-up task picks up where this one stopped.
+    if not course_purge.purge_course(course_id, time_budget=60):
+        enqueue('purge_course', {'course_id': course_id})
+
+
+@task('compact_analytics', priority=-5)
+def compact_analytics():
+    analytics.compact_analytics()
+
+
+@task('refresh_recommendations', priority=-5, visibility_timeout=1800)
+def refresh_recommendations():
+    recommendations.refresh_recommendations()
+
+
+@task('fetch_video_metadata', max_attempts=4)
+def fetch_video_metadata(lesson_id, url):
+    lesson = db.session.get(Lesson, lesson_id)
+    if lesson is None or lesson.video_link != url:
+        return  # deleted or edited since; a newer task covers the new link
+    store_video_metadata(lesson, video_fetcher().fetch(url))
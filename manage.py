@@ -1,8 +1,12 @@
+import os
+import click
+import multiprocessing
 from flask.cli import FlaskGroup
 from app import app, db
 from models import User, Course
 from werkzeug.security import generate_password_hash
 from sqlalchemy import inspect
+from tenancy import ensure_default_tenant
 
 cli = FlaskGroup(app)
 
@@ -11,6 +15,7 @@ def recreate_db():
     with app.app_context():
         db.drop_all()
         db.create_all()
+        ensure_default_tenant()
         
         # Create admin user
         admin_email = "admin@example.com"
@@ -38,6 +43,19 @@ def recreate_db():
         db.session.commit()
         print("Database recreated and seeded with initial data.")
 
+@cli.command("create_tenant")
+@click.argument("slug")
+@click.argument("name")
+@click.option("--hostname", help="Host name that serves this school, e.g. school.example.com.")
+def create_tenant(slug, name, hostname):
+    """Add a school; its users and courses are only visible on its host."""
+    from models import Tenant
+    with app.app_context():
+        tenant = Tenant(slug=slug, name=name, hostname=hostname.lower() if hostname else None)
+        db.session.add(tenant)
+        db.session.commit()
+        print(f"Created tenant {tenant.id} ({slug}).")
+
 @cli.command("check_schema")
 def check_schema():
     with app.app_context():
@@ -49,5 +67,298 @@ def check_schema():
             for column in columns:
                 print(f"- {column['name']}: {column['type']}")
 
+@cli.command("bulk_enroll")
+@click.argument("course_id", type=int)
+@click.argument("user_ids", type=click.File("r"), default="-")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per INSERT statement.")
+def bulk_enroll_command(course_id, user_ids, batch_size):
+    """Enroll the user ids listed one per line in USER_IDS (default: stdin)."""
+    from enrollment import bulk_enroll
+    with app.app_context():
+        if db.session.get(Course, course_id) is None:
+            raise click.ClickException(f"Course {course_id} does not exist.")
+        ids = (int(line) for line in user_ids if line.strip())
+        created = bulk_enroll(course_id, ids, batch_size=batch_size)
+        print(f"Enrolled {created} new students in course {course_id}.")
+
+@cli.command("compact_analytics")
+def compact_analytics_command():
+    """Fold sharded quiz counters and refresh course completion stats."""
+    from analytics import compact_analytics
+    with app.app_context():
+        folded, courses = compact_analytics()
+        print(f"Folded {folded} counter rows and refreshed {courses} courses.")
+
+@cli.command("refresh_recommendations")
+def refresh_recommendations_command():
+    """Rebuild the course similarity index and every student's recommendations."""
+    from recommendations import refresh_recommendations
+    with app.app_context():
+        for tenant_id, (courses, students) in refresh_recommendations().items():
+            print(f"School {tenant_id}: indexed {courses} courses and {students} students.")
+
+@cli.command("sweep_sessions")
+@click.option("--batch-size", default=1000, show_default=True, help="Sessions deleted per statement.")
+def sweep_sessions(batch_size):
+    """Delete expired server-side sessions."""
+    with app.app_context():
+        store = getattr(app.session_interface, "store", None)
+        if store is None:
+            raise click.ClickException("Server-side sessions are not enabled (SESSION_BACKEND=cookie).")
+        removed = store.sweep_expired(batch_size=batch_size)
+        print(f"Removed {removed} expired sessions.")
+
+@cli.command("worker")
+@click.option("--processes", default=os.cpu_count() or 1, show_default=True, help="Worker processes to start.")
+@click.option("--poll-interval", default=1.0, show_default=True, help="Seconds to sleep when the queue is empty.")
+@click.option("--burst", is_flag=True, help="Run the queued tasks once in this process and exit.")
+def worker(processes, poll_interval, burst):
+    """Run background tasks from the database-backed queue."""
+    from task_queue import run_pending, worker_process
+    if burst:
+        import jobs  # noqa: F401
+        with app.app_context():
+            print(f"Processed {run_pending()} tasks.")
+        return
+    workers = [multiprocessing.Process(target=worker_process, args=(poll_interval,)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+
+@cli.command("task_stats")
+def task_stats():
+    """Show the number of background tasks in each state."""
+    from models import Task
+    with app.app_context():
+        rows = db.session.query(Task.name, Task.status, db.func.count(Task.id)).group_by(Task.name, Task.status).all()
+        for name, status, count in sorted(rows):
+            print(f"{name:<30} {status:<10} {count}")
+
+@cli.command("purge_status")
+def purge_status_command():
+    """List deleted courses that still have rows waiting to be purged."""
+    from course_purge import purge_status
+    with app.app_context():
+        courses = Course.query.filter(Course.deleted_at.isnot(None)).order_by(Course.deleted_at).all()
+        if not courses:
+            print("No courses are waiting to be purged.")
+        for course in courses:
+            remaining = purge_status(course.id)
+            print(f"Course {course.id} ({course.title}), deleted {course.deleted_at:%Y-%m-%d %H:%M}: "
+                  f"{remaining['lessons']} lessons, {remaining['enrollments']} enrollments left")
+
+@cli.command("purge_courses")
+@click.option("--batch-size", default=100, show_default=True, help="Lessons deleted per transaction.")
+def purge_courses(batch_size):
+    """Finish purging every soft-deleted course in this process."""
+    from course_purge import purge_course
+    with app.app_context():
+        course_ids = db.session.scalars(db.select(Course.id).where(Course.deleted_at.isnot(None))).all()
+        for course_id in course_ids:
+            purge_course(course_id, batch_size=batch_size)
+            print(f"Purged course {course_id}.")
+
+@cli.command("rerender_lessons")
+@click.option("--batch-size", default=500, show_default=True, help="Lessons re-rendered per transaction.")
+@click.option("--force", is_flag=True, help="Re-render every lesson, not only stale ones.")
+def rerender_lessons_command(batch_size, force):
+    """Rebuild compiled lesson HTML after a renderer change."""
+    from content import rerender_lessons, RENDERER_VERSION
+    with app.app_context():
+        updated = rerender_lessons(batch_size=batch_size, force=force)
+        print(f"Re-rendered {updated} lessons with renderer version {RENDERER_VERSION}.")
+
+@cli.command("refresh_video_metadata")
+@click.option("--all", "refresh_all", is_flag=True, help="Refetch every lesson, not only those never fetched.")
+def refresh_video_metadata(refresh_all):
+    """Fetch oEmbed metadata for lesson video links, several at a time."""
+    from concurrent.futures import ThreadPoolExecutor
+    from models import Lesson
+    from jobs import video_fetcher, store_video_metadata
+    with app.app_context():
+        query = Lesson.query.filter(Lesson.video_link.isnot(None), Lesson.video_link != '')
+        if not refresh_all:
+            query = query.filter(Lesson.video_metadata_fetched_at.is_(None))
+        lessons = query.all()
+        fetcher = video_fetcher()
+
+        def fetch(lesson):
+            try:
+                return lesson, fetcher.fetch(lesson.video_link)
+            except Exception as e:
+                print(f"Lesson {lesson.id}: {e}")
+                return lesson, None
+
+        # Only the HTTP calls run in threads; the session stays on this one.
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=app.config["VIDEO_METADATA_CONCURRENCY"]) as pool:
+            for lesson, metadata in pool.map(fetch, lessons):
+                if metadata is not None:
+                    store_video_metadata(lesson, metadata)
+                    fetched += 1
+        db.session.commit()
+        print(f"Fetched video metadata for {fetched} of {len(lessons)} lessons.")
+
+@cli.command("pool_stats")
+@click.option("--json", "as_json", is_flag=True, help="Print the aggregated stats as JSON.")
+def pool_stats(as_json):
+    """Connection pool stats summed over the running workers."""
+    import json
+    from pool_metrics import read_snapshots, aggregate
+    snapshots = read_snapshots(app.config["POOL_STATS_DIR"])
+    stats = aggregate(snapshots)
+    if as_json:
+        print(json.dumps(stats, indent=2))
+        return
+    for snapshot in sorted(snapshots, key=lambda s: s["pid"]):
+        print(f"pid {snapshot['pid']}: in use {snapshot['in_use']}/{snapshot['size']} "
+              f"(+{snapshot['overflow']} overflow), {snapshot['checkouts']} checkouts")
+    checkouts = sum(stats["wait_buckets"])
+    average_ms = stats["wait_sum"] / checkouts * 1000 if checkouts else 0
+    print(f"Workers: {stats['processes']}")
+    print(f"In use: {stats['in_use']} (pool size {stats['size']}, overflow {stats['overflow']})")
+    print(f"Checkout wait: avg {average_ms:.2f} ms, max {stats['wait_max'] * 1000:.2f} ms over {checkouts} checkouts")
+    print(f"Connects: {stats['connects']}, recycled: {stats['recycled']}, invalidated: {stats['invalidated']}")
+    print(f"Pings on idle connections: {stats['idle_pings']}, ping failures: {stats['pre_ping_failures']}")
+
+@cli.command("memory_profile")
+@click.option("--dump", is_flag=True, help="Ask running workers to dump their profiles first.")
+@click.option("--wait", default=10.0, show_default=True, help="Seconds to wait for workers after --dump.")
+@click.option("--top", default=10, show_default=True, help="Allocation sites to list.")
+def memory_profile(dump, wait, top):
+    """Summarise per-endpoint allocation profiles dumped by the workers.
+
+    Workers notice a --dump request on their next request (within a few
+    seconds under load); idle workers are skipped.
+    """
+    import time
+    from memory_profiling import request_dump, latest_dumps, merge_dumps
+    directory = app.config["MEMORY_PROFILE_DIR"]
+    since = 0
+    if dump:
+        since = request_dump(directory)
+        time.sleep(wait)
+    dumps = latest_dumps(directory, since=since)
+    if not dumps:
+        print("No profiles found; set MEMORY_PROFILE_ENDPOINTS or MEMORY_PROFILE_SAMPLE_RATE on the workers.")
+        return
+    endpoints, sites = merge_dumps(dumps, top=top)
+    print(f"Workers: {len(dumps)}")
+    print(f"{'endpoint':<24} {'requests':>8} {'peak max':>12} {'peak avg':>12} {'net avg':>12}")
+    for name, totals in sorted(endpoints.items(), key=lambda item: item[1]['peak_max'], reverse=True):
+        requests = totals["requests"]
+        print(f"{name or '-':<24} {requests:>8} {totals['peak_max']:>12,} "
+              f"{totals['peak_sum'] // requests:>12,} {totals['net_sum'] // requests:>12,}")
+    print("Top allocation sites (bytes, summed over recorded requests):")
+    for endpoint, site, size in sites:
+        print(f"{size:>12,}  {endpoint}  {site}")
+
+@cli.command("cpu_profile")
+@click.option("--duration", default=30.0, show_default=True, help="Seconds to sample for.")
+@click.option("--interval", default=0.01, show_default=True, help="Seconds between samples.")
+@click.option("--output", default="profile", show_default=True,
+              help="Writes OUTPUT.collapsed and OUTPUT.speedscope.json.")
+def cpu_profile(duration, interval, output):
+    """Profile every running worker and merge their stacks.
+
+    Workers pick the request up on their next request (within a few seconds
+    under load), so the command waits a little longer than --duration.
+    """
+    import json
+    import time
+    from collections import Counter
+    from cpu_profiler import request_profile, parse_collapsed, to_collapsed, to_speedscope
+    directory = app.config["CPU_PROFILE_DIR"]
+    requested_at = request_profile(directory, duration, interval)
+    time.sleep(duration + 10)
+    counts, workers = Counter(), 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".collapsed") and os.path.getmtime(path) >= requested_at:
+            with open(path) as f:
+                parse_collapsed(f.read(), counts)
+            workers += 1
+    if not workers:
+        print("No worker profiles were written; are the workers serving requests?")
+        return
+    with open(output + ".collapsed", "w") as f:
+        f.write(to_collapsed(counts))
+    with open(output + ".speedscope.json", "w") as f:
+        json.dump(to_speedscope(counts, interval, name=f"{workers} workers"), f)
+    print(f"{sum(counts.values())} samples from {workers} workers written to {output}.collapsed "
+          f"and {output}.speedscope.json")
+
+@cli.command("backfill")
+@click.argument("name", required=False)
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per transaction.")
+@click.option("--sleep", default=0.0, show_default=True, help="Seconds to pause between batches.")
+@click.option("--max-batches", type=int, help="Stop after this many batches; rerun to continue.")
+@click.option("--restart", is_flag=True, help="Forget the checkpoint and start from the first row.")
+def backfill_command(name, batch_size, sleep, max_batches, restart):
+    """Run a chunked backfill, resuming from its checkpoint; lists them without NAME."""
+    from backfill import BACKFILLS, get_checkpoint, reset_checkpoint, run_backfill
+    with app.app_context():
+        if name is None:
+            for backfill_name, fn in sorted(BACKFILLS.items()):
+                checkpoint = get_checkpoint(backfill_name)
+                if checkpoint is None:
+                    status = "not started"
+                elif checkpoint.finished_at:
+                    status = f"finished {checkpoint.finished_at:%Y-%m-%d %H:%M}, {checkpoint.rows} rows"
+                else:
+                    status = f"{checkpoint.rows} rows done, next id after {checkpoint.last_id}"
+                print(f"{backfill_name}: {fn.__doc__.strip()} [{status}]")
+            return
+        if name not in BACKFILLS:
+            raise click.BadParameter(f"choose from {', '.join(sorted(BACKFILLS))}", param_hint="NAME")
+        if restart:
+            reset_checkpoint(name)
+        checkpoint = run_backfill(name, batch_size=batch_size, sleep=sleep, max_batches=max_batches)
+        state = "finished" if checkpoint.finished_at else f"stopped after id {checkpoint.last_id}"
+        print(f"Backfill {name}: {checkpoint.rows} rows, {state}.")
+
+@cli.command("bench_migrations")
+@click.option("--database-url", help="Empty scratch database to run in; defaults to a temporary SQLite file.")
+@click.option("--base", default="a3c71e9d5b20", show_default=True,
+              help="Revision to seed at; every later migration is timed.")
+@click.option("--rows", default=100000, show_default=True, help="Rows seeded into each table.")
+@click.option("--table-rows", help="Per-table row counts overriding --rows, e.g. tenant=10,course=5000.")
+@click.option("--json", "as_json", is_flag=True, help="Print the results as JSON.")
+def bench_migrations_command(database_url, base, rows, table_rows, as_json):
+    """Time each migration against a large seeded database and report lock waits."""
+    import json
+    import tempfile
+    from migration_bench import bench_migrations
+    overrides = {}
+    for item in (table_rows or "").split(","):
+        if item.strip():
+            table, _, count = item.partition("=")
+            overrides[table.strip()] = int(count)
+    scratch = None
+    if not database_url:
+        fd, scratch = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.remove(scratch)
+        database_url = "sqlite:///" + scratch
+    try:
+        results = bench_migrations(database_url, base, rows=rows, table_rows=overrides)
+    finally:
+        if scratch and os.path.exists(scratch):
+            os.remove(scratch)
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'revision':<14}{'seconds':>9}{'read wait':>11}{'write wait':>12}  worst table / message")
+    for result in results:
+        print(f"{result['revision']:<14}{result['seconds']:>9.2f}{result['max_read_wait']:>11.2f}"
+              f"{result['max_write_wait']:>12.2f}  {result['worst_table'] or '-'} / {result['message']}")
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,220 @@
+"""Opt-in per-request allocation profiling with tracemalloc.
+
+A request is profiled when its endpoint is listed in MEMORY_PROFILE_ENDPOINTS
+or when it wins the MEMORY_PROFILE_SAMPLE_RATE draw. Tracing only runs while
+at least one profiled request is in flight (unless MEMORY_PROFILE_TRACE_ALWAYS
+is set), so unprofiled requests pay a set lookup and a random() call.
+
+For each profiled request we keep the peak traced memory above the starting
+point, the net growth, and the source lines that allocated the most. Workers
+keep the most recent records in memory and write them (plus a tracemalloc
+snapshot when tracing) to MEMORY_PROFILE_DIR on demand: immediately from
+/admin/memory/dump, or within a few seconds of ``manage.py memory_profile
+--dump`` touching the trigger file.
+"""
+import json
+import linecache
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+from flask import g, request
+
+TRIGGER_FILE = 'dump-requested'
+
+# Allocations made by the profiler itself are not interesting.
+_IGNORE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+)
+
+
+class MemoryProfiler:
+    def __init__(self, endpoints=(), sample_rate=0.0, top=10, frames=5,
+                 output_dir=None, trace_always=False, history=200, trigger_interval=5):
+        self.endpoints = set(endpoints)
+        self.sample_rate = sample_rate
+        self.top = top
+        self.frames = frames
+        self.output_dir = output_dir
+        self.trace_always = trace_always
+        self.trigger_interval = trigger_interval
+        self.records = deque(maxlen=history)
+        self.by_endpoint = {}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last_trigger_check = 0.0
+        self._last_dump = time.time()
+        if trace_always:
+            tracemalloc.start(frames)
+
+    @property
+    def enabled(self):
+        return bool(self.endpoints or self.sample_rate or self.trace_always)
+
+    def should_profile(self, endpoint):
+        if endpoint in self.endpoints:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        with self._lock:
+            self._active += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            if self._active == 1:
+                # Peak is process-wide, so it is only reset when no other
+                # profiled request is running.
+                tracemalloc.reset_peak()
+        baseline = tracemalloc.take_snapshot().filter_traces(_IGNORE)
+        return baseline, tracemalloc.get_traced_memory()[0], time.perf_counter()
+
+    def stop(self, token, endpoint, path):
+        baseline, start_size, started = token
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORE)
+        with self._lock:
+            self._active -= 1
+            if self._active == 0 and not self.trace_always:
+                tracemalloc.stop()
+        sites = [
+            {'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+             'size': stat.size_diff, 'count': stat.count_diff}
+            for stat in snapshot.compare_to(baseline, 'lineno')[:self.top]
+            if stat.size_diff > 0
+        ]
+        record = {
+            'endpoint': endpoint,
+            'path': path,
+            'at': time.time(),
+            'duration': time.perf_counter() - started,
+            'peak': max(peak - start_size, 0),
+            'net': current - start_size,
+            'top': sites,
+        }
+        with self._lock:
+            self.records.append(record)
+            totals = self.by_endpoint.setdefault(endpoint, {'requests': 0, 'peak_max': 0, 'peak_sum': 0, 'net_sum': 0})
+            totals['requests'] += 1
+            totals['peak_max'] = max(totals['peak_max'], record['peak'])
+            totals['peak_sum'] += record['peak']
+            totals['net_sum'] += record['net']
+        return record
+
+    def summary(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'tracing': tracemalloc.is_tracing(),
+                'endpoints': {name: dict(totals) for name, totals in self.by_endpoint.items()},
+                'records': list(self.records),
+            }
+
+    def dump(self, directory=None):
+        """Write this worker's records (and heap snapshot, if tracing); returns the paths."""
+        directory = directory or self.output_dir
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(directory, f'{os.getpid()}-{stamp}')
+        with open(base + '.json', 'w') as f:
+            json.dump(self.summary(), f)
+        paths = [base + '.json']
+        if tracemalloc.is_tracing():
+            tracemalloc.take_snapshot().filter_traces(_IGNORE).dump(base + '.tracemalloc')
+            paths.append(base + '.tracemalloc')
+        self._last_dump = time.time()
+        return paths
+
+    def check_trigger(self):
+        """Dump if ``request_dump`` was called since our last dump; stats the
+        trigger file at most every ``trigger_interval`` seconds."""
+        now = time.monotonic()
+        if not self.output_dir or now - self._last_trigger_check < self.trigger_interval:
+            return
+        self._last_trigger_check = now
+        try:
+            requested_at = os.path.getmtime(os.path.join(self.output_dir, TRIGGER_FILE))
+        except OSError:
+            return
+        if requested_at > self._last_dump:
+            self.dump()
+
+
+def request_dump(directory):
+    """Ask every worker sharing ``directory`` to dump its profile."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TRIGGER_FILE)
+    with open(path, 'a'):
+        os.utime(path)
+    return os.path.getmtime(path)
+
+
+def latest_dumps(directory, since=0):
+    """The newest JSON dump of each worker written after ``since``."""
+    latest = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name.endswith('.json') or os.path.getmtime(path) < since:
+            continue
+        pid = name.split('-', 1)[0]
+        if pid not in latest or name > os.path.basename(latest[pid]):
+            latest[pid] = path
+    dumps = []
+    for path in latest.values():
+        with open(path) as f:
+            dumps.append(json.load(f))
+    return dumps
+
+
+def merge_dumps(dumps, top=10):
+    """Per-endpoint totals and the heaviest allocation sites across workers."""
+    endpoints, sites = {}, {}
+    for dump in dumps:
+        for name, totals in dump['endpoints'].items():
+            merged = endpoints.setdefault(name, {'requests': 0, 'peak_max': 0, 'peak_sum': 0, 'net_sum': 0})
+            merged['requests'] += totals['requests']
+            merged['peak_max'] = max(merged['peak_max'], totals['peak_max'])
+            merged['peak_sum'] += totals['peak_sum']
+            merged['net_sum'] += totals['net_sum']
+        for record in dump['records']:
+            for site in record['top']:
+                key = (record['endpoint'], site['site'])
+                sites[key] = sites.get(key, 0) + site['size']
+    heaviest = sorted(sites.items(), key=lambda item: item[1], reverse=True)[:top]
+    return endpoints, [(endpoint, site, size) for (endpoint, site), size in heaviest]
+
+
+def init_memory_profiler(app):
+    endpoints = [name.strip() for name in app.config['MEMORY_PROFILE_ENDPOINTS'].split(',') if name.strip()]
+    profiler = MemoryProfiler(
+        endpoints=endpoints,
+        sample_rate=app.config['MEMORY_PROFILE_SAMPLE_RATE'],
+        top=app.config['MEMORY_PROFILE_TOP'],
+        frames=app.config['MEMORY_PROFILE_FRAMES'],
+        output_dir=app.config['MEMORY_PROFILE_DIR'],
+        trace_always=app.config['MEMORY_PROFILE_TRACE_ALWAYS'],
+    )
+
+    # Hooks are always registered so profiling can be switched on at runtime
+    # (profiler.endpoints / sample_rate); disabled they cost one attribute check.
+    @app.before_request
+    def start_memory_profile():
+        if profiler.enabled and profiler.should_profile(request.endpoint):
+            g.memory_profile = profiler.start()
+
+    @app.teardown_request
+    def stop_memory_profile(exc=None):
+        token = g.pop('memory_profile', None)
+        if token is not None:
+            profiler.stop(token, request.endpoint, request.path)
+        if profiler.enabled:
+            profiler.check_trigger()
+
+    return profiler
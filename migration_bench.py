@@ -0,0 +1,206 @@
+"""Time Alembic migrations against a large seeded database.
+
+``bench_migrations`` builds the current schema in an empty scratch database,
+downgrades it to ``base``, fills every table with synthetic rows, then
+upgrades one revision at a time. Empty tables are filled again after each
+step, so each migration runs against a full database.
+
+While a migration runs, a probe thread on its own connection keeps reading
+from and writing to every table. The longest any probe waited is the
+migration's lock time. A plain index build on PostgreSQL shows up as a long
+write wait, and a table rewrite as a long read wait. On SQLite every write
+transaction blocks other writers, so the write wait there is the migration's
+full duration.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from flask_migrate import Migrate, downgrade, stamp, upgrade
+from alembic.script import ScriptDirectory
+import sqlalchemy as sa
+from sqlalchemy.pool import NullPool
+from app import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+SEED_BATCH_SIZE = 5000
+SEED_START = datetime(2024, 1, 1)
+
+
+def _mixed_radix_columns(table, counts, rows):
+    """Map each column of a composite primary key / unique constraint to
+    (divisor, radix, offset), so row i gets a distinct combination."""
+    digits = {}
+    groups = [table.primary_key.columns] if len(table.primary_key.columns) > 1 else []
+    groups += [c.columns for c in table.constraints
+               if isinstance(c, sa.UniqueConstraint) and len(c.columns) > 1]
+    for columns in groups:
+        divisor = 1
+        for column in columns:
+            if column.name in digits:
+                continue
+            fk = next(iter(column.foreign_keys), None)
+            radix = counts.get(fk.column.table.name, 0) if fk is not None else rows
+            digits[column.name] = (divisor, max(radix, 1), 1 if fk is not None else 0)
+            divisor *= max(radix, 1)
+    return digits
+
+
+def _value(column, i, counts, digits):
+    if column.name in digits:
+        divisor, radix, offset = digits[column.name]
+        return (i // divisor) % radix + offset
+    fk = next(iter(column.foreign_keys), None)
+    if fk is not None:
+        parent_rows = counts.get(fk.column.table.name, 0)
+        return i % parent_rows + 1 if parent_rows else None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if python_type is bool:
+        return i % 2 == 0
+    if python_type is int:
+        return i if column.unique or column.primary_key else i % 100
+    if python_type is float:
+        return float(i % 100)
+    if python_type is str:
+        value = f'{column.name}-{i}'
+        length = getattr(column.type, 'length', None)
+        return value[-length:] if length else value
+    if python_type is datetime:
+        return SEED_START + timedelta(seconds=i)
+    if python_type is bytes:
+        return b''
+    if python_type in (dict, list):
+        return python_type()
+    return None
+
+
+def seed_table(connection, table, rows, counts):
+    """Insert ``rows`` synthetic rows; foreign keys point at ids 1..n of the
+    (already seeded) parent tables. Returns the number inserted."""
+    autoincrement = table.autoincrement_column
+    columns = [c for c in table.columns if c is not autoincrement]
+    for column in columns:
+        fk = next(iter(column.foreign_keys), None)
+        if fk is not None and not column.nullable and not counts.get(fk.column.table.name):
+            return 0  # required parent rows are missing
+    digits = _mixed_radix_columns(table, counts, rows)
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        batch = [{c.name: _value(c, i, counts, digits) for c in columns}
+                 for i in range(start, min(start + SEED_BATCH_SIZE, rows))]
+        connection.execute(table.insert(), batch)
+    return rows
+
+
+def seed_empty_tables(engine, rows, table_rows=None):
+    """Fill every empty table (parents first); returns {table: rows now in it}."""
+    table_rows = table_rows or {}
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+    counts = {}
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name == 'alembic_version':
+                continue
+            existing = connection.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+            if not existing:
+                existing = seed_table(connection, table, table_rows.get(table.name, rows), counts)
+            counts[table.name] = existing
+    return counts
+
+
+class LockProbe(threading.Thread):
+    """Repeatedly read and (in a rolled-back transaction) write one row of
+    every table, recording the longest wait per table."""
+
+    def __init__(self, url, interval=0.02):
+        super().__init__(name='lock-probe', daemon=True)
+        connect_args = {'timeout': 600} if url.startswith('sqlite') else {}
+        self.engine = sa.create_engine(url, poolclass=NullPool, connect_args=connect_args)
+        self.interval = interval
+        self.read_waits = {}
+        self.write_waits = {}
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                inspector = sa.inspect(self.engine)
+                tables = {name: inspector.get_columns(name)[0]['name'] for name in inspector.get_table_names()}
+            except sa.exc.DBAPIError:
+                tables = {}  # caught mid-rename; try again
+            for name, column in tables.items():
+                if self._stopping.is_set():
+                    break
+                self._probe(name, column)
+            self._stopping.wait(self.interval)
+
+    def _probe(self, name, column):
+        quote = self.engine.dialect.identifier_preparer.quote
+        try:
+            with self.engine.connect() as connection:
+                started = time.perf_counter()
+                connection.execute(sa.text(f'SELECT 1 FROM {quote(name)} LIMIT 1')).all()
+                read = time.perf_counter() - started
+                connection.rollback()
+                started = time.perf_counter()
+                # Touches no rows, but needs the same locks as a real write.
+                connection.execute(sa.text(f'UPDATE {quote(name)} SET {quote(column)} = {quote(column)} WHERE 1 = 0'))
+                write = time.perf_counter() - started
+                connection.rollback()
+        except sa.exc.DBAPIError:
+            return  # dropped or renamed mid-migration
+        self.read_waits[name] = max(self.read_waits.get(name, 0), read)
+        self.write_waits[name] = max(self.write_waits.get(name, 0), write)
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+        self.engine.dispose()
+
+
+def revisions_between(base, head='heads', directory=MIGRATIONS_DIR):
+    """Revisions after ``base`` up to ``head``, oldest first."""
+    script = ScriptDirectory(directory)
+    return list(reversed(list(script.iterate_revisions(head, base))))
+
+
+def bench_migrations(database_url, base, rows=100_000, table_rows=None, directory=MIGRATIONS_DIR,
+                     probe_interval=0.02):
+    """Run every migration after ``base`` against a seeded copy of the schema
+    in the empty database at ``database_url``; returns one dict per revision."""
+    bench_app = Flask('migration_bench')
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(bench_app)
+    Migrate(bench_app, db, directory=directory)
+    results = []
+    with bench_app.app_context():
+        engine = db.engine
+        if sa.inspect(engine).get_table_names():
+            raise RuntimeError(f'{engine.url!r} is not empty; migrations are benchmarked on a scratch database')
+        db.create_all()
+        stamp(directory=directory, revision='head')
+        downgrade(directory=directory, revision=base)
+        seed_empty_tables(engine, rows, table_rows)
+        for revision in revisions_between(base, directory=directory):
+            engine.dispose()
+            probe = LockProbe(database_url, interval=probe_interval)
+            probe.start()
+            started = time.perf_counter()
+            upgrade(directory=directory, revision=revision.revision)
+            duration = time.perf_counter() - started
+            probe.stop()
+            worst = max(probe.write_waits, key=probe.write_waits.get, default=None)
+            results.append({
+                'revision': revision.revision,
+                'message': revision.doc,
+                'seconds': duration,
+                'max_read_wait': max(probe.read_waits.values(), default=0.0),
+                'max_write_wait': max(probe.write_waits.values(), default=0.0),
+                'worst_table': worst,
+            })
+            seed_empty_tables(engine, rows, table_rows)
+    return results
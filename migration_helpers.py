@@ -0,0 +1,75 @@
+"""Online-safe building blocks for Alembic migrations.
+
+``batch_alter_table`` copies the whole table on SQLite whenever it cannot
+ALTER in place, and a plain CREATE INDEX blocks writes on PostgreSQL for as
+long as the build takes. Use these helpers in migrations that touch large
+tables, and check the result with ``python manage.py bench_migrations``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def is_postgresql():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def create_index_concurrently(index_name, table_name, columns, **kw):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL, so writes continue while the
+    index builds; a plain CREATE INDEX elsewhere.
+
+    Concurrent builds cannot run in a transaction, so everything the
+    migration did before this call is committed first.
+    """
+    if is_postgresql():
+        with op.get_context().autocommit_block():
+            op.create_index(index_name, table_name, columns, postgresql_concurrently=True,
+                            if_not_exists=True, **kw)
+    else:
+        op.create_index(index_name, table_name, columns, **kw)
+
+
+def drop_index_concurrently(index_name, table_name):
+    if is_postgresql():
+        with op.get_context().autocommit_block():
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index(index_name, table_name=table_name)
+
+
+def add_column_online(table_name, column):
+    """ALTER TABLE ... ADD COLUMN without a table rewrite.
+
+    Both SQLite and PostgreSQL (11+) add a nullable column, or one with a
+    constant server default, in place. Anything else (a NOT NULL column
+    without default, a foreign key on SQLite) needs a copy, so add it as
+    nullable, backfill, then tighten in a later migration.
+    """
+    if not column.nullable and column.server_default is None:
+        raise ValueError(f"{table_name}.{column.name}: add NOT NULL columns with a server_default, "
+                         "or as nullable followed by a backfill")
+    if column.foreign_keys and not is_postgresql():
+        raise ValueError(f"{table_name}.{column.name}: SQLite can only add a foreign key by copying the table")
+    op.add_column(table_name, column)
+
+
+def backfill_in_batches(table_name, values, pending, batch_size=1000, key='id', params=None):
+    """Run ``UPDATE table SET <values>`` over rows matching ``pending`` (SQL
+    text), ``batch_size`` rows per committed transaction.
+
+    ``values`` must make the row stop matching ``pending``: that condition is
+    the checkpoint, so a migration interrupted half way resumes where it
+    stopped and no transaction holds row locks for more than one batch.
+    Returns the number of rows updated.
+    """
+    statement = sa.text(
+        f"UPDATE {table_name} SET {values} WHERE {key} IN ("
+        f"SELECT {key} FROM {table_name} WHERE {pending} ORDER BY {key} LIMIT :batch_size)"
+    )
+    bind = op.get_bind()
+    updated = 0
+    while True:
+        with op.get_context().autocommit_block():
+            rowcount = bind.execute(statement, dict(params or {}, batch_size=batch_size)).rowcount
+        updated += rowcount
+        if rowcount < batch_size:
+            return updated
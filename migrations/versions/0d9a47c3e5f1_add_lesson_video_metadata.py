@@ -0,0 +1,33 @@
+"""Add lesson video metadata columns
+
+Revision ID: 0d9a47c3e5f1
+Revises: b3e8f15a6c02
+Create Date: 2024-10-28 14:12:05.481337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d9a47c3e5f1'
+down_revision = 'b3e8f15a6c02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing lessons are filled in with `python manage.py refresh_video_metadata`.
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('video_title', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('video_duration', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('video_thumbnail_url', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('video_metadata_fetched_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.drop_column('video_metadata_fetched_at')
+        batch_op.drop_column('video_thumbnail_url')
+        batch_op.drop_column('video_duration')
+        batch_op.drop_column('video_title')
@@ -0,0 +1,40 @@
+"""Add task queue table
+
+Revision ID: 1b5f7e0a9c34
+Revises: e47b9c6d13a8
+Create Date: 2024-10-25 13:48:52.275160
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b5f7e0a9c34'
+down_revision = 'e47b9c6d13a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('visible_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_claim', 'task', ['status', sa.text('priority DESC'), 'visible_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_claim', table_name='task')
+    op.drop_table('task')
@@ -0,0 +1,53 @@
+"""Add course recommendation tables
+
+Revision ID: 4c8e2b7a9d15
+Revises: 9a4e6b1f2d73
+Create Date: 2024-11-02 10:12:31.448210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2b7a9d15'
+down_revision = '9a4e6b1f2d73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('course_neighbor',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['course.id'], ),
+    sa.PrimaryKeyConstraint('course_id', 'rank')
+    )
+    with op.batch_alter_table('course_neighbor', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_course_neighbor_neighbor_id'), ['neighbor_id'], unique=False)
+
+    op.create_table('user_recommendation',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'rank')
+    )
+    with op.batch_alter_table('user_recommendation', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_recommendation_course_id'), ['course_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_recommendation', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_recommendation_course_id'))
+
+    op.drop_table('user_recommendation')
+    with op.batch_alter_table('course_neighbor', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_course_neighbor_neighbor_id'))
+
+    op.drop_table('course_neighbor')
@@ -0,0 +1,79 @@
+"""Add quiz attempts and analytics aggregate tables
+
+Revision ID: 5e02b8d41f9a
+Revises: c9184f2ae6d7
+Create Date: 2024-10-22 14:37:05.810442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e02b8d41f9a'
+down_revision = 'c9184f2ae6d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('quiz_attempt',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        batch_op.create_index('ix_quiz_attempt_quiz_created', ['quiz_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_quiz_attempt_user_quiz', ['user_id', 'quiz_id'], unique=False)
+
+    op.create_table('question_stat',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+    sa.PrimaryKeyConstraint('question_id', 'shard')
+    )
+    op.create_table('quiz_stat',
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('percentage_sum', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.PrimaryKeyConstraint('quiz_id', 'shard')
+    )
+    op.create_table('quiz_score_bucket',
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.SmallInteger(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.PrimaryKeyConstraint('quiz_id', 'bucket', 'shard')
+    )
+    op.create_table('course_completion_stat',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('students', sa.Integer(), nullable=False),
+    sa.Column('average', sa.Float(), nullable=False),
+    sa.Column('histogram', sa.JSON(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+    sa.PrimaryKeyConstraint('course_id')
+    )
+
+
+def downgrade():
+    op.drop_table('course_completion_stat')
+    op.drop_table('quiz_score_bucket')
+    op.drop_table('quiz_stat')
+    op.drop_table('question_stat')
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_attempt_user_quiz')
+        batch_op.drop_index('ix_quiz_attempt_quiz_created')
+
+    op.drop_table('quiz_attempt')
@@ -0,0 +1,28 @@
+"""Add course deleted_at for soft deletion
+
+Revision ID: 72c4d9e8a1f6
+Revises: 1b5f7e0a9c34
+Create Date: 2024-10-26 10:31:14.902345
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '72c4d9e8a1f6'
+down_revision = '1b5f7e0a9c34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_course_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_course_deleted_at'))
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,47 @@
+"""Allow one quiz per lesson
+
+Revision ID: 7b3d9e2f4a61
+Revises: e2f7a4c19b58
+Create Date: 2024-11-12 10:21:47.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migration_helpers import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3d9e2f4a61'
+down_revision = 'e2f7a4c19b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Quizzes were created on first use without a constraint, so a lesson can
+    # have several. The oldest one keeps the lesson; the questions, attempts
+    # and statistics of the others are moved onto it. Statistic shards are
+    # renumbered past the kept quiz's own, and compact_analytics() folds them.
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text(
+        "SELECT later.id, MIN(earlier.id) FROM quiz AS later JOIN quiz AS earlier "
+        "ON earlier.lesson_id = later.lesson_id AND earlier.id < later.id "
+        "GROUP BY later.id ORDER BY later.id"
+    )).all()
+    for quiz_id, keep_id in duplicates:
+        params = {'quiz_id': quiz_id, 'keep_id': keep_id}
+        for table in ('question', 'quiz_attempt'):
+            bind.execute(sa.text(f"UPDATE {table} SET quiz_id = :keep_id WHERE quiz_id = :quiz_id"), params)
+        for table in ('quiz_stat', 'quiz_score_bucket'):
+            offset = bind.execute(sa.text(
+                f"SELECT COALESCE(MAX(shard), -1) + 1 FROM {table} WHERE quiz_id = :keep_id"
+            ), params).scalar()
+            bind.execute(sa.text(
+                f"UPDATE {table} SET quiz_id = :keep_id, shard = shard + :offset WHERE quiz_id = :quiz_id"
+            ), dict(params, offset=offset))
+        bind.execute(sa.text("DELETE FROM quiz WHERE id = :quiz_id"), params)
+    create_index_concurrently('ix_quiz_lesson_id', 'quiz', ['lesson_id'], unique=True)
+
+
+def downgrade():
+    drop_index_concurrently('ix_quiz_lesson_id', 'quiz')
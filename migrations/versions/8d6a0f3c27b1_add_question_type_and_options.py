@@ -0,0 +1,28 @@
+"""Add question type and options
+
+Revision ID: 8d6a0f3c27b1
+Revises: 5e02b8d41f9a
+Create Date: 2024-10-23 11:20:48.117390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d6a0f3c27b1'
+down_revision = '5e02b8d41f9a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('question', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('question_type', sa.String(length=20), nullable=False, server_default='text'))
+        batch_op.add_column(sa.Column('options', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('question', schema=None) as batch_op:
+        batch_op.drop_column('options')
+        batch_op.drop_column('question_type')
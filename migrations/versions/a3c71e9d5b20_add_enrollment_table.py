@@ -0,0 +1,40 @@
+"""Add enrollment table
+
+Revision ID: a3c71e9d5b20
+Revises: 446c3b03d2a2, 49e61dc4e0ee
+Create Date: 2024-10-20 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c71e9d5b20'
+down_revision = ('446c3b03d2a2', '49e61dc4e0ee')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('enrollment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('enrolled_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'course_id', name='uq_enrollment_user_course')
+    )
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollment_course_enrolled', ['course_id', 'enrolled_at', 'user_id'], unique=False)
+        batch_op.create_index('ix_enrollment_user_enrolled', ['user_id', 'enrolled_at', 'course_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollment_user_enrolled')
+        batch_op.drop_index('ix_enrollment_course_enrolled')
+
+    op.drop_table('enrollment')
@@ -0,0 +1,34 @@
+"""Add compiled lesson content columns
+
+Revision ID: b3e8f15a6c02
+Revises: 72c4d9e8a1f6
+Create Date: 2024-10-27 09:54:36.218770
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f15a6c02'
+down_revision = '72c4d9e8a1f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing lessons are compiled afterwards with `python manage.py rerender_lessons`;
+    # until then templates fall back to the raw content.
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('content_excerpt', sa.String(length=300), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('renderer_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.drop_column('renderer_version')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('content_excerpt')
+        batch_op.drop_column('content_html')
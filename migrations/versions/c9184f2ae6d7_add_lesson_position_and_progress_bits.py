@@ -0,0 +1,41 @@
+"""Add lesson position and enrollment progress bits
+
+Revision ID: c9184f2ae6d7
+Revises: a3c71e9d5b20
+Create Date: 2024-10-21 09:03:17.552901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9184f2ae6d7'
+down_revision = 'a3c71e9d5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('position', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_lesson_course_position', ['course_id', 'position'], unique=False)
+
+    # Existing lessons keep their insertion order within each course.
+    op.execute(
+        "UPDATE lesson SET position = ("
+        "SELECT COUNT(*) FROM lesson AS earlier "
+        "WHERE earlier.course_id = lesson.course_id AND earlier.id < lesson.id)"
+    )
+
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('progress_bits', sa.LargeBinary(), nullable=False, server_default=sa.text("''")))
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.drop_column('progress_bits')
+
+    with op.batch_alter_table('lesson', schema=None) as batch_op:
+        batch_op.drop_index('ix_lesson_course_position')
+        batch_op.drop_column('position')
@@ -0,0 +1,41 @@
+"""Make lesson positions unique within a course
+
+Revision ID: e2f7a4c19b58
+Revises: 4c8e2b7a9d15
+Create Date: 2024-11-04 16:40:08.913527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migration_helpers import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f7a4c19b58'
+down_revision = '4c8e2b7a9d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Positions were assigned without a constraint, so two lessons created at
+    # once could share one. The first keeps it (and the progress bits already
+    # recorded there); the others move to the end of their course.
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text(
+        "SELECT id, course_id FROM lesson AS later WHERE EXISTS ("
+        "SELECT 1 FROM lesson AS earlier WHERE earlier.course_id = later.course_id "
+        "AND earlier.position = later.position AND earlier.id < later.id) ORDER BY id"
+    )).all()
+    for lesson_id, course_id in duplicates:
+        bind.execute(sa.text(
+            "UPDATE lesson SET position = (SELECT MAX(position) + 1 FROM lesson WHERE course_id = :course_id) "
+            "WHERE id = :lesson_id"
+        ), {'course_id': course_id, 'lesson_id': lesson_id})
+    create_index_concurrently('uq_lesson_course_position', 'lesson', ['course_id', 'position'], unique=True)
+    drop_index_concurrently('ix_lesson_course_position', 'lesson')
+
+
+def downgrade():
+    create_index_concurrently('ix_lesson_course_position', 'lesson', ['course_id', 'position'])
+    drop_index_concurrently('uq_lesson_course_position', 'lesson')
@@ -0,0 +1,34 @@
+"""Add server session table
+
+Revision ID: e47b9c6d13a8
+Revises: 8d6a0f3c27b1
+Create Date: 2024-10-24 16:05:29.400817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e47b9c6d13a8'
+down_revision = '8d6a0f3c27b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('server_session',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('server_session', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_server_session_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('server_session', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_server_session_expires_at'))
+
+    op.drop_table('server_session')
@@ -0,0 +1,59 @@
+"""Add tenants and scope users and courses to them
+
+Revision ID: f5c2a8d9b417
+Revises: 0d9a47c3e5f1
+Create Date: 2024-10-29 10:03:51.902114
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c2a8d9b417'
+down_revision = '0d9a47c3e5f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tenant = op.create_table('tenant',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('slug', sa.String(length=64), nullable=False),
+    sa.Column('hostname', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('slug'),
+    sa.UniqueConstraint('hostname')
+    )
+    # Everything that exists today belongs to the default school (id 1).
+    op.bulk_insert(tenant, [{'id': 1, 'name': 'Default', 'slug': 'default', 'created_at': datetime.utcnow()}])
+    if op.get_context().dialect.name == 'postgresql':
+        # The explicit id does not advance the serial; the next school would get 1 again.
+        op.execute("SELECT setval(pg_get_serial_sequence('tenant', 'id'), (SELECT max(id) FROM tenant))")
+
+    for table in ('user', 'course'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('tenant_id', sa.Integer(), nullable=False, server_default='1'))
+            batch_op.create_foreign_key(f'fk_{table}_tenant_id', 'tenant', ['tenant_id'], ['id'])
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('tenant_id', server_default=None)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_tenant_email', ['tenant_id', 'email'], unique=False)
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.create_index('ix_course_tenant_active', ['tenant_id', 'deleted_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_tenant_active')
+        batch_op.drop_constraint('fk_course_tenant_id', type_='foreignkey')
+        batch_op.drop_column('tenant_id')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_tenant_email')
+        batch_op.drop_constraint('fk_user_tenant_id', type_='foreignkey')
+        batch_op.drop_column('tenant_id')
+    op.drop_table('tenant')
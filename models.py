@@ -1,8 +1,38 @@
+from datetime import datetime
 from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from grading import parse_options
 
-class User(UserMixin, db.Model):
+DEFAULT_TENANT_ID = 1
+
+class Tenant(db.Model):
+    """A school; every user and course belongs to exactly one."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(64), unique=True, nullable=False)
+    # Requests for this host are served as this tenant; unmatched hosts get
+    # the default tenant.
+    hostname = db.Column(db.String(255), unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+def _default_tenant_id():
+    from tenancy import current_tenant_id
+    return current_tenant_id()
+
+class TenantScoped:
+    """Mixin for rows owned by a tenant; queries in a request are filtered
+    to the request's tenant (see tenancy.py)."""
+    # Each model declares the foreign key in __table_args__, named like the
+    # constraint the migration creates, so a create_all() schema can be
+    # downgraded too.
+    tenant_id = db.Column(db.Integer, nullable=False, default=_default_tenant_id)
+
+class User(UserMixin, TenantScoped, db.Model):
+    __table_args__ = (
+        db.ForeignKeyConstraint(['tenant_id'], ['tenant.id'], name='fk_user_tenant_id'),
+        db.Index('ix_user_tenant_email', 'tenant_id', 'email'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -16,31 +46,171 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-class Course(db.Model):
+class Course(TenantScoped, db.Model):
+    __table_args__ = (
+        # Catalog pages read one tenant's active courses in id order.
+        db.ForeignKeyConstraint(['tenant_id'], ['tenant.id'], name='fk_course_tenant_id'),
+        db.Index('ix_course_tenant_active', 'tenant_id', 'deleted_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_filename = db.Column(db.String(255))
     teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Set when the teacher deletes the course; the rows are purged later by
+    # the purge_course background task.
+    deleted_at = db.Column(db.DateTime, index=True)
     teacher = db.relationship('User', backref=db.backref('courses', lazy=True))
-    lessons = db.relationship('Lesson', backref='course', lazy=True, cascade='all, delete-orphan')
+    lessons = db.relationship('Lesson', backref='course', lazy=True, cascade='all, delete-orphan', order_by='Lesson.position')
+
+    @classmethod
+    def active(cls):
+        return cls.query.filter(cls.deleted_at.is_(None))
 
 class Lesson(db.Model):
+    __table_args__ = (
+        db.Index('uq_lesson_course_position', 'course_id', 'position', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     video_link = db.Column(db.String(255))
     file_attachment_filename = db.Column(db.String(255))
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    # Ordinal within the course; doubles as the bit index in Enrollment.progress_bits.
+    position = db.Column(db.Integer, nullable=False, default=0)
+    # Compiled by content.render_lesson() whenever content changes, so page
+    # views never run the Markdown parser or sanitizer.
+    content_html = db.Column(db.Text)
+    content_excerpt = db.Column(db.String(300))
+    content_hash = db.Column(db.String(64))
+    renderer_version = db.Column(db.Integer)
+    # oEmbed metadata for video_link, filled in by the fetch_video_metadata
+    # task; pages only ever read these columns.
+    video_title = db.Column(db.String(255))
+    video_duration = db.Column(db.Integer)
+    video_thumbnail_url = db.Column(db.String(500))
+    video_metadata_fetched_at = db.Column(db.DateTime)
     quiz = db.relationship('Quiz', backref='lesson', lazy=True, uselist=False, cascade='all, delete-orphan')
 
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False, unique=True, index=True)
     questions = db.relationship('Question', backref='quiz', lazy=True, cascade='all, delete-orphan')
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     correct_answer = db.Column(db.String(255), nullable=False)
+    question_type = db.Column(db.String(20), nullable=False, default='text')
+    # JSON text, e.g. {"choices": [...]} or {"tolerance": "0.5%"}; kept as a
+    # string so it can key the per-process grader cache directly.
+    options = db.Column(db.Text)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+
+    @property
+    def choices(self):
+        return parse_options(self.options).get('choices', ())
+
+class Enrollment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='uq_enrollment_user_course'),
+        db.Index('ix_enrollment_user_enrolled', 'user_id', 'enrolled_at', 'course_id'),
+        db.Index('ix_enrollment_course_enrolled', 'course_id', 'enrolled_at', 'user_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    enrolled_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    progress_bits = db.Column(db.LargeBinary, nullable=False, default=b'')
+    user = db.relationship('User', backref=db.backref('enrollments', lazy='dynamic', cascade='all, delete-orphan'))
+    course = db.relationship('Course', backref=db.backref('enrollments', lazy='dynamic', cascade='all, delete-orphan'))
+
+class QuizAttempt(db.Model):
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_quiz_created', 'quiz_id', 'created_at'),
+        db.Index('ix_quiz_attempt_user_quiz', 'user_id', 'quiz_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Aggregates below are sharded counters: each graded attempt increments one
+# randomly chosen shard row so concurrent submissions don't queue on a single
+# hot row. compact_analytics() periodically folds the shards back into shard 0.
+
+class QuestionStat(db.Model):
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+class QuizStat(db.Model):
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+class QuizScoreBucket(db.Model):
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    bucket = db.Column(db.SmallInteger, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class CourseCompletionStat(db.Model):
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    students = db.Column(db.Integer, nullable=False, default=0)
+    average = db.Column(db.Float, nullable=False, default=0.0)
+    histogram = db.Column(db.JSON, nullable=False, default=list)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ServerSession(db.Model):
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Task(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    # Queued tasks become claimable at visible_at; claiming pushes it forward
+    # by the visibility timeout so a crashed worker's task is retried later.
+    visible_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+db.Index('ix_task_claim', Task.status, Task.priority.desc(), Task.visible_at)
+
+class BackfillCheckpoint(db.Model):
+    """Progress of a chunked data backfill (see backfill.py), so an
+    interrupted run resumes after the last committed batch."""
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# Precomputed by recommendations.refresh_recommendations(); pages read them
+# with one primary-key range scan and never compute similarities themselves.
+
+class CourseNeighbor(db.Model):
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+class UserRecommendation(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
@@ -0,0 +1,224 @@
+"""Connection pool telemetry.
+
+``instrument_engine`` hooks the engine's pool events and keeps per-process
+counters in a ``PoolMetrics``. Every few seconds the process writes a
+snapshot to ``<stats_dir>/<pid>.json`` (on checkin, so idle workers cost
+nothing); the /metrics route and ``manage.py pool_stats`` add up the
+snapshots of every live worker.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import event, exc
+
+# Upper bounds (seconds) of the checkout wait histogram.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+COUNTERS = ('checkouts', 'checkins', 'connects', 'recycled', 'invalidated',
+            'pre_ping_failures', 'idle_pings')
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.pool = None
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.counters)
+            snapshot.update(
+                wait_buckets=list(self.wait_buckets),
+                wait_sum=self.wait_sum,
+                wait_max=self.wait_max,
+            )
+        snapshot['in_use'] = snapshot['checkouts'] - snapshot['checkins']
+        # QueuePool knows its own size and overflow; other pools report 0.
+        pool = self.pool
+        snapshot['size'] = pool.size() if hasattr(pool, 'size') else 0
+        snapshot['overflow'] = max(pool.overflow(), 0) if hasattr(pool, 'overflow') else 0
+        snapshot['pid'] = os.getpid()
+        snapshot['written_at'] = time.time()
+        return snapshot
+
+
+def _ping(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    finally:
+        cursor.close()
+
+
+def _time_checkout_waits(pool, metrics):
+    # Pools have no "checkout requested" event, so the wait (queueing, any
+    # new connection and the idle ping) is timed around the public
+    # Pool.connect(), which is what the engine calls for every checkout.
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            metrics.observe_wait(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    metrics.pool = pool
+
+
+def instrument_engine(engine, ping_idle_seconds=None, stats_dir=None, interval=10):
+    """Attach pool listeners to ``engine``; returns the PoolMetrics.
+
+    With ``ping_idle_seconds`` set, a checked-out connection is pinged only
+    if it has sat idle in the pool for longer than that (use instead of
+    pool_pre_ping, which pings on every checkout).
+    """
+    metrics = PoolMetrics()
+    last_write = [0.0]
+    _time_checkout_waits(engine.pool, metrics)
+
+    @event.listens_for(engine, 'engine_disposed')
+    def on_dispose(engine):
+        # dispose() swaps in a fresh pool; the listeners below carry over,
+        # the timing wrapper does not.
+        _time_checkout_waits(engine.pool, metrics)
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, record):
+        metrics.incr('connects')
+        # record_info survives reconnects; a second connect on a record that
+        # was not invalidated means the old connection was recycled.
+        if record.record_info.get('connected') and not record.record_info.pop('invalidated', False):
+            metrics.incr('recycled')
+        record.record_info['connected'] = True
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, record, exception):
+        metrics.incr('invalidated')
+        record.record_info['invalidated'] = True
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, record, proxy):
+        checked_in_at = record.info.get('checked_in_at')
+        if ping_idle_seconds and checked_in_at and time.monotonic() - checked_in_at > ping_idle_seconds:
+            metrics.incr('idle_pings')
+            try:
+                _ping(dbapi_connection)
+            except Exception as e:
+                metrics.incr('pre_ping_failures')
+                # The pool invalidates this connection and retries the checkout.
+                raise exc.DisconnectionError() from e
+        # Counted only once the connection is handed out: a failed ping is
+        # retried as a second checkout but checked in just once.
+        metrics.incr('checkouts')
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, record):
+        metrics.incr('checkins')
+        if dbapi_connection is not None:
+            record.info['checked_in_at'] = time.monotonic()
+        if stats_dir and time.monotonic() - last_write[0] > interval:
+            last_write[0] = time.monotonic()
+            write_snapshot(stats_dir, metrics.snapshot())
+
+    @event.listens_for(engine, 'handle_error')
+    def on_error(context):
+        if context.is_pre_ping:
+            metrics.incr('pre_ping_failures')
+
+    return metrics
+
+
+def write_snapshot(stats_dir, snapshot):
+    os.makedirs(stats_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=stats_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(stats_dir, f"{snapshot['pid']}.json"))
+
+
+def read_snapshots(stats_dir, max_age=300):
+    """Snapshots written by live workers; stale files are removed."""
+    snapshots = []
+    try:
+        names = os.listdir(stats_dir)
+    except FileNotFoundError:
+        return snapshots
+    now = time.time()
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(stats_dir, name)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - snapshot['written_at'] > max_age:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def aggregate(snapshots):
+    total = dict.fromkeys(COUNTERS + ('in_use', 'size', 'overflow'), 0)
+    total.update(wait_buckets=[0] * len(WAIT_BUCKETS), wait_sum=0.0, wait_max=0.0, processes=len(snapshots))
+    for snapshot in snapshots:
+        for key in COUNTERS + ('in_use', 'size', 'overflow'):
+            total[key] += snapshot[key]
+        total['wait_buckets'] = [a + b for a, b in zip(total['wait_buckets'], snapshot['wait_buckets'])]
+        total['wait_sum'] += snapshot['wait_sum']
+        total['wait_max'] = max(total['wait_max'], snapshot['wait_max'])
+    return total
+
+
+def render_prometheus(stats):
+    """Prometheus text exposition of aggregated pool stats."""
+    lines = []
+    for name in COUNTERS:
+        lines.append(f'# TYPE db_pool_{name}_total counter')
+        lines.append(f'db_pool_{name}_total {stats[name]}')
+    for name in ('in_use', 'size', 'overflow'):
+        lines.append(f'# TYPE db_pool_{name} gauge')
+        lines.append(f'db_pool_{name} {stats[name]}')
+    lines.append('# TYPE db_pool_checkout_wait_seconds histogram')
+    cumulative = 0
+    for bound, count in zip(WAIT_BUCKETS, stats['wait_buckets']):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'db_pool_checkout_wait_seconds_bucket{{le="{le}"}} {cumulative}')
+    lines.append(f'db_pool_checkout_wait_seconds_sum {stats["wait_sum"]}')
+    lines.append(f'db_pool_checkout_wait_seconds_count {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def collect(metrics, stats_dir=None):
+    """Deployment-wide stats: this process's live numbers plus the latest
+    snapshot of every other worker sharing ``stats_dir``."""
+    if not stats_dir:
+        return aggregate([metrics.snapshot()])
+    write_snapshot(stats_dir, metrics.snapshot())
+    return aggregate(read_snapshots(stats_dir))
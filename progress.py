@@ -0,0 +1,131 @@
+import numpy as np
+from sqlalchemy import select, func
+from app import db
+from models import Course, Lesson, Enrollment
+
+# Bit ``n`` of an enrollment's progress lives in byte ``n // 8`` at mask
+# ``1 << (n % 8)`` (little-endian bit order), so the blob only grows as far
+# as the highest completed lesson.
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+def set_bit(bits, ordinal):
+    buf = bytearray(bits or b'')
+    index, mask = divmod(ordinal, 8)
+    if len(buf) <= index:
+        buf.extend(b'\x00' * (index + 1 - len(buf)))
+    buf[index] |= 1 << mask
+    return bytes(buf)
+
+
+def clear_bit(bits, ordinal):
+    buf = bytearray(bits or b'')
+    index, mask = divmod(ordinal, 8)
+    if index < len(buf):
+        buf[index] &= ~(1 << mask) & 0xFF
+    return bytes(buf.rstrip(b'\x00'))
+
+
+def is_bit_set(bits, ordinal):
+    index, mask = divmod(ordinal, 8)
+    return bool(bits) and index < len(bits) and bool(bits[index] & (1 << mask))
+
+
+def popcount(bits):
+    return int.from_bytes(bits or b'', 'little').bit_count()
+
+
+def completed_ordinals(bits):
+    value = int.from_bytes(bits or b'', 'little')
+    return {i for i in range(value.bit_length()) if value >> i & 1}
+
+
+def completion_percentage(bits, lesson_count):
+    if not lesson_count:
+        return 0.0
+    return min(popcount(bits), lesson_count) * 100.0 / lesson_count
+
+
+def next_lesson_position(course_id):
+    """Position for a new lesson at the end of the course.
+
+    Locks the course row until the caller commits, so two lessons created
+    at once cannot both read the same max(position); the unique index on
+    (course_id, position) covers databases without FOR UPDATE (SQLite).
+    """
+    db.session.execute(select(Course.id).where(Course.id == course_id).with_for_update())
+    stmt = select(func.coalesce(func.max(Lesson.position) + 1, 0)).where(Lesson.course_id == course_id)
+    return db.session.scalar(stmt)
+
+
+def lesson_count(course_id):
+    return db.session.scalar(select(func.count(Lesson.id)).where(Lesson.course_id == course_id))
+
+
+def mark_lesson_complete(user_id, lesson, completed=True):
+    """Set or clear the lesson's bit for the user's enrollment.
+
+    Returns False when the user is not enrolled in the lesson's course.
+    """
+    enrollment = db.session.execute(
+        select(Enrollment)
+        .where(Enrollment.user_id == user_id, Enrollment.course_id == lesson.course_id)
+        .with_for_update()
+    ).scalar_one_or_none()
+    if enrollment is None:
+        return False
+    if completed:
+        enrollment.progress_bits = set_bit(enrollment.progress_bits, lesson.position)
+    else:
+        enrollment.progress_bits = clear_bit(enrollment.progress_bits, lesson.position)
+    db.session.commit()
+    return True
+
+
+def _progress_matrix(course_id, width, batch_size=5000):
+    # Read the raw blobs only (no ORM objects) and pad them to a fixed width
+    # so the whole course becomes one (enrollments x bytes) uint8 matrix.
+    stmt = (
+        select(Enrollment.progress_bits)
+        .where(Enrollment.course_id == course_id)
+        .execution_options(yield_per=batch_size)
+    )
+    chunks = []
+    rows = 0
+    for bits in db.session.execute(stmt).scalars():
+        chunks.append((bits or b'')[:width].ljust(width, b'\x00'))
+        rows += 1
+    if not rows or not width:
+        return np.zeros((rows, width), dtype=np.uint8)
+    return np.frombuffer(b''.join(chunks), dtype=np.uint8).reshape(rows, width)
+
+
+def course_completion_stats(course_id, bins=10):
+    """Completion histogram and per-lesson completion counts for a course.
+
+    Returns a dict with ``histogram`` (student counts per percentage bucket),
+    ``bin_edges``, ``lesson_completions`` (students who completed each lesson
+    ordinal) and ``students``.
+    """
+    total_lessons = lesson_count(course_id)
+    width = (total_lessons + 7) // 8
+    matrix = _progress_matrix(course_id, width)
+    students = matrix.shape[0]
+
+    if total_lessons:
+        completed = _POPCOUNT[matrix].sum(axis=1)
+        percentages = np.minimum(completed, total_lessons) * 100.0 / total_lessons
+        per_lesson = np.unpackbits(matrix, axis=1, bitorder='little')[:, :total_lessons].sum(axis=0)
+    else:
+        percentages = np.zeros(students)
+        per_lesson = np.zeros(0, dtype=np.int64)
+
+    histogram, edges = np.histogram(percentages, bins=bins, range=(0, 100))
+    return {
+        'students': students,
+        'lessons': total_lessons,
+        'histogram': histogram.tolist(),
+        'bin_edges': edges.tolist(),
+        'lesson_completions': per_lesson.astype(int).tolist(),
+        'average': float(percentages.mean()) if students else 0.0,
+    }
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from sqlalchemy import insert, select
+from app import db
+from models import Quiz, Question
+from grading import build_question
+from db_helpers import upsert_insert
+
+INSERT_BATCH_SIZE = 1000
+
+
+class QuestionImportError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def _csv_rows(text):
+    # Columns: question, answer, type, choices (separated by "|"), tolerance.
+    # Multi-select answers are also separated by "|". A header row is optional.
+    reader = csv.reader(io.StringIO(text.strip()))
+    for line_number, row in enumerate(reader, start=1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if line_number == 1 and row[0].strip().lower() in ('question', 'content'):
+            continue
+        yield line_number, row
+
+
+def _csv_fields(row):
+    row = row + [''] * (5 - len(row))
+    question, answer, question_type, choices, tolerance = (cell.strip() for cell in row[:5])
+    choices = [choice.strip() for choice in choices.split('|') if choice.strip()]
+    answer = '\n'.join(part.strip() for part in answer.split('|')) if question_type == 'multi_select' else answer
+    return question, answer, question_type, choices, tolerance
+
+
+def _scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def _json_fields(item):
+    if not isinstance(item, dict):
+        raise ValueError('expected an object.')
+    question = item.get('question', item.get('content', ''))
+    answer = item.get('answer', item.get('correct_answer', ''))
+    question_type = item.get('type', item.get('question_type', 'text'))
+    choices = item.get('choices') or []
+    tolerance = item.get('tolerance')
+    if not isinstance(question, str):
+        raise ValueError('"question" must be a string.')
+    if isinstance(answer, list) and all(_scalar(value) for value in answer):
+        answer = '\n'.join(str(value) for value in answer)
+    elif not _scalar(answer):
+        raise ValueError('"answer" must be a string, a number or a list of them.')
+    if not isinstance(question_type, str):
+        raise ValueError('"type" must be a string.')
+    if not isinstance(choices, list) or not all(_scalar(choice) for choice in choices):
+        raise ValueError('"choices" must be a list of strings.')
+    if tolerance is not None and not _scalar(tolerance):
+        raise ValueError('"tolerance" must be a string or a number.')
+    return (question, str(answer), question_type, [str(choice) for choice in choices],
+            None if tolerance is None else str(tolerance))
+
+
+def _json_rows(text):
+    # A list of objects: {"question", "answer", "type", "choices", "tolerance"};
+    # multi-select answers may be given as a list.
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise QuestionImportError([f'Invalid JSON: {e}'])
+    if not isinstance(items, list):
+        raise QuestionImportError(['Expected a JSON list of questions.'])
+    return enumerate(items, start=1)
+
+
+# format: (row label, row reader, row -> build_question() arguments)
+FORMATS = {
+    'csv': ('Line', _csv_rows, _csv_fields),
+    'json': ('Item', _json_rows, _json_fields),
+}
+
+
+def parse_questions(text, fmt='csv'):
+    """Parse pasted CSV or JSON into validated question rows.
+
+    All rows are checked before anything is returned, and every problem is
+    reported at once through QuestionImportError.
+    """
+    rows, errors = [], []
+    label, reader, fields = FORMATS[fmt]
+    for number, row in reader(text):
+        try:
+            rows.append(build_question(*fields(row)))
+        except ValueError as e:
+            errors.append(f'{label} {number}: {e}')
+    if errors:
+        raise QuestionImportError(errors)
+    return rows
+
+
+def add_questions(lesson, rows):
+    """Append question rows to the lesson's quiz in a single transaction.
+
+    The quiz is created on first use; questions go in with multi-row INSERT
+    statements rather than one ORM flush per question.
+    """
+    try:
+        quiz = lesson.quiz
+        if quiz is None:
+            # A lesson has at most one quiz; if another request created it
+            # first, the insert does nothing and that quiz is used.
+            db.session.execute(
+                upsert_insert(Quiz.__table__).values(lesson_id=lesson.id)
+                .on_conflict_do_nothing(index_elements=['lesson_id'])
+            )
+            quiz = db.session.scalars(select(Quiz).where(Quiz.lesson_id == lesson.id)).one()
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = [dict(row, quiz_id=quiz.id) for row in rows[start:start + INSERT_BATCH_SIZE]]
+            db.session.execute(insert(Question.__table__).values(batch))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire(quiz, ['questions'])
+    return quiz
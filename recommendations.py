@@ -0,0 +1,222 @@
+"""Course recommendations from a precomputed item-item similarity index.
+
+refresh_recommendations() is a batch job (``manage.py
+refresh_recommendations`` or the ``refresh_recommendations`` task). For each
+school it describes every active course in two ways:
+
+* behaviour: a vector over students, 1 for an enrollment plus
+  RECOMMENDATION_QUIZ_WEIGHT * log(1 + quiz attempts) in the course;
+* text: TF-IDF over the title and description.
+
+The cosine similarities of the two are blended (RECOMMENDATION_TEXT_WEIGHT
+is the text share), and each course keeps its RECOMMENDATION_NEIGHBORS most
+similar courses in CourseNeighbor. A student's scores are their own course
+vector times that neighbour matrix. Courses they already take are left out,
+and the best RECOMMENDATIONS_PER_USER go to UserRecommendation.
+
+Similarities are computed BLOCK_SIZE courses (or students) at a time, so
+memory grows with the number of courses rather than its square. Pages only
+read the stored rows (recommended_courses, similar_courses), one primary key
+range each.
+"""
+import re
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select, delete, insert, exists, func
+from app import app, db
+from models import (Course, Enrollment, Lesson, Quiz, QuizAttempt, Tenant, User, CourseNeighbor,
+                    UserRecommendation)
+from db_helpers import chunked
+
+BLOCK_SIZE = 1000
+INSERT_BATCH_SIZE = 1000
+
+_WORD = re.compile(r'[^\W\d_]{2,}')
+STOP_WORDS = frozenset("""
+    a an and are as at be by for from how in into is it its of on or that the this to with you your
+    will can course learn learning introduction intro basics students lesson lessons
+""".split())
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall((text or '').lower()) if word not in STOP_WORDS]
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms) @ matrix)
+
+
+def tfidf_matrix(documents):
+    """One L2-normalised TF-IDF row per document (log-scaled term counts,
+    smoothed idf)."""
+    vocabulary = {}
+    rows, columns, counts = [], [], []
+    for i, document in enumerate(documents):
+        for word, count in Counter(tokenize(document)).items():
+            rows.append(i)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+            counts.append(count)
+    tf = 1.0 + np.log(np.asarray(counts, dtype=np.float64))
+    matrix = sp.csr_matrix((tf, (rows, columns)), shape=(len(documents), len(vocabulary)))
+    document_frequency = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0
+    return _normalize_rows(matrix @ sp.diags(idf))
+
+
+def interaction_matrix(tenant_id, course_index, quiz_weight):
+    """(student ids, students x courses matrix) of enrollments and quiz attempts.
+
+    Only the school's own students count: their recommendations are what
+    refresh_tenant() replaces, so a student of another school enrolled here
+    would otherwise get a second set of rows from their own school's refresh.
+    """
+    enrollments = db.session.execute(
+        select(Enrollment.user_id, Enrollment.course_id, func.count())
+        .join(Course, Course.id == Enrollment.course_id)
+        .join(User, User.id == Enrollment.user_id)
+        .where(Course.tenant_id == tenant_id, Course.deleted_at.is_(None), User.tenant_id == tenant_id)
+        .group_by(Enrollment.user_id, Enrollment.course_id),
+        execution_options={'all_tenants': True},
+    ).all()
+    attempts = db.session.execute(
+        select(QuizAttempt.user_id, Lesson.course_id, func.count())
+        .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .join(Lesson, Lesson.id == Quiz.lesson_id)
+        .join(Course, Course.id == Lesson.course_id)
+        .join(User, User.id == QuizAttempt.user_id)
+        .where(Course.tenant_id == tenant_id, Course.deleted_at.is_(None), User.tenant_id == tenant_id)
+        .group_by(QuizAttempt.user_id, Lesson.course_id),
+        execution_options={'all_tenants': True},
+    ).all()
+    user_index = {}
+    rows, columns, values = [], [], []
+    for pairs, weight in ((enrollments, lambda count: 1.0), (attempts, lambda count: quiz_weight * np.log1p(count))):
+        for user_id, course_id, count in pairs:
+            rows.append(user_index.setdefault(user_id, len(user_index)))
+            columns.append(course_index[course_id])
+            values.append(weight(count))
+    # Duplicate (student, course) entries are summed.
+    matrix = sp.csr_matrix((values, (rows, columns)), shape=(len(user_index), len(course_index)))
+    return list(user_index), matrix
+
+
+def top_k_rows(matrix, k, exclude=None):
+    """Yield (row, columns, scores) for the ``k`` highest positive entries
+    of each row, best first, leaving out columns set in ``exclude``."""
+    matrix = sp.csr_matrix(matrix)
+    if exclude is not None:
+        matrix = matrix - matrix.multiply(sp.csr_matrix(exclude) != 0)
+        matrix.eliminate_zeros()
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns, scores = matrix.indices[start:end], matrix.data[start:end]
+        positive = scores > 0
+        columns, scores = columns[positive], scores[positive]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            columns, scores = columns[best], scores[best]
+        order = np.lexsort((columns, -scores))
+        yield row, columns[order], scores[order]
+
+
+def neighbor_matrix(behaviour, text, k, text_weight):
+    """Courses x courses matrix holding each course's ``k`` nearest neighbours."""
+    count = behaviour.shape[0]
+    rows, columns, scores = [], [], []
+    for start in range(0, count, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, count)
+        similarity = ((1.0 - text_weight) * (behaviour[start:end] @ behaviour.T)
+                      + text_weight * (text[start:end] @ text.T))
+        itself = sp.eye(end - start, count, k=start)
+        for row, best, best_scores in top_k_rows(similarity, k, exclude=itself):
+            rows.extend([start + row] * len(best))
+            columns.extend(best)
+            scores.extend(best_scores)
+    return sp.csr_matrix((scores, (rows, columns)), shape=(count, count))
+
+
+def user_recommendations(interactions, neighbors, k):
+    """Yield (student row, course columns, scores) from the neighbour matrix."""
+    for start in range(0, interactions.shape[0], BLOCK_SIZE):
+        block = interactions[start:start + BLOCK_SIZE]
+        for row, best, best_scores in top_k_rows(block @ neighbors, k, exclude=block):
+            yield start + row, best, best_scores
+
+
+def _insert(model, rows):
+    for batch in chunked(rows, INSERT_BATCH_SIZE):
+        db.session.execute(insert(model), batch)
+
+
+def refresh_tenant(tenant_id, neighbors=None, per_user=None, text_weight=None, quiz_weight=None):
+    """Rebuild one school's CourseNeighbor and UserRecommendation rows in a
+    single transaction; returns (courses, students) indexed."""
+    neighbors = neighbors or app.config['RECOMMENDATION_NEIGHBORS']
+    per_user = per_user or app.config['RECOMMENDATIONS_PER_USER']
+    text_weight = app.config['RECOMMENDATION_TEXT_WEIGHT'] if text_weight is None else text_weight
+    quiz_weight = app.config['RECOMMENDATION_QUIZ_WEIGHT'] if quiz_weight is None else quiz_weight
+
+    courses = db.session.execute(
+        select(Course.id, Course.title, Course.description)
+        .where(Course.tenant_id == tenant_id, Course.deleted_at.is_(None))
+        .order_by(Course.id),
+        execution_options={'all_tenants': True},
+    ).all()
+    course_ids = [course.id for course in courses]
+    course_index = {course_id: i for i, course_id in enumerate(course_ids)}
+    user_ids, interactions = interaction_matrix(tenant_id, course_index, quiz_weight)
+
+    behaviour = _normalize_rows(interactions.T)
+    text = tfidf_matrix([f'{course.title} {course.description}' for course in courses])
+    nearest = neighbor_matrix(behaviour, text, neighbors, text_weight)
+
+    db.session.execute(delete(CourseNeighbor).where(
+        CourseNeighbor.course_id.in_(select(Course.id).where(Course.tenant_id == tenant_id))))
+    db.session.execute(delete(UserRecommendation).where(
+        UserRecommendation.user_id.in_(select(User.id).where(User.tenant_id == tenant_id))))
+    _insert(CourseNeighbor, (
+        {'course_id': course_ids[row], 'rank': rank, 'neighbor_id': course_ids[column], 'score': float(score)}
+        for row, columns, scores in top_k_rows(nearest, neighbors)
+        for rank, (column, score) in enumerate(zip(columns, scores))
+    ))
+    _insert(UserRecommendation, (
+        {'user_id': user_ids[row], 'rank': rank, 'course_id': course_ids[column], 'score': float(score)}
+        for row, columns, scores in user_recommendations(interactions, nearest, per_user)
+        for rank, (column, score) in enumerate(zip(columns, scores))
+    ))
+    db.session.commit()
+    return len(course_ids), len(user_ids)
+
+
+def refresh_recommendations(**options):
+    """Rebuild the index for every school; returns {tenant id: (courses, students)}."""
+    tenant_ids = db.session.scalars(select(Tenant.id).order_by(Tenant.id)).all()
+    return {tenant_id: refresh_tenant(tenant_id, **options) for tenant_id in tenant_ids}
+
+
+def recommended_courses(user_id, limit=6):
+    """The user's stored recommendations, best first, minus courses they
+    joined or that were deleted since the last refresh."""
+    return (
+        Course.query
+        .join(UserRecommendation, UserRecommendation.course_id == Course.id)
+        .filter(UserRecommendation.user_id == user_id, Course.deleted_at.is_(None),
+                ~exists().where(Enrollment.user_id == user_id, Enrollment.course_id == Course.id))
+        .order_by(UserRecommendation.rank)
+        .limit(limit)
+        .all()
+    )
+
+
+def similar_courses(course_id, limit=4):
+    return (
+        Course.query
+        .join(CourseNeighbor, CourseNeighbor.neighbor_id == Course.id)
+        .filter(CourseNeighbor.course_id == course_id, Course.deleted_at.is_(None))
+        .order_by(CourseNeighbor.rank)
+        .limit(limit)
+        .all()
+    )
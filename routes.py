@@ -1,16 +1,47 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import render_template, redirect, url_for, flash, request, abort, Response, jsonify, session
 from flask_login import login_user, login_required, logout_user, current_user
-from app import app, db, images
+from app import app, db, images, db_pool_metrics, memory_profiler, cpu_profiler
 from models import User, Course, Lesson, Quiz, Question
+from enrollment import enroll, unenroll, get_enrollment, my_courses_query, roster_query
+from grading import grade
+from task_queue import enqueue
+from course_purge import soft_delete_course
+from content import render_lesson
+from jobs import schedule_video_metadata  # also registers background task handlers
+from quiz_authoring import parse_questions, add_questions, QuestionImportError
+from analytics import record_attempt, course_dashboard
+from session_store import regenerate_session
+from recommendations import recommended_courses, similar_courses
+from progress import completed_ordinals, completion_percentage, mark_lesson_complete, next_lesson_position, course_completion_stats
 from forms import RegistrationForm, LoginForm, CourseForm, LessonForm, QuizForm
 from sqlalchemy.exc import SQLAlchemyError
+from video_metadata import format_duration
 import logging
 import os
+import secrets
+import pool_metrics
+from memory_profiling import request_dump
+from cpu_profiler import request_profile
+
+app.add_template_filter(format_duration, 'duration')
+
+# Soft-deleted courses (and everything in them) are gone as far as the
+# site is concerned, even before the purge task has removed the rows.
+def get_course_or_404(course_id):
+    return Course.active().filter_by(id=course_id).first_or_404()
+
+def get_lesson_or_404(lesson_id):
+    return Lesson.query.join(Course).filter(Lesson.id == lesson_id, Course.deleted_at.is_(None)).first_or_404()
+
+def get_quiz_or_404(quiz_id):
+    return (Quiz.query.join(Lesson).join(Course)
+            .filter(Quiz.id == quiz_id, Course.deleted_at.is_(None)).first_or_404())
 
 @app.route('/')
 def index():
-    courses = Course.query.all()
-    return render_template('index.html', courses=courses)
+    courses = Course.active().all()
+    recommended = recommended_courses(current_user.id) if current_user.is_authenticated else []
+    return render_template('index.html', courses=courses, recommended=recommended)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -34,6 +65,7 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user and user.check_password(form.password.data):
+            regenerate_session(session)
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('index'))
@@ -44,12 +76,22 @@ def login():
 @app.route('/logout')
 def logout():
     logout_user()
+    regenerate_session(session)
     return redirect(url_for('index'))
 
 @app.route('/course/<int:course_id>')
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
-    return render_template('course_detail.html', title=course.title, course=course)
+    course = get_course_or_404(course_id)
+    enrollment = get_enrollment(current_user.id, course.id) if current_user.is_authenticated else None
+    progress = None
+    if enrollment:
+        progress = {
+            'completed': completed_ordinals(enrollment.progress_bits),
+            'percentage': completion_percentage(enrollment.progress_bits, len(course.lessons)),
+        }
+    return render_template('course_detail.html', title=course.title, course=course,
+                           enrolled=enrollment is not None, progress=progress,
+                           similar=similar_courses(course.id))
 
 @app.route('/create_course', methods=['GET', 'POST'])
 @login_required
@@ -72,7 +114,7 @@ def create_course():
 @app.route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_course(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = get_course_or_404(course_id)
     if course.teacher != current_user:
         flash('You can only edit your own courses.', 'warning')
         return redirect(url_for('course_detail', course_id=course.id))
@@ -83,7 +125,7 @@ def edit_course(course_id):
         course.description = form.description.data
         if form.image.data:
             if course.image_filename:
-                os.remove(os.path.join(app.config['UPLOADED_IMAGES_DEST'], course.image_filename))
+                enqueue('delete_upload', {'filename': course.image_filename})
             image_filename = images.save(form.image.data)
             course.image_filename = image_filename
         try:
@@ -100,26 +142,35 @@ def edit_course(course_id):
 @app.route('/course/<int:course_id>/create_lesson', methods=['GET', 'POST'])
 @login_required
 def create_lesson(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = get_course_or_404(course_id)
     if course.teacher != current_user:
         flash('You can only add lessons to your own courses.', 'warning')
         return redirect(url_for('course_detail', course_id=course.id))
     form = LessonForm()
     if form.validate_on_submit():
-        lesson = Lesson(title=form.title.data, content=form.content.data, course=course, video_link=form.video_link.data)
+        lesson = Lesson(title=form.title.data, content=form.content.data, course=course, video_link=form.video_link.data,
+                        position=next_lesson_position(course.id))
         if form.file_attachment.data:
             file_filename = images.save(form.file_attachment.data)
             lesson.file_attachment_filename = file_filename
+        render_lesson(lesson)
         db.session.add(lesson)
+        db.session.flush()
+        schedule_video_metadata(lesson)
         db.session.commit()
         flash('Your lesson has been created!', 'success')
         return redirect(url_for('course_detail', course_id=course.id))
     return render_template('create_lesson.html', title='Create Lesson', form=form, course=course)
 
+@app.route('/lesson/<int:lesson_id>')
+def lesson_detail(lesson_id):
+    lesson = get_lesson_or_404(lesson_id)
+    return render_template('lesson_detail.html', title=lesson.title, lesson=lesson, course=lesson.course)
+
 @app.route('/lesson/<int:lesson_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_lesson(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = get_lesson_or_404(lesson_id)
     if lesson.course.teacher != current_user:
         flash('You can only edit lessons in your own courses.', 'warning')
         return redirect(url_for('course_detail', course_id=lesson.course.id))
@@ -127,10 +178,14 @@ def edit_lesson(lesson_id):
     if form.validate_on_submit():
         lesson.title = form.title.data
         lesson.content = form.content.data
+        video_changed = lesson.video_link != form.video_link.data
         lesson.video_link = form.video_link.data
+        if video_changed:
+            schedule_video_metadata(lesson)
+        render_lesson(lesson)
         if form.file_attachment.data:
             if lesson.file_attachment_filename:
-                os.remove(os.path.join(app.config['UPLOADED_IMAGES_DEST'], lesson.file_attachment_filename))
+                enqueue('delete_upload', {'filename': lesson.file_attachment_filename})
             file_filename = images.save(form.file_attachment.data)
             lesson.file_attachment_filename = file_filename
         db.session.commit()
@@ -138,61 +193,209 @@ def edit_lesson(lesson_id):
         return redirect(url_for('course_detail', course_id=lesson.course.id))
     return render_template('edit_lesson.html', title='Edit Lesson', form=form, lesson=lesson)
 
+@app.route('/lesson/<int:lesson_id>/complete', methods=['POST'])
+@login_required
+def complete_lesson(lesson_id):
+    lesson = get_lesson_or_404(lesson_id)
+    completed = request.form.get('completed', '1') != '0'
+    if not mark_lesson_complete(current_user.id, lesson, completed=completed):
+        flash('Enroll in this course to track your progress.', 'warning')
+    return redirect(url_for('course_detail', course_id=lesson.course_id))
+
 @app.route('/lesson/<int:lesson_id>/create_quiz', methods=['GET', 'POST'])
 @login_required
 def create_quiz(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = get_lesson_or_404(lesson_id)
     if lesson.course.teacher != current_user:
         flash('You can only add quizzes to your own lessons.', 'warning')
         return redirect(url_for('course_detail', course_id=lesson.course.id))
     form = QuizForm()
     if form.validate_on_submit():
-        quiz = Quiz(lesson=lesson)
-        db.session.add(quiz)
-        question = Question(content=form.question.data, correct_answer=form.correct_answer.data, quiz=quiz)
-        db.session.add(question)
-        db.session.commit()
-        flash('Your quiz question has been added!', 'success')
-        return redirect(url_for('course_detail', course_id=lesson.course.id))
+        rows = [entry.form.to_row() for entry in form.questions if not entry.form.is_blank()]
+        try:
+            if form.bulk_paste.data and form.bulk_paste.data.strip():
+                rows += parse_questions(form.bulk_paste.data, form.paste_format.data)
+        except QuestionImportError as e:
+            for error in e.errors:
+                form.bulk_paste.errors.append(error)
+            return render_template('create_quiz.html', title='Create Quiz', form=form, lesson=lesson)
+        if not rows:
+            flash('Add at least one question.', 'warning')
+            return render_template('create_quiz.html', title='Create Quiz', form=form, lesson=lesson)
+        try:
+            add_questions(lesson, rows)
+            flash(f'{len(rows)} quiz question{"s" if len(rows) != 1 else ""} added!', 'success')
+            return redirect(url_for('course_detail', course_id=lesson.course.id))
+        except SQLAlchemyError as e:
+            app.logger.error(f"Error adding quiz questions: {str(e)}")
+            flash('An error occurred while saving the questions. Please try again.', 'danger')
     return render_template('create_quiz.html', title='Create Quiz', form=form, lesson=lesson)
 
 @app.route('/quiz/<int:quiz_id>/take', methods=['GET', 'POST'])
 @login_required
 def take_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_quiz_or_404(quiz_id)
     if request.method == 'POST':
-        score = 0
-        total_questions = len(quiz.questions)
+        results = []
         for question in quiz.questions:
-            user_answer = request.form.get(f'question_{question.id}')
-            if user_answer and user_answer.lower() == question.correct_answer.lower():
-                score += 1
-        percentage = (score / total_questions) * 100
-        return render_template('quiz_results.html', score=score, total=total_questions, percentage=percentage)
+            if question.question_type == 'multi_select':
+                user_answer = request.form.getlist(f'question_{question.id}')
+            else:
+                user_answer = request.form.get(f'question_{question.id}')
+            results.append((question.id, bool(user_answer) and grade(question, user_answer)))
+        try:
+            score, total_questions, percentage = record_attempt(current_user.id, quiz, results)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app.logger.error(f"Error recording quiz attempt: {str(e)}")
+            score = sum(1 for _, is_correct in results if is_correct)
+            total_questions = len(results)
+            percentage = (score / total_questions) * 100 if total_questions else 0.0
+        return render_template('quiz_results.html', title='Quiz Results', quiz=quiz,
+                               score=score, total=total_questions, percentage=percentage)
     return render_template('take_quiz.html', title='Take Quiz', quiz=quiz)
 
 @app.route('/profile')
 @login_required
 def user_profile():
-    return render_template('user_profile.html', title='User Profile', user=current_user)
+    enrolled_courses = db.paginate(my_courses_query(current_user.id), page=1, per_page=6, error_out=False)
+    return render_template('user_profile.html', title='User Profile', user=current_user, enrolled_courses=enrolled_courses)
+
+@app.route('/course/<int:course_id>/enroll', methods=['POST'])
+@login_required
+def enroll_course(course_id):
+    course = get_course_or_404(course_id)
+    if course.teacher == current_user:
+        flash('You cannot enroll in your own course.', 'warning')
+        return redirect(url_for('course_detail', course_id=course.id))
+    try:
+        if enroll(current_user.id, course.id):
+            flash('You have been enrolled in this course!', 'success')
+        else:
+            flash('You are already enrolled in this course.', 'info')
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Error enrolling in course: {str(e)}")
+        flash('An error occurred while enrolling. Please try again.', 'danger')
+    return redirect(url_for('course_detail', course_id=course.id))
+
+@app.route('/course/<int:course_id>/unenroll', methods=['POST'])
+@login_required
+def unenroll_course(course_id):
+    course = get_course_or_404(course_id)
+    try:
+        if unenroll(current_user.id, course.id):
+            flash('You have been unenrolled from this course.', 'success')
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error(f"Error unenrolling from course: {str(e)}")
+        flash('An error occurred while unenrolling. Please try again.', 'danger')
+    return redirect(url_for('course_detail', course_id=course.id))
+
+@app.route('/course/<int:course_id>/progress')
+@login_required
+def course_progress(course_id):
+    course = get_course_or_404(course_id)
+    if course.teacher != current_user:
+        abort(403)
+    stats = course_completion_stats(course.id)
+    return render_template('course_progress.html', title='Course Progress', course=course, stats=stats)
+
+@app.route('/course/<int:course_id>/analytics')
+@login_required
+def course_analytics(course_id):
+    course = get_course_or_404(course_id)
+    if course.teacher != current_user:
+        abort(403)
+    dashboard = course_dashboard(course.id)
+    return render_template('course_analytics.html', title='Course Analytics', course=course, dashboard=dashboard)
+
+@app.route('/my_courses')
+@login_required
+def my_courses():
+    page = request.args.get('page', 1, type=int)
+    pagination = db.paginate(my_courses_query(current_user.id), page=page, per_page=12, error_out=False)
+    return render_template('my_courses.html', title='My Courses', pagination=pagination)
+
+@app.route('/course/<int:course_id>/roster')
+@login_required
+def course_roster(course_id):
+    course = get_course_or_404(course_id)
+    if course.teacher != current_user:
+        abort(403)
+    page = request.args.get('page', 1, type=int)
+    pagination = db.paginate(roster_query(course.id), page=page, per_page=50, error_out=False)
+    return render_template('course_roster.html', title='Roster', course=course, pagination=pagination)
 
 @app.route('/courses')
 def list_courses():
-    courses = Course.query.all()
+    courses = Course.active().all()
     return render_template('courses.html', title='All Courses', courses=courses)
 
 @app.route('/course/<int:course_id>/delete', methods=['POST'])
 @login_required
 def delete_course(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = get_course_or_404(course_id)
     if course.teacher != current_user:
         abort(403)  # Forbidden
     try:
-        db.session.delete(course)
+        soft_delete_course(course)
         db.session.commit()
         flash('Your course has been deleted!', 'success')
     except SQLAlchemyError as e:
         db.session.rollback()
         app.logger.error(f"Error deleting course: {str(e)}")
         flash('An error occurred while deleting the course. Please try again.', 'danger')
-    return redirect(url_for('index'))
\ No newline at end of file
+    return redirect(url_for('index'))
+
+def metrics_authorized():
+    token = app.config['METRICS_TOKEN']
+    if token and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+@app.route('/metrics')
+def metrics():
+    if not metrics_authorized():
+        abort(403)
+    stats = pool_metrics.collect(db_pool_metrics, app.config['POOL_STATS_DIR'])
+    return Response(pool_metrics.render_prometheus(stats), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/memory')
+def memory_profile():
+    if not metrics_authorized():
+        abort(403)
+    return jsonify(memory_profiler.summary())
+
+@app.route('/admin/memory/dump', methods=['POST'])
+def dump_memory_profile():
+    """Dump this worker now and ask the other workers to follow."""
+    if not metrics_authorized():
+        abort(403)
+    paths = memory_profiler.dump()
+    request_dump(app.config['MEMORY_PROFILE_DIR'])
+    return jsonify({'pid': os.getpid(), 'files': paths})
+
+@app.route('/admin/profiler', methods=['GET', 'POST'])
+def cpu_profile():
+    """GET exports this worker's samples (?format=collapsed|speedscope);
+    POST action=start|stop controls it, or with all=1 starts every worker."""
+    if not metrics_authorized():
+        abort(403)
+    if request.method == 'POST':
+        action = request.form.get('action', 'start')
+        duration = request.form.get('duration', 30, type=float)
+        interval = request.form.get('interval', app.config['CPU_PROFILE_INTERVAL'], type=float)
+        if action == 'start' and request.form.get('all'):
+            request_profile(app.config['CPU_PROFILE_DIR'], duration, interval)
+        elif action == 'start':
+            cpu_profiler.start(duration=duration, interval=interval)
+        elif action == 'stop':
+            cpu_profiler.stop()
+        else:
+            abort(400)
+        return jsonify({'pid': os.getpid(), 'running': cpu_profiler.running,
+                        'samples': cpu_profiler.sample_count})
+    if request.args.get('format') == 'speedscope':
+        return jsonify(cpu_profiler.speedscope())
+    return Response(cpu_profiler.collapsed(), mimetype='text/plain')
@@ -0,0 +1,148 @@
+"""Run the test suite in parallel, one worker process per core.
+
+    python run_tests.py [-j N] [MODULE ...]
+
+The fixture template (see testing.py) is seeded once, here, and every worker
+clones it. Test classes are the unit of work. They are handed out longest
+first, using the timings of the previous run, so a slow class does not start
+last on one worker while the others sit idle.
+
+Workers are spawned rather than forked: the app must not be imported before
+a worker has pointed DATABASE_URL at its own database.
+"""
+import argparse
+import glob
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import unittest
+
+import testing
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DURATIONS_FILE = os.path.join(testing.TEST_DB_DIR, 'durations.json')
+
+
+def _iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
+def discover(modules=None):
+    """Ids ("module.Class") of the test classes to run. A module that fails
+    to import is run whole, so a worker reports the error."""
+    if not modules:
+        modules = sorted(os.path.splitext(os.path.basename(path))[0]
+                         for path in glob.glob(os.path.join(ROOT, 'test_*.py')))
+    ids = []
+    for name in modules:
+        try:
+            module = importlib.import_module(name)
+        except Exception:
+            ids.append(name)
+            continue
+        for test in _iter_tests(unittest.defaultTestLoader.loadTestsFromModule(module)):
+            class_id = f'{name}.{type(test).__name__}'
+            if class_id not in ids:
+                ids.append(class_id)
+    return ids
+
+
+def run_class(test_id):
+    """Run one TestCase class (in a worker); returns its outcome."""
+    started = time.perf_counter()
+    suite = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    result = unittest.TextTestRunner(stream=io.StringIO(), verbosity=0).run(suite)
+    failures = [(str(test), trace) for test, trace in result.failures]
+    failures += [(str(test), 'Unexpected success') for test in result.unexpectedSuccesses]
+    return {
+        'id': test_id,
+        'seconds': time.perf_counter() - started,
+        'run': result.testsRun,
+        'skipped': len(result.skipped),
+        'failures': failures,
+        'errors': [(str(test), trace) for test, trace in result.errors],
+    }
+
+
+def load_durations():
+    try:
+        with open(DURATIONS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_durations(durations):
+    with open(DURATIONS_FILE + '.tmp', 'w') as f:
+        json.dump(durations, f)
+    os.replace(DURATIONS_FILE + '.tmp', DURATIONS_FILE)
+
+
+def run(modules=None, jobs=None):
+    """Run the classes on ``jobs`` workers; returns the outcomes."""
+    ids = discover(modules)
+    durations = load_durations()
+    # Unknown classes first: they may be the slow ones.
+    ids.sort(key=lambda test_id: durations.get(test_id, float('inf')), reverse=True)
+    os.environ[testing.TEMPLATE_ENV] = testing.build_template()
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(ids)))
+    outcomes = []
+    # Each worker imports this module, and so testing, before anything else.
+    pool = multiprocessing.get_context('spawn').Pool(jobs)
+    try:
+        for outcome in pool.imap_unordered(run_class, ids):
+            failed = outcome['failures'] or outcome['errors']
+            sys.stderr.write('F' if failed else '.')
+            sys.stderr.flush()
+            outcomes.append(outcome)
+    finally:
+        # close() rather than terminate(), so each worker drops its database.
+        pool.close()
+        pool.join()
+    sys.stderr.write('\n')
+    durations.update((outcome['id'], outcome['seconds']) for outcome in outcomes)
+    save_durations(durations)
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('modules', nargs='*', help='Test modules to run (default: every test_*.py).')
+    parser.add_argument('-j', '--jobs', type=int, help='Worker processes (default: one per core).')
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    try:
+        outcomes = run(args.modules, args.jobs)
+    except Exception:
+        traceback.print_exc()
+        return 2
+    elapsed = time.perf_counter() - started
+    failures = [item for outcome in outcomes for item in outcome['failures']]
+    errors = [item for outcome in outcomes for item in outcome['errors']]
+    for kind, items in (('FAIL', failures), ('ERROR', errors)):
+        for test, trace in items:
+            print('=' * 70)
+            print(f'{kind}: {test}')
+            print('-' * 70)
+            print(trace)
+    tests = sum(outcome['run'] for outcome in outcomes)
+    skipped = sum(outcome['skipped'] for outcome in outcomes)
+    print(f'Ran {tests} tests in {elapsed:.2f}s ({len(outcomes)} classes)')
+    if failures or errors:
+        print(f'FAILED (failures={len(failures)}, errors={len(errors)}, skipped={skipped})')
+        return 1
+    print(f'OK (skipped={skipped})' if skipped else 'OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
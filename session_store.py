@@ -0,0 +1,311 @@
+import copy
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import select, delete
+from app import db
+from models import ServerSession
+from db_helpers import upsert_insert
+
+try:
+    import redis
+except ImportError:  # optional: only needed for SESSION_BACKEND=redis
+    redis = None
+
+
+class LRUCache:
+    """Small thread-safe LRU with a per-entry TTL, shared by one worker."""
+
+    def __init__(self, maxsize=10000, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLSessionStore:
+    """Sessions in the application database (the server_session table)."""
+
+    def get(self, sid):
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(ServerSession.data, ServerSession.expires_at).where(ServerSession.id == sid)
+            ).first()
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return row.data, row.expires_at
+
+    def set(self, sid, data, expires_at):
+        stmt = upsert_insert(ServerSession.__table__).values(id=sid, data=data, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'], set_={'data': stmt.excluded.data, 'expires_at': stmt.excluded.expires_at}
+        )
+        self._write(stmt)
+
+    def delete(self, sid):
+        self._write(delete(ServerSession).where(ServerSession.id == sid))
+
+    def _write(self, stmt):
+        # Runs on its own connection so a session write never commits (or is
+        # rolled back with) whatever the view left in db.session.
+        with db.engine.begin() as connection:
+            connection.execute(stmt)
+
+    def sweep_expired(self, batch_size=1000):
+        """Delete expired sessions in bounded batches; returns rows removed."""
+        removed = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(
+                    select(ServerSession.id)
+                    .where(ServerSession.expires_at <= datetime.utcnow())
+                    .limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    return removed
+                connection.execute(delete(ServerSession).where(ServerSession.id.in_(ids)))
+            removed += len(ids)
+
+
+class RedisSessionStore:
+    """Sessions in Redis (or any server speaking its protocol); TTLs expire keys."""
+
+    def __init__(self, url, prefix='session:'):
+        if redis is None:
+            raise RuntimeError('SESSION_BACKEND=redis requires the redis package.')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        pipe = self.client.pipeline()
+        pipe.get(self.prefix + sid)
+        pipe.pttl(self.prefix + sid)
+        data, ttl = pipe.execute()
+        if data is None:
+            return None
+        return data.decode('utf-8'), datetime.utcnow() + timedelta(milliseconds=max(ttl, 0))
+
+    def set(self, sid, data, expires_at):
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+        self.client.setex(self.prefix + sid, ttl, data)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def sweep_expired(self, batch_size=1000):
+        return 0
+
+
+class ServerSideSession(SessionMixin, MutableMapping):
+    """Session that only hits the store the first time it is actually read.
+
+    Views that never touch ``session`` (or ``current_user``) cost nothing
+    beyond parsing the cookie.
+    """
+
+    # Keys that are set and popped within a single request, so they are never
+    # persisted. flask_login checks for "_remember" after every request; that
+    # check must not force a load.
+    TRANSIENT_KEYS = frozenset({'_remember'})
+
+    def __init__(self, interface, sid=None):
+        self.interface = interface
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.loaded = sid is None
+        self.expires_at = None
+        self._data = {}
+
+    def _load(self):
+        if not self.loaded:
+            self.loaded = True
+            found = self.interface.load(self.sid)
+            if found is None:
+                self.sid = None
+                self.new = True
+            else:
+                self._data, self.expires_at = found
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __contains__(self, key):
+        if not self.loaded and key in self.TRANSIENT_KEYS:
+            return False
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def clear(self):
+        self._load()
+        if self._data:
+            self._data = {}
+            self.modified = True
+
+    def regenerate(self):
+        """Move the session's data to a new id and drop the old one, so an id
+        that someone else knew before login (session fixation) is worthless
+        after it."""
+        self._load()
+        if self.sid is not None:
+            self.interface.discard(self.sid)
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+def regenerate_session(session):
+    """Give the current session a new id on login and logout; Flask's
+    signed-cookie sessions (SESSION_BACKEND=cookie) have no id to rotate."""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = session_json_serializer
+
+    # Sessions holding one of these keys are never kept in the per-worker
+    # cache, so a logout or id rotation on one worker takes effect on every
+    # other worker at once rather than when their cached copy expires.
+    AUTH_KEYS = frozenset({'_user_id'})
+
+    def __init__(self, store, cache=None, key_func=None):
+        self.store = store
+        self.cache = cache if cache is not None else LRUCache()
+        # Maps a cookie's session id to the storage key (e.g. per tenant).
+        self.key_func = key_func or (lambda sid: sid)
+
+    def _cacheable(self, data):
+        return self.AUTH_KEYS.isdisjoint(data)
+
+    def load(self, sid):
+        key = self.key_func(sid)
+        # The cache holds decoded sessions, so a hit skips deserializing too.
+        cached = self.cache.get(key)
+        if cached is None:
+            stored = self.store.get(key)
+            if stored is None:
+                return None
+            payload, expires_at = stored
+            cached = (self.serializer.loads(payload), expires_at)
+            if self._cacheable(cached[0]):
+                self.cache.set(key, cached)
+        data, expires_at = cached
+        if expires_at <= datetime.utcnow():
+            self.cache.delete(key)
+            return None
+        # A deep copy: the request's changes (including to nested values such
+        # as the flashed messages list) reach the cache only when saved.
+        return copy.deepcopy(data), expires_at
+
+    def discard(self, sid):
+        key = self.key_func(sid)
+        self.cache.delete(key)
+        self.store.delete(key)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        return ServerSideSession(self, sid or None)
+
+    def save_session(self, app, session, response):
+        if not session.loaded:
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        response.vary.add('Cookie')
+
+        if not session:
+            if session.sid is not None:
+                self.discard(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        lifetime = app.permanent_session_lifetime
+        now = datetime.utcnow()
+        # Unmodified sessions are only re-written once half their lifetime has
+        # passed, rather than on every request.
+        stale = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if not (session.modified or session.new or stale):
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        expires_at = now + lifetime
+        data = dict(session)
+        key = self.key_func(session.sid)
+        self.store.set(key, self.serializer.dumps(data), expires_at)
+        if self._cacheable(data):
+            self.cache.set(key, (copy.deepcopy(data), expires_at))
+        else:
+            self.cache.delete(key)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite,
+        )
+
+
+def init_session_interface(app):
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'sql':
+        store = SQLSessionStore()
+    elif backend == 'redis':
+        store = RedisSessionStore(app.config['SESSION_REDIS_URL'])
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    from tenancy import tenant_key
+    cache = LRUCache(maxsize=app.config['SESSION_LRU_SIZE'], ttl=app.config['SESSION_LRU_TTL'])
+    # A session id is only valid at the school that issued it.
+    app.session_interface = ServerSideSessionInterface(store, cache, key_func=tenant_key)
@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from app import app, db
+from models import Task
+from db_helpers import dialect_name
+
+logger = logging.getLogger(__name__)
+
+# name -> handler(**payload)
+TASKS = {}
+
+
+def task(name, priority=0, max_attempts=5, visibility_timeout=300):
+    """Register a background task handler.
+
+    ``visibility_timeout`` is how long (seconds) a claimed task stays hidden
+    from other workers; if the worker dies the task becomes visible again
+    and is retried.
+    """
+    def decorator(func):
+        func.task_options = {'priority': priority, 'max_attempts': max_attempts,
+                             'visibility_timeout': visibility_timeout}
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, priority=None, delay=0, max_attempts=None):
+    """Add a task to the current db.session.
+
+    The task is committed together with the caller's own changes, so it is
+    never run for work that was rolled back.
+    """
+    options = TASKS[name].task_options if name in TASKS else {}
+    queued = Task(
+        name=name,
+        payload=payload or {},
+        priority=options.get('priority', 0) if priority is None else priority,
+        max_attempts=max_attempts or options.get('max_attempts', 5),
+        visible_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(queued)
+    return queued
+
+
+def retry_delay(attempts, base=None, cap=None):
+    base = app.config['TASK_RETRY_BASE_SECONDS'] if base is None else base
+    cap = app.config['TASK_RETRY_MAX_SECONDS'] if cap is None else cap
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail_abandoned(now):
+    """Mark failed the tasks whose final attempt's lease ran out without a
+    result, i.e. the task killed its worker (OOM, SIGKILL) every time."""
+    db.session.execute(
+        update(Task)
+        .where(Task.status == 'queued', Task.visible_at <= now, Task.attempts >= Task.max_attempts)
+        .values(status='failed', finished_at=now,
+                last_error='The worker running the final attempt stopped before recording a result.')
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim(worker_id):
+    """Lease the highest-priority visible task, or return None.
+
+    On Postgres, concurrent workers skip rows another worker has locked
+    (FOR UPDATE SKIP LOCKED). SQLite has no row locks, but the single
+    UPDATE ... RETURNING statement runs under its database write lock, so
+    two workers still never lease the same task.
+    """
+    now = datetime.utcnow()
+    fail_abandoned(now)
+    candidate = (
+        select(Task.id)
+        .where(Task.status == 'queued', Task.visible_at <= now, Task.attempts < Task.max_attempts)
+        .order_by(Task.priority.desc(), Task.visible_at, Task.id)
+        .limit(1)
+    )
+    if dialect_name() == 'postgresql':
+        candidate = candidate.with_for_update(skip_locked=True)
+    timeout = app.config['TASK_VISIBILITY_TIMEOUT']
+    stmt = (
+        update(Task)
+        .where(Task.id == candidate.scalar_subquery(), Task.status == 'queued')
+        .values(visible_at=now + timedelta(seconds=timeout), attempts=Task.attempts + 1, locked_by=worker_id)
+        .returning(Task.id, Task.name, Task.payload, Task.attempts, Task.max_attempts, Task.locked_by)
+        .execution_options(synchronize_session=False)
+    )
+    row = db.session.execute(stmt).first()
+    db.session.commit()
+    return row
+
+
+def _update_task(row, **values):
+    """Update the task only while ``row``'s lease still holds; returns
+    False if the lease expired and another claim (each one counts an
+    attempt) has taken the task over."""
+    result = db.session.execute(
+        update(Task)
+        .where(Task.id == row.id, Task.locked_by == row.locked_by, Task.attempts == row.attempts)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount == 0:
+        logger.warning("Task %s (%s) lost its lease to another worker; not recording attempt %s",
+                       row.id, row.name, row.attempts)
+        return False
+    return True
+
+
+def run_task(row):
+    handler = TASKS.get(row.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for task {row.name!r}")
+        if handler.task_options['visibility_timeout'] != app.config['TASK_VISIBILITY_TIMEOUT']:
+            # Extend the lease for tasks that are known to run long.
+            if not _update_task(row, visible_at=datetime.utcnow() + timedelta(seconds=handler.task_options['visibility_timeout'])):
+                return False
+        handler(**row.payload)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        if row.attempts >= row.max_attempts or handler is None:
+            logger.error("Task %s (%s) failed permanently: %s", row.id, row.name, error)
+            _update_task(row, status='failed', last_error=error, finished_at=datetime.utcnow())
+        else:
+            delay = retry_delay(row.attempts)
+            logger.warning("Task %s (%s) failed, retrying in %.0fs", row.id, row.name, delay)
+            _update_task(row, visible_at=datetime.utcnow() + timedelta(seconds=delay), last_error=error)
+        return False
+    return _update_task(row, status='done', finished_at=datetime.utcnow(), last_error=None)
+
+
+def run_pending(worker_id=None, limit=None):
+    """Run visible tasks until the queue is empty (or ``limit`` is reached)."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    while limit is None or processed < limit:
+        row = claim(worker_id)
+        if row is None:
+            break
+        run_task(row)
+        processed += 1
+    return processed
+
+
+class Worker:
+    def __init__(self, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = True
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Worker %s started", self.worker_id)
+        with app.app_context():
+            while self.running:
+                try:
+                    row = claim(self.worker_id)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Could not claim a task")
+                    row = None
+                if row is None:
+                    time.sleep(self.poll_interval)
+                    continue
+                try:
+                    run_task(row)
+                except Exception:
+                    # e.g. the database went away while recording the result;
+                    # the lease expires and another worker retries the task.
+                    db.session.rollback()
+                    logger.exception("Could not record the result of task %s", row.id)
+                db.session.remove()
+        logger.info("Worker %s stopped", self.worker_id)
+
+
+def worker_process(poll_interval):
+    # Connections inherited from the parent process must not be shared.
+    with app.app_context():
+        db.engine.dispose(close=False)
+    import jobs  # noqa: F401  registers the task handlers
+    Worker(poll_interval=poll_interval).run()
@@ -0,0 +1,96 @@
+"""Per-school partitioning.
+
+Each request is served as one tenant, picked by the Host header. Inside a
+request every ORM SELECT against a tenant-scoped model (User, Course) gets
+``tenant_id = <current tenant>`` added automatically, including where the
+model only appears in a join. Background tasks and manage.py commands run
+outside a request and therefore see every tenant.
+"""
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event, text
+from sqlalchemy.orm import with_loader_criteria
+from app import app, db
+from models import Tenant, TenantScoped, DEFAULT_TENANT_ID
+from db_helpers import dialect_name
+
+# hostname -> tenant id for every school, reloaded as a whole at most every
+# TENANT_CACHE_TTL seconds, so requests (unknown hosts included) normally
+# resolve their tenant without a query.
+_hostnames = None
+_hostnames_loaded_at = 0.0
+
+
+def tenant_hostnames():
+    global _hostnames, _hostnames_loaded_at
+    now = time.monotonic()
+    if _hostnames is None or now - _hostnames_loaded_at > app.config['TENANT_CACHE_TTL']:
+        rows = db.session.execute(db.select(Tenant.hostname, Tenant.id).where(Tenant.hostname.is_not(None)))
+        _hostnames, _hostnames_loaded_at = dict(rows.all()), now
+    return _hostnames
+
+
+@event.listens_for(Tenant, 'after_insert')
+@event.listens_for(Tenant, 'after_update')
+@event.listens_for(Tenant, 'after_delete')
+def forget_tenant_hostnames(*args):
+    """Drop this process's hostname map; other processes pick up the change
+    within TENANT_CACHE_TTL."""
+    global _hostnames
+    _hostnames = None
+
+
+def resolve_tenant_id(host):
+    host = host.split(':', 1)[0].lower()
+    return tenant_hostnames().get(host) or DEFAULT_TENANT_ID
+
+
+def current_tenant_id():
+    """The request's tenant, or the default tenant outside a request."""
+    if not has_request_context():
+        return DEFAULT_TENANT_ID
+    if 'tenant_id' not in g:
+        g.tenant_id = resolve_tenant_id(request.host)
+    return g.tenant_id
+
+
+def tenant_key(key):
+    """Namespace a cache key so one school's entries never serve another's."""
+    return f"t{current_tenant_id()}:{key}"
+
+
+@app.before_request
+def load_tenant():
+    if request.endpoint == 'static':
+        return  # resolved on demand by current_tenant_id(), if ever
+    g.tenant_id = resolve_tenant_id(request.host)
+
+
+@app.teardown_request
+def forget_tenant(exc=None):
+    # g outlives the request when an app context was already pushed (tests,
+    # CLI), and unscoped code must not inherit the last request's filter.
+    g.pop('tenant_id', None)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _scope_to_tenant(state):
+    tenant_id = g.get('tenant_id') if has_request_context() else None
+    if (tenant_id is None or not state.is_select or state.is_column_load
+            or state.is_relationship_load or state.execution_options.get('all_tenants')):
+        return
+    state.statement = state.statement.options(with_loader_criteria(
+        TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True
+    ))
+
+
+def ensure_default_tenant():
+    if db.session.get(Tenant, DEFAULT_TENANT_ID) is None:
+        db.session.add(Tenant(id=DEFAULT_TENANT_ID, name='Default', slug='default'))
+        db.session.commit()
+        if dialect_name() == 'postgresql':
+            # An explicit id does not advance the serial, and the next school
+            # created would be given id 1 again.
+            db.session.execute(text("SELECT setval(pg_get_serial_sequence('tenant', 'id'), "
+                                    "(SELECT max(id) FROM tenant))"))
+            db.session.commit()
@@ -0,0 +1,72 @@
+import unittest
+from testing import DatabaseTestCase
+from app import db
+from models import User, Course, Lesson, Quiz, Question, QuizAttempt, QuestionStat, QuizStat
+from enrollment import enroll
+from analytics import record_attempt, compact_analytics, course_dashboard, score_bucket
+
+class TestAnalytics(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = db.session.get(User, self.fixtures['teacher'])
+        self.student = db.session.get(User, self.fixtures['student'])
+        self.course = db.session.get(Course, self.fixtures['course'])
+        self.lesson = Lesson(title='Elements', content='Content', course=self.course, position=0)
+        self.quiz = Quiz(lesson=self.lesson)
+        self.questions = [
+            Question(content='Symbol for gold?', correct_answer='Au', quiz=self.quiz),
+            Question(content='Symbol for iron?', correct_answer='Fe', quiz=self.quiz),
+        ]
+        db.session.add_all([self.lesson, self.quiz] + self.questions)
+        db.session.commit()
+
+    def test_score_bucket(self):
+        self.assertEqual(score_bucket(0), 0)
+        self.assertEqual(score_bucket(55), 5)
+        self.assertEqual(score_bucket(100), 9)
+
+    def test_record_attempt_updates_aggregates(self):
+        gold, iron = self.questions
+        for _ in range(5):
+            record_attempt(self.student.id, self.quiz, [(gold.id, True), (iron.id, False)])
+        record_attempt(self.student.id, self.quiz, [(gold.id, True), (iron.id, True)])
+
+        dashboard = course_dashboard(self.course.id)
+        quiz = dashboard['quizzes'][0]
+        self.assertEqual(quiz['attempts'], 6)
+        self.assertAlmostEqual(quiz['average'], (5 * 50 + 100) / 6)
+        self.assertEqual(quiz['histogram'][5], 5)
+        self.assertEqual(quiz['histogram'][9], 1)
+        difficulty = {q['id']: q['percent_correct'] for q in quiz['questions']}
+        self.assertEqual(difficulty[gold.id], 100.0)
+        self.assertAlmostEqual(difficulty[iron.id], 100.0 / 6)
+        self.assertEqual(QuizAttempt.query.count(), 6)
+
+    def test_compaction_preserves_totals(self):
+        gold, iron = self.questions
+        for _ in range(20):
+            record_attempt(self.student.id, self.quiz, [(gold.id, True), (iron.id, False)])
+        before = course_dashboard(self.course.id)['quizzes'][0]
+
+        enroll(self.student.id, self.course.id)
+        compact_analytics()
+
+        self.assertEqual(QuestionStat.query.filter(QuestionStat.shard > 0).count(), 0)
+        self.assertEqual(QuizStat.query.count(), 1)
+        after = course_dashboard(self.course.id)
+        self.assertEqual(after['quizzes'][0], before)
+        self.assertEqual(after['completion'].students, 1)
+
+    def test_take_quiz_records_attempt(self):
+        self.login('student@example.com')
+        gold, iron = self.questions
+        response = self.client.post(f'/quiz/{self.quiz.id}/take', data={
+            f'question_{gold.id}': 'au',
+            f'question_{iron.id}': 'Cu',
+        })
+        self.assertIn(b'You answered 1 of 2 questions correctly', response.data)
+        attempt = QuizAttempt.query.one()
+        self.assertEqual((attempt.score, attempt.total), (1, 2))
+
+if __name__ == '__main__':
+    unittest.main()
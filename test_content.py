@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+from testing import DatabaseTestCase
+from app import db
+from models import Course, Lesson
+import content
+from content import render_content, render_lesson, rerender_lessons, RENDERER_VERSION
+
+class TestContentRendering(unittest.TestCase):
+    def test_markdown_is_sanitized(self):
+        html, excerpt = render_content('# Title\n\n**bold** <script>alert(1)</script> [x](javascript:alert(1))')
+        self.assertIn('<h1>Title</h1>', html)
+        self.assertIn('<strong>bold</strong>', html)
+        self.assertNotIn('<script', html)
+        self.assertNotIn('javascript:', html)
+        self.assertEqual(excerpt, 'Title bold x')
+
+    def test_excerpt_is_truncated_on_a_word(self):
+        _, excerpt = render_content('word ' * 100)
+        self.assertLessEqual(len(excerpt), 201)
+        self.assertTrue(excerpt.endswith('word…'))
+
+class TestLessonContentPipeline(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = db.session.get(Course, self.fixtures['course'])
+
+    def test_create_lesson_stores_compiled_content(self):
+        self.login('teacher@example.com')
+        self.client.post(f'/course/{self.course.id}/create_lesson', data={
+            'title': 'Intro', 'content': 'Hello *world*',
+        }, follow_redirects=True)
+        lesson = Lesson.query.one()
+        self.assertIn('<em>world</em>', lesson.content_html)
+        self.assertEqual(lesson.content_excerpt, 'Hello world')
+        self.assertEqual(lesson.renderer_version, RENDERER_VERSION)
+
+        with mock.patch.object(content, 'render_content') as renderer:
+            response = self.client.get(f'/lesson/{lesson.id}')
+            self.assertIn(b'<em>world</em>', response.data)
+            self.client.get(f'/course/{self.course.id}')
+            renderer.assert_not_called()
+
+    def test_unchanged_content_is_not_rerendered(self):
+        lesson = Lesson(title='Intro', content='Text', course=self.course, position=0)
+        self.assertTrue(render_lesson(lesson))
+        self.assertFalse(render_lesson(lesson))
+
+    def test_rerender_after_version_bump(self):
+        lessons = [Lesson(title=f'L{i}', content=f'Lesson *{i}*', course=self.course, position=i) for i in range(7)]
+        db.session.add_all(lessons)
+        db.session.commit()
+        self.assertEqual(rerender_lessons(batch_size=3), 7)
+        self.assertEqual(rerender_lessons(batch_size=3), 0)
+        with mock.patch.object(content, 'RENDERER_VERSION', RENDERER_VERSION + 1):
+            self.assertEqual(rerender_lessons(batch_size=3), 7)
+        self.assertEqual(Lesson.query.filter_by(renderer_version=RENDERER_VERSION + 1).count(), 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from testing import DatabaseTestCase
+from app import db
+from models import User, Course, Lesson, Quiz, Question, Enrollment, QuestionStat, QuizAttempt, Task
+from analytics import record_attempt
+from course_purge import soft_delete_course, purge_course, purge_status
+from enrollment import enroll
+from task_queue import run_pending
+
+class TestCoursePurge(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = db.session.get(User, self.fixtures['teacher'])
+        self.student = db.session.get(User, self.fixtures['student'])
+        self.other = db.session.get(Course, self.fixtures['course'])
+        self.course = Course(title='Biology', description='Cells', teacher=self.teacher)
+        db.session.add(self.course)
+        db.session.commit()
+        for position in range(12):
+            lesson = Lesson(title=f'Lesson {position}', content='Content', course=self.course,
+                            position=position, file_attachment_filename=f'notes{position}.pdf')
+            quiz = Quiz(lesson=lesson)
+            db.session.add_all([lesson, quiz, Question(content='Q', correct_answer='A', quiz=quiz)])
+        db.session.add(Lesson(title='Kept', content='Content', course=self.other, position=0))
+        db.session.commit()
+        quiz = Quiz.query.first()
+        record_attempt(self.student.id, quiz, [(quiz.questions[0].id, True)])
+        enroll(self.student.id, self.course.id)
+
+    def test_delete_route_hides_course_immediately(self):
+        self.login('teacher@example.com')
+        self.client.post(f'/course/{self.course.id}/delete', follow_redirects=True)
+        self.assertIsNotNone(db.session.get(Course, self.course.id).deleted_at)
+        self.assertNotIn(b'Biology', self.client.get('/courses').data)
+        self.assertEqual(self.client.get(f'/course/{self.course.id}').status_code, 404)
+        self.assertEqual(Task.query.filter_by(name='purge_course').count(), 1)
+
+    def test_purge_is_batched_and_resumable(self):
+        course_id = self.course.id
+        soft_delete_course(self.course)
+        db.session.commit()
+        # A zero time budget stops after the first batch, as if interrupted.
+        self.assertFalse(purge_course(course_id, batch_size=5, time_budget=0))
+        self.assertEqual(purge_status(course_id), {'lessons': 7, 'enrollments': 1})
+
+        self.assertTrue(purge_course(course_id, batch_size=5))
+        self.assertIsNone(db.session.get(Course, course_id))
+        self.assertEqual(Question.query.count(), 0)
+        self.assertEqual(QuestionStat.query.count(), 0)
+        self.assertEqual(QuizAttempt.query.count(), 0)
+        self.assertEqual(Enrollment.query.count(), 0)
+        self.assertEqual(Lesson.query.count(), 1)
+        self.assertEqual(Task.query.filter_by(name='delete_upload').count(), 12)
+
+    def test_purge_task_runs_through_queue(self):
+        course_id, other_id = self.course.id, self.other.id
+        soft_delete_course(self.course)
+        db.session.commit()
+        run_pending()
+        self.assertIsNone(db.session.get(Course, course_id))
+        self.assertIsNotNone(db.session.get(Course, other_id))
+
+if __name__ == '__main__':
+    unittest.main()
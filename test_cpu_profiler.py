@@ -0,0 +1,122 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from testing import DatabaseTestCase
+from app import app, cpu_profiler
+from cpu_profiler import SamplingProfiler, request_profile, parse_collapsed, to_collapsed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from bench_cpu_profiler import sample_cost  # noqa: E402
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.profiler = SamplingProfiler(interval=0.002, output_dir=self.tmpdir, trigger_interval=0)
+        self.addCleanup(self.profiler.stop)
+
+    def test_samples_are_attributed_to_the_endpoint(self):
+        self.profiler.start()
+        self.profiler.enter('course_detail')
+        spin(0.2)
+        self.profiler.exit()
+        self.profiler.stop()
+        counts = self.profiler.counts
+        self.assertGreater(sum(counts.values()), 10)
+        self.assertTrue(all(stack[0] == 'course_detail' for stack in counts))
+        self.assertTrue(any(stack[-1].startswith('spin (test_cpu_profiler.py') for stack in counts))
+
+    def test_idle_threads_are_not_sampled(self):
+        self.profiler.start()
+        spin(0.05)
+        self.profiler.stop()
+        self.assertEqual(self.profiler.sample_count, 0)
+
+    def test_reading_while_sampling(self):
+        self.profiler.start()
+        self.profiler.enter('course_detail')
+        deadline = time.perf_counter() + 0.2
+        while time.perf_counter() < deadline:
+            self.profiler.counts  # raised "dictionary changed size" without the lock
+        self.profiler.exit()
+        self.profiler.stop()
+        self.assertGreater(self.profiler.sample_count, 0)
+
+        self.profiler.start()
+        self.profiler.stop()
+        self.assertEqual((self.profiler.sample_count, len(self.profiler._codes)), (0, 0))
+
+    def test_exports(self):
+        self.profiler.start()
+        self.profiler.enter('take_quiz')
+        spin(0.05)
+        self.profiler.exit()
+        self.profiler.stop()
+        collapsed = self.profiler.collapsed()
+        self.assertEqual(parse_collapsed(collapsed), self.profiler.counts)
+        self.assertEqual(to_collapsed(parse_collapsed(collapsed)), collapsed)
+        speedscope = self.profiler.speedscope()
+        profile = speedscope['profiles'][0]
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        frame_names = [frame['name'] for frame in speedscope['shared']['frames']]
+        self.assertEqual(frame_names[profile['samples'][0][0]], 'take_quiz')
+
+    def test_trigger_starts_a_timed_profile(self):
+        time.sleep(0.01)
+        request_profile(self.tmpdir, duration=0.05, interval=0.002)
+        self.profiler.check_trigger()
+        self.assertTrue(self.profiler.running)
+        self.profiler.enter('index')
+        spin(0.1)
+        self.profiler.exit()
+        self.assertFalse(self.profiler.running)
+        written = sorted(os.listdir(self.tmpdir))
+        self.assertTrue(any(name.endswith('.collapsed') for name in written))
+        self.assertTrue(any(name.endswith('.speedscope.json') for name in written))
+        # The same request is not picked up twice.
+        self.profiler.check_trigger()
+        self.assertFalse(self.profiler.running)
+
+    def test_sampling_overhead_under_two_percent(self):
+        # Worst case: every sample walks a 60-frame stack. At the default 10 ms
+        # interval the sampler may spend at most 2% of a core.
+        cost = min(sample_cost(depth=60, samples=500) for _ in range(3))
+        self.assertLess(cost / 0.01, 0.02)
+
+
+class TestProfilerRoutes(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(app.config.__setitem__, 'METRICS_TOKEN', app.config['METRICS_TOKEN'])
+        app.config['METRICS_TOKEN'] = 'ops'
+        self.addCleanup(cpu_profiler.stop)
+
+    def test_start_profile_export(self):
+        auth = {'Authorization': 'Bearer ops'}
+        self.assertEqual(self.client.post('/admin/profiler', data={'action': 'start'}).status_code, 403)
+        response = self.client.post('/admin/profiler', data={'action': 'start', 'interval': '0.001'}, headers=auth)
+        self.assertTrue(response.get_json()['running'])
+        deadline = time.perf_counter() + 0.5
+        while time.perf_counter() < deadline:
+            self.client.get('/courses')
+        self.client.post('/admin/profiler', data={'action': 'stop'}, headers=auth)
+        self.assertFalse(cpu_profiler.running)
+        collapsed = self.client.get('/admin/profiler', headers=auth).get_data(as_text=True)
+        self.assertIn('list_courses;', collapsed)
+        speedscope = self.client.get('/admin/profiler?format=speedscope', headers=auth).get_json()
+        self.assertEqual(speedscope['profiles'][0]['type'], 'sampled')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from testing import DatabaseTestCase
+from app import db
+from models import User, Course, Enrollment
+from enrollment import enroll, unenroll, is_enrolled, my_courses_query, roster_query, bulk_enroll
+
+class TestEnrollment(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = db.session.get(User, self.fixtures['teacher'])
+        self.student = db.session.get(User, self.fixtures['student'])
+        self.course = db.session.get(Course, self.fixtures['course'])
+
+    def test_enroll_is_idempotent(self):
+        self.assertTrue(enroll(self.student.id, self.course.id))
+        self.assertFalse(enroll(self.student.id, self.course.id))
+        self.assertEqual(Enrollment.query.count(), 1)
+        self.assertTrue(is_enrolled(self.student.id, self.course.id))
+
+    def test_unenroll(self):
+        enroll(self.student.id, self.course.id)
+        self.assertTrue(unenroll(self.student.id, self.course.id))
+        self.assertFalse(unenroll(self.student.id, self.course.id))
+        self.assertFalse(is_enrolled(self.student.id, self.course.id))
+
+    def test_my_courses_and_roster_pagination(self):
+        courses = [Course(title=f'Course {i}', description='Description', teacher=self.teacher) for i in range(5)]
+        db.session.add_all(courses)
+        db.session.commit()
+        for course in courses:
+            enroll(self.student.id, course.id)
+
+        page = db.paginate(my_courses_query(self.student.id), page=1, per_page=2)
+        self.assertEqual(page.total, 5)
+        self.assertEqual(len(page.items), 2)
+
+        roster = db.paginate(roster_query(courses[0].id), page=1, per_page=10)
+        self.assertEqual([user.id for user in roster.items], [self.student.id])
+
+    def test_bulk_enroll_skips_unknown_and_existing_users(self):
+        students = [User(username=f'student{i}', email=f'student{i}@example.com',
+                         password_hash='x') for i in range(25)]
+        db.session.add_all(students)
+        db.session.commit()
+        enroll(students[0].id, self.course.id)
+
+        ids = iter([s.id for s in students] + [999999])
+        created = bulk_enroll(self.course.id, ids, batch_size=7)
+        self.assertEqual(created, 24)
+        self.assertEqual(self.course.enrollments.count(), 25)
+
+    def test_enroll_route(self):
+        self.login('student@example.com')
+        response = self.client.post(f'/course/{self.course.id}/enroll', follow_redirects=True)
+        self.assertIn(b'You have been enrolled in this course!', response.data)
+        self.assertTrue(is_enrolled(self.student.id, self.course.id))
+
+    def test_roster_is_teacher_only(self):
+        self.login('student@example.com')
+        response = self.client.get(f'/course/{self.course.id}/roster')
+        self.assertEqual(response.status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
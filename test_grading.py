@@ -0,0 +1,72 @@
+import unittest
+from types import SimpleNamespace
+from grading import compile_grader, grade, dump_options, parse_options, MAX_ANSWER_LENGTH
+
+def make_question(question_type, correct_answer, **options):
+    return SimpleNamespace(question_type=question_type, correct_answer=correct_answer,
+                           options=dump_options(**options))
+
+class TestGrading(unittest.TestCase):
+    def test_text(self):
+        question = make_question('text', 'Paris')
+        self.assertTrue(grade(question, '  paris '))
+        self.assertFalse(grade(question, 'Lyon'))
+
+    def test_multiple_choice(self):
+        question = make_question('multiple_choice', 'Blue', choices=['Red', 'Blue', 'Green'])
+        self.assertTrue(grade(question, 'blue'))
+        self.assertFalse(grade(question, 'Red'))
+        with self.assertRaises(ValueError):
+            compile_grader('multiple_choice', 'Purple', dump_options(choices=['Red', 'Blue']))
+
+    def test_multi_select(self):
+        question = make_question('multi_select', 'Red\nGreen', choices=['Red', 'Blue', 'Green'])
+        self.assertTrue(grade(question, ['Green', 'Red']))
+        self.assertFalse(grade(question, ['Green']))
+        self.assertFalse(grade(question, ['Green', 'Red', 'Blue']))
+
+    def test_numeric_tolerance(self):
+        absolute = make_question('numeric', '3.14', tolerance='0.01')
+        self.assertTrue(grade(absolute, '3.149'))
+        self.assertFalse(grade(absolute, '3.16'))
+        self.assertFalse(grade(absolute, 'pi'))
+        relative = make_question('numeric', '1,000', tolerance='1%')
+        self.assertTrue(grade(relative, '1009'))
+        self.assertFalse(grade(relative, '1011'))
+
+    def test_regex(self):
+        question = make_question('regex', r'colou?r')
+        self.assertTrue(grade(question, 'Color'))
+        self.assertFalse(grade(question, 'colors'))
+        with self.assertRaises(ValueError):
+            compile_grader('regex', '(unclosed', None)
+
+    def test_broken_stored_pattern_grades_wrong(self):
+        question = make_question('regex', '(unclosed')
+        self.assertFalse(grade(question, '(unclosed'))
+
+    def test_overlong_answers_are_not_matched(self):
+        question = make_question('regex', r'(a+)+b')
+        self.assertTrue(grade(question, 'aab'))
+        self.assertFalse(grade(question, 'a' * (MAX_ANSWER_LENGTH + 1)))
+
+    def test_grader_is_compiled_once(self):
+        first = compile_grader('regex', r'\d+', None)
+        self.assertIs(compile_grader('regex', r'\d+', None), first)
+        self.assertIsNot(compile_grader('regex', r'\d{2}', None), first)
+
+    def test_parsed_options_are_read_only(self):
+        options = dump_options(choices=['Red', 'Blue'])
+        parsed = parse_options(options)
+        with self.assertRaises(TypeError):
+            parsed['choices'] = ['Green']
+        with self.assertRaises(AttributeError):
+            parsed['choices'].append('Green')
+        self.assertEqual(parse_options(options)['choices'], ('Red', 'Blue'))
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            compile_grader('essay', 'anything', None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+from testing import DatabaseTestCase
+from app import app, memory_profiler
+from memory_profiling import MemoryProfiler, request_dump, latest_dumps, merge_dumps
+
+
+def allocate():
+    return [str(i) * 10 for i in range(20000)]
+
+
+class TestMemoryProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.profiler = MemoryProfiler(endpoints={'course_detail'}, output_dir=self.tmpdir, trigger_interval=0)
+
+    def test_records_peak_and_top_sites(self):
+        token = self.profiler.start()
+        kept = allocate()
+        allocate()  # freed straight away
+        record = self.profiler.stop(token, 'course_detail', '/course/1')
+        self.assertFalse(tracemalloc.is_tracing())
+        # The freed list shows up in the peak but not in the net growth.
+        self.assertGreater(record['peak'], 1.5 * record['net'])
+        self.assertGreater(record['net'], 1_000_000)
+        self.assertEqual(len(kept), 20000)
+        self.assertTrue(record['top'][0]['site'].startswith(__file__))
+        self.assertEqual(self.profiler.by_endpoint['course_detail']['requests'], 1)
+
+    def test_selection(self):
+        self.assertTrue(self.profiler.should_profile('course_detail'))
+        self.assertFalse(self.profiler.should_profile('index'))
+        self.profiler.sample_rate = 1.0
+        self.assertTrue(self.profiler.should_profile('index'))
+
+    def test_dump_on_trigger(self):
+        token = self.profiler.start()
+        allocate()
+        self.profiler.stop(token, 'course_detail', '/course/1')
+        self.profiler.check_trigger()
+        self.assertEqual(latest_dumps(self.tmpdir), [])
+        time.sleep(0.01)
+        since = request_dump(self.tmpdir)
+        self.profiler.check_trigger()
+        dumps = latest_dumps(self.tmpdir, since=since)
+        self.assertEqual(len(dumps), 1)
+        endpoints, sites = merge_dumps(dumps)
+        self.assertEqual(endpoints['course_detail']['requests'], 1)
+        self.assertEqual(sites[0][0], 'course_detail')
+
+
+class TestRequestProfiling(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, memory_profiler, 'endpoints', set(memory_profiler.endpoints))
+        self.addCleanup(app.config.__setitem__, 'METRICS_TOKEN', app.config['METRICS_TOKEN'])
+        memory_profiler.endpoints = {'list_courses'}
+        memory_profiler.records.clear()
+        app.config['METRICS_TOKEN'] = 'ops'
+
+    def test_only_selected_endpoints_are_profiled(self):
+        self.client.get('/courses')
+        self.client.get('/')
+        self.assertEqual([record['endpoint'] for record in memory_profiler.records], ['list_courses'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_admin_routes_are_protected(self):
+        self.assertEqual(self.client.get('/admin/memory').status_code, 403)
+        self.assertEqual(self.client.post('/admin/memory/dump').status_code, 403)
+        self.client.get('/courses')
+        response = self.client.get('/admin/memory', headers={'Authorization': 'Bearer ops'})
+        self.assertIn('list_courses', response.get_json()['endpoints'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from testing import DatabaseTestCase, FIXTURE_PASSWORD
+from app import db
+from models import User, Course, Tenant
+from backfill import get_checkpoint, run_backfill
+from migration_bench import bench_migrations, revisions_between, seed_empty_tables
+import migration_helpers
+from werkzeug.security import generate_password_hash
+
+
+class TestBackfill(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = Tenant(name='North High', slug='north', hostname='north.example.com')
+        db.session.add(self.school)
+        db.session.flush()
+        teacher = User(username='north', email='north@example.com', tenant_id=self.school.id,
+                       password_hash=generate_password_hash(FIXTURE_PASSWORD), is_teacher=True)
+        db.session.add(teacher)
+        db.session.flush()
+        self.teacher_id = teacher.id
+        # Courses created before tenancy all landed in the default school.
+        db.session.add_all([Course(title=f'Course {i}', description='x', teacher_id=teacher.id) for i in range(5)])
+        db.session.commit()
+
+    def tenants(self):
+        return db.session.scalars(sa.select(Course.tenant_id).where(Course.teacher_id == self.teacher_id).order_by(Course.id),
+                                  execution_options={'all_tenants': True}).all()
+
+    def test_resumes_from_checkpoint(self):
+        # The first batch also scans the fixture course, which stays put.
+        checkpoint = run_backfill('course_tenant', batch_size=2, max_batches=1)
+        self.assertIsNone(checkpoint.finished_at)
+        self.assertEqual(checkpoint.rows, 2)
+        self.assertEqual(self.tenants(), [self.school.id] + [1] * 4)
+
+        checkpoint = run_backfill('course_tenant', batch_size=2)
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual(checkpoint.rows, 6)
+        self.assertEqual(self.tenants(), [self.school.id] * 5)
+
+        # A finished backfill does nothing until it is reset.
+        run_backfill('course_tenant', batch_size=2)
+        self.assertEqual(get_checkpoint('course_tenant').rows, 6)
+
+
+class TestMigrationHelpers(unittest.TestCase):
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.connection = self.engine.connect()
+        self.connection.execute(sa.text('CREATE TABLE item (id INTEGER PRIMARY KEY, name VARCHAR(20), slug VARCHAR(20))'))
+        self.connection.execute(sa.text('INSERT INTO item (name) VALUES ' + ', '.join(f"('Item {i}')" for i in range(25))))
+        self.connection.commit()
+        self.context = MigrationContext.configure(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+        self.engine.dispose()
+
+    def test_add_column_online_rejects_rewrites(self):
+        with Operations.context(self.context):
+            with self.assertRaises(ValueError):
+                migration_helpers.add_column_online('item', sa.Column('rank', sa.Integer(), nullable=False))
+            migration_helpers.add_column_online('item', sa.Column('rank', sa.Integer(), nullable=False, server_default='0'))
+        self.assertIn('rank', [c['name'] for c in sa.inspect(self.connection).get_columns('item')])
+
+    def test_backfill_in_batches(self):
+        with Operations.context(self.context):
+            updated = migration_helpers.backfill_in_batches(
+                'item', "slug = lower(replace(name, ' ', '-'))", 'slug IS NULL', batch_size=10)
+            migration_helpers.create_index_concurrently('ix_item_slug', 'item', ['slug'])
+        self.assertEqual(updated, 25)
+        self.assertEqual(self.connection.execute(sa.text("SELECT slug FROM item WHERE id = 1")).scalar(), 'item-0')
+        self.assertIn('ix_item_slug', [i['name'] for i in sa.inspect(self.connection).get_indexes('item')])
+
+
+class TestMigrationBench(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        os.remove(self.path)
+        self.url = 'sqlite:///' + self.path
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_seeds_composite_keys_uniquely(self):
+        engine = sa.create_engine(self.url)
+        metadata = sa.MetaData()
+        sa.Table('parent', metadata, sa.Column('id', sa.Integer, primary_key=True))
+        sa.Table('link', metadata,
+                 sa.Column('left_id', sa.ForeignKey('parent.id'), primary_key=True),
+                 sa.Column('right_id', sa.ForeignKey('parent.id'), primary_key=True))
+        metadata.create_all(engine)
+        counts = seed_empty_tables(engine, 9, {'parent': 3})
+        self.assertEqual(counts, {'parent': 3, 'link': 9})
+        engine.dispose()
+
+    def test_times_each_revision(self):
+        results = bench_migrations(self.url, 'a3c71e9d5b20', rows=20, table_rows={'tenant': 2}, probe_interval=0.005)
+        expected = [revision.revision for revision in revisions_between('a3c71e9d5b20')]
+        self.assertEqual([result['revision'] for result in results], expected)
+        for result in results:
+            self.assertGreater(result['seconds'], 0)
+            self.assertGreaterEqual(result['max_write_wait'], 0)
+
+        engine = sa.create_engine(self.url)
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(sa.text('SELECT version_num FROM alembic_version')).scalar(), expected[-1])
+            self.assertEqual(connection.execute(sa.text('SELECT count(*) FROM backfill_checkpoint')).scalar(), 20)
+        engine.dispose()
+
+        with self.assertRaises(RuntimeError):
+            bench_migrations(self.url, 'a3c71e9d5b20', rows=20)
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from testing import DatabaseTestCase
+from app import app
+from pool_metrics import instrument_engine, aggregate, read_snapshots, render_prometheus, write_snapshot
+
+
+class TestPoolMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def make_engine(self, **kwargs):
+        engine = create_engine(f'sqlite:///{os.path.join(self.tmpdir, "db.sqlite")}', poolclass=QueuePool,
+                               pool_size=2, max_overflow=2, **kwargs)
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_checkouts_and_gauges(self):
+        engine = self.make_engine()
+        metrics = instrument_engine(engine)
+        connections = [engine.connect() for _ in range(3)]
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['in_use'], 3)
+        self.assertEqual(snapshot['overflow'], 1)
+        self.assertEqual(sum(snapshot['wait_buckets']), 3)
+        for connection in connections:
+            connection.close()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['in_use'], 0)
+        self.assertEqual(snapshot['checkouts'], 3)
+
+    def test_recycled_connections(self):
+        engine = self.make_engine(pool_recycle=0.05)
+        metrics = instrument_engine(engine)
+        engine.connect().close()
+        time.sleep(0.1)
+        engine.connect().close()
+        self.assertEqual(metrics.snapshot()['recycled'], 1)
+
+    def test_only_idle_connections_are_pinged(self):
+        engine = self.make_engine()
+        metrics = instrument_engine(engine, ping_idle_seconds=0.05)
+        engine.connect().close()
+        engine.connect().close()
+        self.assertEqual(metrics.snapshot()['idle_pings'], 0)
+        time.sleep(0.1)
+        engine.connect().close()
+        self.assertEqual(metrics.snapshot()['idle_pings'], 1)
+
+    def test_dead_idle_connection_is_replaced(self):
+        engine = self.make_engine()
+        metrics = instrument_engine(engine, ping_idle_seconds=0.01)
+        with engine.connect() as connection:
+            dbapi_connection = connection.connection.dbapi_connection
+        dbapi_connection.close()
+        time.sleep(0.05)
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT 1')).scalar(), 1)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['pre_ping_failures'], 1)
+        self.assertEqual(snapshot['invalidated'], 1)
+        self.assertEqual(snapshot['recycled'], 0)
+        self.assertEqual(snapshot['in_use'], 0)
+
+    def test_wait_timing_survives_dispose(self):
+        engine = self.make_engine()
+        metrics = instrument_engine(engine)
+        engine.dispose()
+        engine.connect().close()
+        self.assertEqual(sum(metrics.snapshot()['wait_buckets']), 1)
+
+    def test_snapshots_are_aggregated(self):
+        engine = self.make_engine()
+        metrics = instrument_engine(engine)
+        engine.connect().close()
+        first = metrics.snapshot()
+        second = dict(first, pid=first['pid'] + 1, wait_max=2.0)
+        stale = dict(first, pid=first['pid'] + 2, written_at=time.time() - 3600)
+        for snapshot in (first, second, stale):
+            write_snapshot(self.tmpdir, snapshot)
+        stats = aggregate(read_snapshots(self.tmpdir))
+        self.assertEqual(stats['processes'], 2)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['wait_max'], 2.0)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, f"{stale['pid']}.json")))
+        self.assertIn('db_pool_checkout_wait_seconds_count 2', render_prometheus(stats))
+
+
+class TestMetricsEndpoint(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(app.config.__setitem__, 'METRICS_TOKEN', app.config['METRICS_TOKEN'])
+        app.config['METRICS_TOKEN'] = 'scrape-me'
+
+    def test_requires_token_or_admin(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'db_pool_in_use', response.data)
+
+        self.login('admin@example.com')
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
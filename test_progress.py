@@ -0,0 +1,78 @@
+import unittest
+from sqlalchemy.exc import IntegrityError
+from testing import DatabaseTestCase
+from app import db
+from models import User, Course, Lesson
+from enrollment import enroll, get_enrollment
+from progress import (set_bit, clear_bit, is_bit_set, popcount, completion_percentage,
+                      mark_lesson_complete, next_lesson_position, course_completion_stats)
+
+class TestProgressBits(unittest.TestCase):
+    def test_set_and_clear_bits(self):
+        bits = b''
+        for ordinal in (0, 3, 9, 17):
+            bits = set_bit(bits, ordinal)
+        self.assertEqual(len(bits), 3)
+        self.assertEqual(popcount(bits), 4)
+        self.assertTrue(is_bit_set(bits, 9))
+        self.assertFalse(is_bit_set(bits, 10))
+        self.assertFalse(is_bit_set(bits, 200))
+        bits = clear_bit(bits, 17)
+        self.assertEqual(len(bits), 2)
+        self.assertEqual(popcount(bits), 3)
+
+    def test_completion_percentage(self):
+        bits = set_bit(set_bit(b'', 0), 1)
+        self.assertEqual(completion_percentage(bits, 4), 50.0)
+        self.assertEqual(completion_percentage(bits, 0), 0.0)
+
+class TestCourseProgress(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = [User(username=f'student{i}', email=f'student{i}@example.com', password_hash='x')
+                         for i in range(4)]
+        db.session.add_all(self.students)
+        db.session.commit()
+        self.course = db.session.get(Course, self.fixtures['course'])
+        self.lessons = []
+        for i in range(10):
+            lesson = Lesson(title=f'Lesson {i}', content='Content', course=self.course,
+                            position=next_lesson_position(self.course.id))
+            db.session.add(lesson)
+            db.session.commit()
+            self.lessons.append(lesson)
+        for student in self.students:
+            enroll(student.id, self.course.id)
+
+    def test_positions_are_sequential(self):
+        self.assertEqual([lesson.position for lesson in self.lessons], list(range(10)))
+
+    def test_positions_are_unique_per_course(self):
+        # What two concurrent creates would do without the course row lock.
+        db.session.add(Lesson(title='Duplicate', content='Content', course=self.course, position=9))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+
+    def test_mark_lesson_complete_requires_enrollment(self):
+        outsider = User(username='outsider', email='outsider@example.com', password_hash='x')
+        db.session.add(outsider)
+        db.session.commit()
+        self.assertFalse(mark_lesson_complete(outsider.id, self.lessons[0]))
+        self.assertTrue(mark_lesson_complete(self.students[0].id, self.lessons[9]))
+        enrollment = get_enrollment(self.students[0].id, self.course.id)
+        self.assertTrue(is_bit_set(enrollment.progress_bits, 9))
+
+    def test_course_completion_stats(self):
+        # student i completes the first i * 3 lessons: 0%, 30%, 60%, 90%
+        for i, student in enumerate(self.students):
+            for lesson in self.lessons[:i * 3]:
+                mark_lesson_complete(student.id, lesson)
+        stats = course_completion_stats(self.course.id)
+        self.assertEqual(stats['students'], 4)
+        self.assertEqual(stats['histogram'], [1, 0, 0, 1, 0, 0, 1, 0, 0, 1])
+        self.assertEqual(stats['lesson_completions'][:3], [3, 3, 3])
+        self.assertEqual(stats['lesson_completions'][9], 0)
+        self.assertAlmostEqual(stats['average'], 45.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+from testing import DatabaseTestCase
+from app import db
+from models import Course, Lesson, Quiz, Question
+from quiz_authoring import parse_questions, add_questions, QuestionImportError
+
+class TestQuizAuthoring(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = db.session.get(Course, self.fixtures['course'])
+        self.lesson = Lesson(title='Rome', content='Content', course=self.course, position=0)
+        db.session.add(self.lesson)
+        db.session.commit()
+
+    def test_parse_csv(self):
+        rows = parse_questions(
+            'question,answer,type,choices,tolerance\n'
+            'Founded?,753,numeric,,1\n'
+            'First emperor?,Augustus,multiple_choice,Augustus|Nero|Caesar,\n'
+            'Rivers?,Tiber|Arno,multi_select,Tiber|Arno|Seine,\n'
+        )
+        self.assertEqual([row['question_type'] for row in rows], ['numeric', 'multiple_choice', 'multi_select'])
+        self.assertEqual(rows[2]['correct_answer'], 'Tiber\nArno')
+
+    def test_parse_json_reports_every_error(self):
+        text = json.dumps([
+            {'question': 'Ok?', 'answer': 'yes'},
+            {'question': '', 'answer': 'yes'},
+            {'question': 'Pick', 'answer': 'Z', 'type': 'multiple_choice', 'choices': ['A', 'B']},
+        ])
+        with self.assertRaises(QuestionImportError) as ctx:
+            parse_questions(text, 'json')
+        self.assertEqual(len(ctx.exception.errors), 2)
+
+    def test_parse_json_rejects_wrong_types(self):
+        text = json.dumps([
+            {'question': 5, 'answer': 'yes'},
+            'not an object',
+            {'question': 'Pick', 'answer': 'A', 'type': 'multiple_choice', 'choices': 'AB'},
+            {'question': 'Ok?', 'answer': 'yes'},
+            {'question': 'Weight?', 'answer': 2, 'type': 'numeric', 'tolerance': 0.5},
+        ])
+        with self.assertRaises(QuestionImportError) as ctx:
+            parse_questions(text, 'json')
+        self.assertEqual([error.split(':')[0] for error in ctx.exception.errors], ['Item 1', 'Item 2', 'Item 3'])
+
+    def test_add_questions_reuses_existing_quiz(self):
+        add_questions(self.lesson, parse_questions('A?,a\nB?,b\n'))
+        add_questions(self.lesson, parse_questions('C?,c\n'))
+        self.assertEqual(Quiz.query.count(), 1)
+        self.assertEqual(len(self.lesson.quiz.questions), 3)
+
+    def test_quiz_created_by_another_request_is_reused(self):
+        self.assertIsNone(self.lesson.quiz)
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(Quiz).values(lesson_id=self.lesson.id))
+        quiz = add_questions(self.lesson, parse_questions('A?,a\n'))
+        self.assertEqual(Quiz.query.filter_by(lesson_id=self.lesson.id).count(), 1)
+        self.assertEqual(len(quiz.questions), 1)
+
+    def test_bulk_form_submission(self):
+        self.login('teacher@example.com')
+        response = self.client.post(f'/lesson/{self.lesson.id}/create_quiz', data={
+            'questions-0-question': 'Capital?',
+            'questions-0-question_type': 'text',
+            'questions-0-correct_answer': 'Rome',
+            'questions-1-question': '',
+            'questions-1-question_type': 'text',
+            'questions-1-correct_answer': '',
+            'paste_format': 'csv',
+            'bulk_paste': 'Year?,753,numeric,,0\nSeven hills?,yes\n',
+        }, follow_redirects=True)
+        self.assertIn(b'3 quiz questions added!', response.data)
+        self.assertEqual(Question.query.count(), 3)
+        self.assertEqual(Quiz.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
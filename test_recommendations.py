@@ -0,0 +1,166 @@
+import unittest
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import event
+from testing import DatabaseTestCase
+from app import db
+from models import User, Course, Enrollment, Lesson, Quiz, QuizAttempt, Tenant, CourseNeighbor, UserRecommendation
+from enrollment import enroll
+from course_purge import soft_delete_course, purge_course
+from recommendations import (tfidf_matrix, top_k_rows, refresh_recommendations, recommended_courses,
+                             similar_courses)
+
+
+class TestSimilarityMath(unittest.TestCase):
+    def test_tfidf_rows_are_unit_length_and_match_shared_words(self):
+        matrix = tfidf_matrix(['Linear algebra', 'Algebra and geometry', 'Poetry', ''])
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        np.testing.assert_allclose(norms, [1, 1, 1, 0])
+        similarity = (matrix @ matrix.T).toarray()
+        self.assertGreater(similarity[0, 1], 0)
+        self.assertEqual(similarity[0, 2], 0)
+
+    def test_top_k_rows_orders_and_excludes(self):
+        matrix = sp.csr_matrix(np.array([[0.9, 0.5, 0.0, 0.7], [0.2, 0.0, 0.3, 0.0]]))
+        exclude = sp.csr_matrix(np.array([[1, 0, 0, 0], [0, 0, 0, 0]]))
+        rows = [(row, list(columns), list(scores)) for row, columns, scores in top_k_rows(matrix, 2, exclude=exclude)]
+        self.assertEqual(rows, [(0, [3, 1], [0.7, 0.5]), (1, [2, 0], [0.3, 0.2])])
+
+
+class TestRecommendations(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        teacher_id = self.fixtures['teacher']
+        titles = {
+            'algebra': ('Algebra', 'Equations, polynomials and functions.'),
+            'calculus': ('Calculus', 'Limits, derivatives and integrals of functions.'),
+            'poetry': ('Poetry', 'Reading and writing poems.'),
+            'novels': ('Novels', 'Reading the great novels.'),
+        }
+        self.courses = {name: Course(title=title, description=description, teacher_id=teacher_id)
+                        for name, (title, description) in titles.items()}
+        self.students = [User(username=f'pupil{i}', email=f'pupil{i}@example.com', password_hash='x') for i in range(4)]
+        db.session.add_all(list(self.courses.values()) + self.students)
+        db.session.commit()
+        # Students who take algebra also take calculus; poetry goes with novels.
+        for student in self.students[:3]:
+            enroll(student.id, self.courses['algebra'].id)
+        for student in self.students[:2]:
+            enroll(student.id, self.courses['calculus'].id)
+        enroll(self.students[3].id, self.courses['poetry'].id)
+        enroll(self.students[3].id, self.courses['novels'].id)
+
+    def neighbors(self, name):
+        return [course.title for course in similar_courses(self.courses[name].id, limit=10)]
+
+    def test_neighbors_follow_co_enrollment_and_text(self):
+        refresh_recommendations()
+        self.assertEqual(self.neighbors('algebra')[0], 'Calculus')
+        self.assertEqual(self.neighbors('poetry')[0], 'Novels')
+        self.assertNotIn('Algebra', self.neighbors('algebra'))
+
+    def test_quiz_attempts_count_as_interest(self):
+        lesson = Lesson(title='Sonnets', content='x', course=self.courses['poetry'])
+        quiz = Quiz(lesson=lesson)
+        db.session.add_all([lesson, quiz])
+        db.session.flush()
+        # Student 2 never enrolled in poetry but keeps taking its quiz.
+        db.session.add_all([QuizAttempt(user_id=self.students[2].id, quiz_id=quiz.id, score=1, total=1)
+                            for _ in range(3)])
+        db.session.commit()
+        refresh_recommendations()
+        self.assertIn('Novels', [course.title for course in recommended_courses(self.students[2].id)])
+
+    def test_student_recommendations_skip_their_courses(self):
+        refresh_recommendations()
+        student = self.students[2]  # algebra only
+        self.assertEqual([course.title for course in recommended_courses(student.id)][0], 'Calculus')
+
+        # Joining after the refresh hides the course straight away.
+        enroll(student.id, self.courses['calculus'].id)
+        self.assertNotIn('Calculus', [course.title for course in recommended_courses(student.id)])
+
+    def test_serving_is_one_query_each(self):
+        refresh_recommendations()
+        student_id, course_id = self.students[2].id, self.courses['algebra'].id
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            recommended_courses(student_id)
+            similar_courses(course_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(statements), 2)
+
+    def test_homepage_shows_recommendations(self):
+        refresh_recommendations()
+        self.login('pupil2@example.com', 'x')
+        response = self.client.get('/')
+        self.assertNotIn(b'Recommended for you', response.data)  # wrong password: logged out
+
+        db.session.get(User, self.students[2].id).set_password('password123')
+        db.session.commit()
+        self.login('pupil2@example.com')
+        response = self.client.get('/')
+        self.assertIn(b'Recommended for you', response.data)
+        response = self.client.get(f"/course/{self.courses['algebra'].id}")
+        self.assertIn(b'Similar courses', response.data)
+
+    def test_other_schools_are_never_neighbors(self):
+        school = Tenant(name='North High', slug='north', hostname='north.example.com')
+        db.session.add(school)
+        db.session.flush()
+        db.session.add(Course(title='Algebra', description='Equations, polynomials and functions.',
+                              teacher_id=self.fixtures['teacher'], tenant_id=school.id))
+        db.session.commit()
+        refresh_recommendations()
+        rows = CourseNeighbor.query.filter_by(course_id=self.courses['algebra'].id).all()
+        courses = db.session.execute(
+            db.select(Course.tenant_id).where(Course.id.in_([row.neighbor_id for row in rows])),
+            execution_options={'all_tenants': True},
+        ).scalars().all()
+        self.assertEqual(set(courses), {1})
+
+    def test_students_enrolled_at_another_school(self):
+        school = Tenant(name='North High', slug='north', hostname='north.example.com')
+        db.session.add(school)
+        db.session.flush()
+        geometry, trigonometry = [Course(title=title, description='Triangles, shapes and proofs.',
+                                         teacher_id=self.fixtures['teacher'], tenant_id=school.id)
+                                  for title in ('Geometry', 'Trigonometry')]
+        db.session.add_all([geometry, trigonometry])
+        db.session.flush()
+        lesson = Lesson(title='Triangles', content='x', course_id=geometry.id)
+        quiz = Quiz(lesson=lesson)
+        db.session.add_all([lesson, quiz])
+        db.session.flush()
+        # A default-school student who also joined a course at North High.
+        student_id = self.students[2].id
+        db.session.add_all([Enrollment(user_id=student_id, course_id=geometry.id),
+                            QuizAttempt(user_id=student_id, quiz_id=quiz.id, score=1, total=1)])
+        db.session.commit()
+        refresh_recommendations()
+        self.assertEqual([course.title for course in recommended_courses(student_id)][0], 'Calculus')
+        courses = db.session.execute(
+            db.select(Course.tenant_id).join(UserRecommendation, UserRecommendation.course_id == Course.id)
+            .where(UserRecommendation.user_id == student_id),
+            execution_options={'all_tenants': True},
+        ).scalars().all()
+        self.assertEqual(set(courses), {1})
+
+    def test_purge_removes_index_rows(self):
+        refresh_recommendations()
+        calculus = self.courses['calculus']
+        calculus_id = calculus.id
+        soft_delete_course(calculus)
+        db.session.commit()
+        self.assertNotIn('Calculus', self.neighbors('algebra'))
+        purge_course(calculus_id)
+        self.assertEqual(CourseNeighbor.query.filter(
+            (CourseNeighbor.course_id == calculus_id) | (CourseNeighbor.neighbor_id == calculus_id)).count(), 0)
+        self.assertEqual(UserRecommendation.query.filter_by(course_id=calculus_id).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,139 +1,78 @@
 import unittest
-from app import app, db
+from testing import DatabaseTestCase
+from app import app
 from models import User
-from forms import TeacherRegistrationForm
+from forms import RegistrationForm
 from werkzeug.security import check_password_hash
 
-class TestTeacherRegistration(unittest.TestCase):
-    def setUp(self):
-        app.config['TESTING'] = True
-        app.config['WTF_CSRF_ENABLED'] = False
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
-        self.client = app.test_client()
-        with app.app_context():
-            db.create_all()
-
-    def tearDown(self):
-        with app.app_context():
-            db.session.remove()
-            db.drop_all()
+class TestRegistration(DatabaseTestCase):
+    def registration(self, **fields):
+        data = {
+            'username': 'johndoe',
+            'email': 'john@example.com',
+            'password': 'secure_password',
+            'confirm_password': 'secure_password',
+        }
+        data.update(fields)
+        return data
 
     def test_form_validation_edge_cases(self):
-        with app.app_context():
+        with app.test_request_context(method='POST'):
             # Test very long inputs
-            form = TeacherRegistrationForm(
-                name='A' * 101,
-                email='a' * 100 + '@example.com',
-                password='A' * 101,
-                areas_of_expertise='A' * 1001,
-                preferred_subjects='A' * 1001
-            )
+            form = RegistrationForm(data=self.registration(username='A' * 21, email='not-an-email'))
+            self.assertFalse(form.validate())
+            self.assertIn('username', form.errors)
+            self.assertIn('email', form.errors)
+
+            # Test mismatched passwords
+            form = RegistrationForm(data=self.registration(confirm_password='different'))
             self.assertFalse(form.validate())
-            self.assertIn('name', form.errors)
-            self.assertIn('password', form.errors)
+            self.assertIn('confirm_password', form.errors)
 
             # Test special characters
-            form = TeacherRegistrationForm(
-                name='John @#$% Doe',
-                email='john@example.com',
-                password='secure_password',
-                areas_of_expertise='Math, Science!',
-                preferred_subjects='Algebra, Physics!'
-            )
+            form = RegistrationForm(data=self.registration(username='John @#$%'))
             self.assertTrue(form.validate())
 
     def test_successful_registration(self):
-        response = self.client.post('/register', data={
-            'name': 'John Doe',
-            'email': 'john@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Math, Science',
-            'preferred_subjects': 'Algebra, Physics'
-        }, follow_redirects=True)
-        self.assertIn(b'Registration successful!', response.data)
-        with app.app_context():
-            user = User.query.filter_by(email='john@example.com').first()
-            self.assertIsNotNone(user)
-            self.assertEqual(user.username, 'John Doe')
-            self.assertEqual(user.areas_of_expertise, 'Math, Science')
-            self.assertEqual(user.preferred_subjects, 'Algebra, Physics')
+        response = self.client.post('/register', data=self.registration(is_teacher='y'), follow_redirects=True)
+        self.assertIn(b'Your account has been created!', response.data)
+        user = User.query.filter_by(email='john@example.com').first()
+        self.assertIsNotNone(user)
+        self.assertEqual(user.username, 'johndoe')
+        self.assertTrue(user.is_teacher)
 
     def test_existing_email_registration(self):
-        # First registration
-        self.client.post('/register', data={
-            'name': 'John Doe',
-            'email': 'john@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Math, Science',
-            'preferred_subjects': 'Algebra, Physics'
-        })
-        # Second registration with the same email
-        response = self.client.post('/register', data={
-            'name': 'Jane Doe',
-            'email': 'john@example.com',
-            'password': 'another_password',
-            'areas_of_expertise': 'English, History',
-            'preferred_subjects': 'Literature, World History'
-        }, follow_redirects=True)
+        self.client.post('/register', data=self.registration())
+        response = self.client.post('/register', data=self.registration(username='janedoe'),
+                                    follow_redirects=True)
         self.assertIn(b'Email already registered', response.data)
 
     def test_password_hashing(self):
-        self.client.post('/register', data={
-            'name': 'Alice Smith',
-            'email': 'alice@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Art, Music',
-            'preferred_subjects': 'Painting, Piano'
-        })
-        with app.app_context():
-            user = User.query.filter_by(email='alice@example.com').first()
-            self.assertIsNotNone(user)
-            self.assertTrue(check_password_hash(user.password_hash, 'secure_password'))
-            self.assertFalse(check_password_hash(user.password_hash, 'wrong_password'))
+        self.client.post('/register', data=self.registration(email='alice@example.com'))
+        user = User.query.filter_by(email='alice@example.com').first()
+        self.assertIsNotNone(user)
+        self.assertTrue(check_password_hash(user.password_hash, 'secure_password'))
+        self.assertFalse(check_password_hash(user.password_hash, 'wrong_password'))
 
     def test_invalid_input_handling(self):
-        response = self.client.post('/register', data={
-            'name': '',
-            'email': 'invalid_email',
-            'password': 'short',
-            'areas_of_expertise': '',
-            'preferred_subjects': ''
-        }, follow_redirects=True)
-        self.assertIn(b'This field is required', response.data)
-        self.assertIn(b'Invalid email address', response.data)
-        self.assertIn(b'Field must be at least 6 characters long', response.data)
+        response = self.client.post('/register', data=self.registration(username='', email='invalid_email'),
+                                    follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Your account has been created!', response.data)
+        self.assertIsNone(User.query.filter_by(email='invalid_email').first())
 
     def test_flash_messages(self):
-        # Test successful registration flash message
-        response = self.client.post('/register', data={
-            'name': 'John Doe',
-            'email': 'john@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Math, Science',
-            'preferred_subjects': 'Algebra, Physics'
-        }, follow_redirects=True)
-        self.assertIn(b'Registration successful!', response.data)
+        response = self.client.post('/register', data=self.registration(), follow_redirects=True)
+        self.assertIn(b'Your account has been created!', response.data)
 
-        # Test unsuccessful registration flash message
-        response = self.client.post('/register', data={
-            'name': 'John Doe',
-            'email': 'john@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Math, Science',
-            'preferred_subjects': 'Algebra, Physics'
-        }, follow_redirects=True)
+        response = self.client.post('/register', data=self.registration(), follow_redirects=True)
         self.assertIn(b'Email already registered', response.data)
+        self.assertIn(b'That username is taken', response.data)
 
     def test_redirect_after_registration(self):
-        response = self.client.post('/register', data={
-            'name': 'John Doe',
-            'email': 'john@example.com',
-            'password': 'secure_password',
-            'areas_of_expertise': 'Math, Science',
-            'preferred_subjects': 'Algebra, Physics'
-        }, follow_redirects=False)
+        response = self.client.post('/register', data=self.registration(), follow_redirects=False)
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(response.location, '/')
+        self.assertEqual(response.location, '/login')
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from flask import g
+from testing import DatabaseTestCase
+from app import app, db
+from models import ServerSession
+from session_store import LRUCache, SQLSessionStore, ServerSideSessionInterface
+
+class CountingStore(SQLSessionStore):
+    def __init__(self):
+        self.reads = 0
+
+    def get(self, sid):
+        self.reads += 1
+        return super().get(sid)
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction_and_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        expiring = LRUCache(maxsize=2, ttl=0.01)
+        expiring.set('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(expiring.get('a'))
+
+class TestServerSideSessions(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_interface = app.session_interface
+        self.store = CountingStore()
+        app.session_interface = ServerSideSessionInterface(self.store, LRUCache(ttl=60))
+
+    def tearDown(self):
+        app.session_interface = self.original_interface
+        super().tearDown()
+
+    def login(self):
+        return super().login('student@example.com')
+
+    def test_cookie_holds_only_session_id(self):
+        self.login()
+        cookie = self.client.get_cookie('session')
+        self.assertIsNotNone(cookie)
+        self.assertLess(len(cookie.value), 64)
+        self.assertEqual(ServerSession.query.count(), 1)
+        self.assertEqual(self.client.get('/profile').status_code, 200)
+
+    def anonymous_session(self):
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('message', 'Welcome')]
+        return self.client.get_cookie('session').value
+
+    def test_cached_session_skips_store(self):
+        sid = self.anonymous_session()
+        app.session_interface.load(sid)
+        app.session_interface.load(sid)
+        self.assertEqual(self.store.reads, 0)
+
+    def test_cache_hit_skips_deserializing(self):
+        sid = self.anonymous_session()
+        serializer = mock.Mock(wraps=app.session_interface.serializer)
+        with mock.patch.object(app.session_interface, 'serializer', serializer):
+            app.session_interface.load(sid)
+        serializer.loads.assert_not_called()
+
+    def test_cached_copy_is_not_changed_by_the_request(self):
+        sid = self.anonymous_session()
+        data, _ = app.session_interface.load(sid)
+        data['_flashes'].append(('message', 'Unsaved'))
+        self.assertEqual(app.session_interface.load(sid)[0]['_flashes'], [('message', 'Welcome')])
+
+    def test_logged_in_sessions_are_not_cached(self):
+        self.login()
+        sid = self.client.get_cookie('session').value
+        reads = self.store.reads
+        self.client.get('/profile')
+        self.assertEqual(self.store.reads, reads + 1)
+
+        # Logging out on another worker (with its own cache) is seen at once.
+        other_worker = ServerSideSessionInterface(self.store, LRUCache(ttl=60))
+        other_worker.discard(sid)
+        g.pop('_login_user', None)  # the test's app context outlives the request
+        self.assertEqual(self.client.get('/profile').status_code, 302)
+
+    def test_login_and_logout_rotate_session_id(self):
+        self.client.get('/profile')  # anonymous session holding the login flash
+        planted = self.client.get_cookie('session').value
+        self.login()
+        sid = self.client.get_cookie('session').value
+        self.assertNotEqual(sid, planted)
+        self.assertIsNone(db.session.get(ServerSession, planted))
+        self.assertIsNone(app.session_interface.load(planted))
+
+        self.client.get('/logout')
+        self.assertIsNone(db.session.get(ServerSession, sid))
+        self.client.set_cookie('session', sid)
+        self.assertEqual(self.client.get('/profile').status_code, 302)
+
+    def test_untouched_session_is_not_loaded(self):
+        self.login()
+        reads = self.store.reads
+        self.client.get('/static/css/custom.css')
+        self.assertEqual(self.store.reads, reads)
+
+    def test_logout_removes_session(self):
+        self.login()
+        self.client.get('/logout')
+        self.assertEqual(self.client.get('/profile').status_code, 302)
+
+    def test_sweep_expired(self):
+        past = datetime.utcnow() - timedelta(minutes=1)
+        db.session.add_all([ServerSession(id=f'old{i}', data='{}', expires_at=past) for i in range(5)])
+        db.session.add(ServerSession(id='fresh', data='{}', expires_at=datetime.utcnow() + timedelta(days=1)))
+        db.session.commit()
+        self.assertEqual(self.store.sweep_expired(batch_size=2), 5)
+        self.assertEqual([row.id for row in ServerSession.query.all()], ['fresh'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime, timedelta
+from testing import DatabaseTestCase
+from app import db
+from models import Task
+from task_queue import task, enqueue, claim, run_task, run_pending, retry_delay
+
+calls = []
+
+@task('test_record')
+def record(value):
+    calls.append(value)
+
+@task('test_flaky', max_attempts=2)
+def flaky():
+    raise RuntimeError('boom')
+
+class TestTaskQueue(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_runs_in_priority_order(self):
+        enqueue('test_record', {'value': 'low'}, priority=0)
+        enqueue('test_record', {'value': 'high'}, priority=10)
+        db.session.commit()
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual({t.status for t in Task.query.all()}, {'done'})
+
+    def test_delayed_task_is_not_visible(self):
+        enqueue('test_record', {'value': 'later'}, delay=3600)
+        db.session.commit()
+        self.assertIsNone(claim('worker-1'))
+
+    def test_claimed_task_is_hidden_until_lease_expires(self):
+        enqueue('test_record', {'value': 'once'})
+        db.session.commit()
+        self.assertIsNotNone(claim('worker-1'))
+        self.assertIsNone(claim('worker-2'))
+
+        Task.query.update({Task.visible_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        row = claim('worker-2')
+        self.assertEqual(row.attempts, 2)
+
+    def test_task_that_kills_its_worker_stops_being_retried(self):
+        enqueue('test_record', {'value': 'fatal'}, max_attempts=2)
+        db.session.commit()
+        for attempt in range(2):
+            # Claimed, then the worker dies: only the lease expiring tells.
+            self.assertIsNotNone(claim('worker-1'))
+            Task.query.update({Task.visible_at: datetime.utcnow() - timedelta(seconds=1)})
+            db.session.commit()
+        self.assertIsNone(claim('worker-2'))
+        queued = Task.query.one()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_expired_lease_cannot_record_a_result(self):
+        enqueue('test_record', {'value': 'slow'})
+        db.session.commit()
+        stale = claim('worker-1')
+        Task.query.update({Task.visible_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        current = claim('worker-2')
+
+        self.assertFalse(run_task(stale))
+        self.assertEqual(Task.query.one().status, 'queued')
+        self.assertTrue(run_task(current))
+        self.assertEqual(Task.query.one().status, 'done')
+
+    def test_failures_back_off_then_fail(self):
+        enqueue('test_flaky')
+        db.session.commit()
+        self.assertFalse(run_task(claim('worker-1')))
+        queued = Task.query.one()
+        self.assertEqual(queued.status, 'queued')
+        self.assertGreater(queued.visible_at, datetime.utcnow())
+        self.assertIn('boom', queued.last_error)
+
+        Task.query.update({Task.visible_at: datetime.utcnow()})
+        db.session.commit()
+        self.assertFalse(run_task(claim('worker-1')))
+        db.session.expire_all()
+        self.assertEqual(Task.query.one().status, 'failed')
+
+    def test_unknown_task_fails_immediately(self):
+        enqueue('no_such_task')
+        db.session.commit()
+        run_pending()
+        self.assertEqual(Task.query.one().status, 'failed')
+
+    def test_retry_delay_grows_and_is_capped(self):
+        self.assertLess(retry_delay(1, base=10, cap=100), retry_delay(3, base=10, cap=100))
+        self.assertLessEqual(retry_delay(20, base=10, cap=100), 120)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from flask import g
+from sqlalchemy import event
+from testing import DatabaseTestCase, FIXTURE_PASSWORD
+from app import app, db
+from models import User, Course, Tenant
+from enrollment import bulk_enroll
+from tenancy import load_tenant
+from werkzeug.security import generate_password_hash
+
+
+class SchoolClient:
+    """Test client whose requests all go to one school's host."""
+
+    def __init__(self, app, host):
+        self.client = app.test_client()
+        self.host = host
+
+    def get(self, path, **kwargs):
+        return self.client.get(path, base_url=f'http://{self.host}', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.client.post(path, base_url=f'http://{self.host}', **kwargs)
+
+
+class TestTenancy(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = Tenant(name='North High', slug='north', hostname='north.example.com')
+        self.south = Tenant(name='South High', slug='south', hostname='south.example.com')
+        db.session.add_all([self.north, self.south])
+        db.session.flush()
+        self.north_teacher = self.make_user('north', self.north)
+        self.south_teacher = self.make_user('south', self.south)
+        db.session.add_all([
+            Course(title='North Algebra', description='x', teacher=self.north_teacher, tenant_id=self.north.id),
+            Course(title='South Biology', description='x', teacher=self.south_teacher, tenant_id=self.south.id),
+        ])
+        db.session.commit()
+        self.north_client = SchoolClient(app, 'north.example.com')
+        self.south_client = SchoolClient(app, 'south.example.com')
+
+    def make_user(self, name, tenant):
+        user = User(username=name, email=f'{name}@example.com', tenant_id=tenant.id, is_teacher=True,
+                    password_hash=generate_password_hash(FIXTURE_PASSWORD))
+        db.session.add(user)
+        return user
+
+    def login_at(self, client, email):
+        return client.post('/login', data=dict(email=email, password=FIXTURE_PASSWORD), follow_redirects=True)
+
+    def test_catalog_only_lists_own_school(self):
+        response = self.north_client.get('/courses')
+        self.assertIn(b'North Algebra', response.data)
+        self.assertNotIn(b'South Biology', response.data)
+
+    def test_other_schools_course_is_not_found(self):
+        south_course = Course.query.filter_by(title='South Biology').one()
+        self.assertEqual(self.north_client.get(f'/course/{south_course.id}').status_code, 404)
+        self.assertEqual(self.south_client.get(f'/course/{south_course.id}').status_code, 200)
+
+    def test_users_can_only_log_in_at_their_school(self):
+        self.assertIn(b'Login Unsuccessful', self.login_at(self.north_client, 'south@example.com').data)
+        self.assertNotIn(b'Login Unsuccessful', self.login_at(self.south_client, 'south@example.com').data)
+
+    def test_new_rows_belong_to_the_request_tenant(self):
+        self.north_client.post('/register', data=dict(
+            username='pupil', email='pupil@example.com', password='pw', confirm_password='pw'))
+        self.assertEqual(User.query.filter_by(email='pupil@example.com').one().tenant_id, self.north.id)
+        self.login_at(self.north_client, 'north@example.com')
+        self.north_client.post('/create_course', data=dict(title='North Chemistry', description='x'))
+        self.assertEqual(Course.query.filter_by(title='North Chemistry').one().tenant_id, self.north.id)
+
+    def test_session_is_not_valid_at_another_school(self):
+        self.login_at(self.north_client, 'north@example.com')
+        sid = self.north_client.client.get_cookie('session', domain='north.example.com').value
+        with app.test_request_context('/', base_url='http://north.example.com'):
+            load_tenant()
+            self.assertIsNotNone(app.session_interface.load(sid))
+        with app.test_request_context('/', base_url='http://south.example.com'):
+            load_tenant()
+            self.assertIsNone(app.session_interface.load(sid))
+
+    def test_hostnames_are_cached_until_a_school_changes(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            self.north_client.get('/courses')
+            self.south_client.get('/courses')
+            self.north_client.get('/static/css/custom.css')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len([s for s in statements if 'FROM tenant' in s]), 1)
+
+        east = Tenant(name='East High', slug='east', hostname='east.example.com')
+        db.session.add(east)
+        db.session.commit()
+        with app.test_request_context('/', base_url='http://east.example.com'):
+            load_tenant()
+            self.assertEqual(g.tenant_id, east.id)
+
+    def test_unscoped_outside_requests(self):
+        # Both schools' courses, plus the fixture course of the default one.
+        self.assertEqual(Course.query.count(), 3)
+
+    def test_bulk_enroll_skips_other_schools(self):
+        north_course = Course.query.filter_by(title='North Algebra').one()
+        created = bulk_enroll(north_course.id, [self.north_teacher.id, self.south_teacher.id])
+        self.assertEqual(created, 1)
+
+if __name__ == '__main__':
+    unittest.main()
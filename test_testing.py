@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+import testing
+from testing import DatabaseTestCase, FIXTURES
+from app import db
+from models import User, Course, ServerSession
+
+
+class TestDatabaseIsolation(DatabaseTestCase):
+    # Tests run in name order; the later ones check what the earlier left.
+    def test_1_fixtures_are_seeded(self):
+        self.assertEqual(set(self.fixtures), set(FIXTURES) | {'course'})
+        course = db.session.get(Course, self.fixtures['course'])
+        self.assertEqual(course.teacher_id, self.fixtures['teacher'])
+        self.assertTrue(db.session.get(User, self.fixtures['admin']).is_admin)
+
+    def test_2_writes_commit(self):
+        db.session.add(User(username='scratch', email='scratch@example.com', password_hash='x'))
+        db.session.commit()
+        response = self.login('student@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ServerSession.query.count(), 1)
+
+    def test_3_writes_are_gone(self):
+        self.assertIsNone(User.query.filter_by(email='scratch@example.com').first())
+        self.assertEqual(ServerSession.query.count(), 0)
+
+    def test_4_reads_do_not_restore(self):
+        with mock.patch.object(testing, 'clone_database') as clone:
+            self.tearDown()
+            super().setUp()
+        clone.assert_not_called()
+
+    def test_5_template_is_not_rebuilt(self):
+        with mock.patch.object(testing, 'seed_fixtures') as seed:
+            db.session.add(User(username='scratch', email='scratch@example.com', password_hash='x'))
+            db.session.commit()
+            self.tearDown()
+            super().setUp()
+        seed.assert_not_called()
+        self.assertIsNone(User.query.filter_by(email='scratch@example.com').first())
+
+    def test_database_is_not_the_app_default(self):
+        self.assertEqual(db.engine.url.render_as_string(), testing.database_url(f'worker{testing.os.getpid()}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
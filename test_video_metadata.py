@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from testing import DatabaseTestCase
+from app import db
+from models import Course, Lesson
+import jobs
+from task_queue import run_pending
+from video_metadata import DiskCache, OEmbedFetcher, format_duration
+
+
+class StubOEmbedHandler(BaseHTTPRequestHandler):
+    """Answers /oembed?url=... from the server's ``responses`` dict."""
+
+    def do_GET(self):
+        url = parse_qs(urlparse(self.path).query)['url'][0]
+        self.server.requests.append(url)
+        status, body, delay = self.server.responses.get(url, (404, {}, 0))
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerMixin:
+    def start_stub(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOEmbedHandler)
+        self.server.requests = []
+        self.server.responses = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.providers = [(re.compile(r'^https://videos\.example/'), f'http://127.0.0.1:{self.server.server_port}/oembed')]
+
+    def make_fetcher(self, **kwargs):
+        kwargs.setdefault('cache', DiskCache(self.cache_dir))
+        return OEmbedFetcher(providers=self.providers, **kwargs)
+
+
+class TestOEmbedFetcher(StubServerMixin, unittest.TestCase):
+    def setUp(self):
+        self.start_stub()
+
+    def test_fetch_parses_and_caches(self):
+        url = 'https://videos.example/intro'
+        self.server.responses[url] = (200, {'title': 'Intro', 'duration': 125, 'thumbnail_url': 'https://img.example/1.jpg'}, 0)
+        metadata = self.make_fetcher().fetch(url)
+        self.assertEqual(metadata['title'], 'Intro')
+        self.assertEqual(metadata['duration'], 125)
+        self.assertEqual(metadata['thumbnail_url'], 'https://img.example/1.jpg')
+        # A fresh fetcher (another process) reads the on-disk cache.
+        self.assertEqual(self.make_fetcher().fetch(url), metadata)
+        self.assertEqual(self.server.requests, [url])
+
+    def test_missing_video_is_cached_as_empty(self):
+        fetcher = self.make_fetcher()
+        self.assertEqual(fetcher.fetch('https://videos.example/gone'), {})
+        self.assertEqual(fetcher.fetch('https://videos.example/gone'), {})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_malformed_responses_mean_no_metadata(self):
+        fetcher = self.make_fetcher(cache=None)
+        self.server.responses['https://videos.example/list'] = (200, ['Intro'], 0)
+        self.assertEqual(fetcher.fetch('https://videos.example/list'), {})
+        self.server.responses['https://videos.example/odd'] = (
+            200, {'title': ['Intro'], 'duration': '125', 'thumbnail_url': 7, 'provider_name': {}}, 0)
+        self.assertEqual(fetcher.fetch('https://videos.example/odd'),
+                         {'title': None, 'duration': None, 'thumbnail_url': None, 'provider': None})
+
+    def test_failed_cache_write_leaves_no_temp_file(self):
+        with self.assertRaises(TypeError):
+            DiskCache(self.cache_dir).set('key', {'not json': object()})
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_unknown_provider_makes_no_request(self):
+        self.assertEqual(self.make_fetcher().fetch('https://elsewhere.example/v'), {})
+        self.assertEqual(self.server.requests, [])
+
+    def test_transient_errors_raise_and_are_not_cached(self):
+        url = 'https://videos.example/flaky'
+        self.server.responses[url] = (503, {}, 0)
+        fetcher = self.make_fetcher()
+        with self.assertRaises(Exception):
+            fetcher.fetch(url)
+        self.server.responses[url] = (200, {'title': 'Back'}, 0)
+        self.assertEqual(fetcher.fetch(url)['title'], 'Back')
+
+    def test_timeout(self):
+        url = 'https://videos.example/slow'
+        self.server.responses[url] = (200, {'title': 'Slow'}, 1)
+        with self.assertRaises(Exception):
+            self.make_fetcher(timeout=0.2).fetch(url)
+
+    def test_concurrency_limit(self):
+        urls = [f'https://videos.example/{i}' for i in range(4)]
+        for url in urls:
+            self.server.responses[url] = (200, {'title': url}, 0.2)
+        fetcher = self.make_fetcher(cache=None, max_concurrency=1)
+        threads = [threading.Thread(target=fetcher.fetch, args=(url,)) for url in urls]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 0.8)
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(65), '1:05')
+        self.assertEqual(format_duration(3725), '1:02:05')
+        self.assertEqual(format_duration(None), '')
+
+
+class TestLessonVideoMetadata(StubServerMixin, DatabaseTestCase):
+    def setUp(self):
+        self.start_stub()
+        jobs._video_fetcher = self.make_fetcher()
+        self.addCleanup(setattr, jobs, '_video_fetcher', None)
+        super().setUp()
+        self.course = db.session.get(Course, self.fixtures['course'])
+
+    def test_metadata_is_fetched_in_the_background(self):
+        url = 'https://videos.example/intro'
+        self.server.responses[url] = (200, {'title': 'Lights, camera', 'duration': 90, 'thumbnail_url': 'https://img.example/1.jpg'}, 0)
+        self.login('teacher@example.com')
+        self.client.post(f'/course/{self.course.id}/create_lesson', data={
+            'title': 'Intro', 'content': 'Watch this', 'video_link': url,
+        }, follow_redirects=True)
+        lesson = Lesson.query.one()
+        self.assertEqual(self.server.requests, [])
+        self.assertIsNone(lesson.video_title)
+
+        self.assertEqual(run_pending(), 1)
+        db.session.refresh(lesson)
+        self.assertEqual(lesson.video_title, 'Lights, camera')
+        self.assertEqual(lesson.video_duration, 90)
+        response = self.client.get(f'/lesson/{lesson.id}')
+        self.assertIn(b'Lights, camera', response.data)
+        self.assertIn(b'1:30', response.data)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_changing_the_link_discards_old_metadata(self):
+        old, new = 'https://videos.example/old', 'https://videos.example/new'
+        self.server.responses[new] = (200, {'title': 'New cut'}, 0)
+        lesson = Lesson(title='Intro', content='Text', course=self.course, video_link=old, video_title='Old cut')
+        db.session.add(lesson)
+        db.session.commit()
+        self.login('teacher@example.com')
+        self.client.post(f'/lesson/{lesson.id}/edit', data={
+            'title': 'Intro', 'content': 'Text', 'video_link': new,
+        }, follow_redirects=True)
+        db.session.refresh(lesson)
+        self.assertIsNone(lesson.video_title)
+        run_pending()
+        db.session.refresh(lesson)
+        self.assertEqual(lesson.video_title, 'New cut')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+"""Isolated databases for the test suite.
+
+The schema and the shared fixtures (FIXTURES) are built once into a template
+database. Every test process works in its own clone of the template, chosen
+through DATABASE_URL before app.py creates the engine, so this module must
+be imported before ``app`` (every test module does so first).
+
+``DatabaseTestCase`` puts the clone back to the template before any test
+that follows a write. Writes are noticed at the engine, so they are caught
+whether they went through db.session or through a connection of their own
+(the SQL session store commits on one). Tests may therefore commit freely,
+and none of them rebuilds the schema.
+
+run_tests.py builds the template once and spreads the test classes over one
+worker process per core. Anything else (``python -m unittest test_login``)
+builds a private template the first time it needs one.
+
+SQLite clones are file copies; on PostgreSQL (TEST_DATABASE_URL) they are
+``CREATE DATABASE ... TEMPLATE``, which copies at the file level too.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TEST_DB_DIR = os.environ.get('TEST_DB_DIR') or os.path.join(tempfile.gettempdir(), 'eduplatform-tests')
+# Set by run_tests.py once the template is built, for the workers to clone.
+TEMPLATE_ENV = 'TEST_TEMPLATE_DATABASE_URL'
+
+# Rows every test starts with; the password of each user is 'password123'.
+FIXTURES = {
+    'teacher': {'username': 'fixture_teacher', 'email': 'teacher@example.com', 'is_teacher': True},
+    'student': {'username': 'fixture_student', 'email': 'student@example.com', 'is_teacher': False},
+    'admin': {'username': 'fixture_admin', 'email': 'admin@example.com', 'is_teacher': True, 'is_admin': True},
+}
+FIXTURE_PASSWORD = 'password123'
+FIXTURE_COURSE = {'title': 'Fixture Course', 'description': 'Seeded for every test.'}
+
+
+def database_url(name):
+    """URL of the test database ``name``: TEST_DATABASE_URL with its database
+    name replaced, or a SQLite file in TEST_DB_DIR."""
+    from sqlalchemy.engine import make_url
+    base = os.environ.get('TEST_DATABASE_URL')
+    if base:
+        return make_url(base).set(database=f'{make_url(base).database}_{name}').render_as_string(hide_password=False)
+    os.makedirs(TEST_DB_DIR, exist_ok=True)
+    return 'sqlite:///' + os.path.join(TEST_DB_DIR, f'{name}.db')
+
+
+def _admin_engine(url):
+    # CREATE/DROP DATABASE cannot run in a transaction or connected to the
+    # database concerned.
+    import sqlalchemy as sa
+    return sa.create_engine(sa.engine.make_url(url).set(database='postgres'),
+                            isolation_level='AUTOCOMMIT', poolclass=sa.pool.NullPool)
+
+
+def create_database(url):
+    from sqlalchemy.engine import make_url
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return  # created on first connect
+    import sqlalchemy as sa
+    engine = _admin_engine(url)
+    with engine.connect() as connection:
+        connection.execute(sa.text(f'CREATE DATABASE "{url.database}"'))
+    engine.dispose()
+
+
+def drop_database(url):
+    from sqlalchemy.engine import make_url
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        if url.database and os.path.exists(url.database):
+            os.remove(url.database)
+        return
+    import sqlalchemy as sa
+    engine = _admin_engine(url)
+    with engine.connect() as connection:
+        connection.execute(sa.text(f'DROP DATABASE IF EXISTS "{url.database}" WITH (FORCE)'))
+    engine.dispose()
+
+
+def clone_database(template_url, url):
+    """Replace the database at ``url`` with a copy of the template."""
+    from sqlalchemy.engine import make_url
+    template_url, url = make_url(template_url), make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        tmp_path = url.database + '.tmp'
+        shutil.copyfile(template_url.database, tmp_path)
+        os.replace(tmp_path, url.database)
+        return
+    import sqlalchemy as sa
+    drop_database(url)
+    engine = _admin_engine(url)
+    with engine.connect() as connection:
+        connection.execute(sa.text(f'CREATE DATABASE "{url.database}" TEMPLATE "{template_url.database}"'))
+    engine.dispose()
+
+
+def seed_fixtures():
+    """Create the schema and FIXTURES in the app's database."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from models import User, Course
+    from tenancy import ensure_default_tenant
+    db.create_all()
+    ensure_default_tenant()
+    password_hash = generate_password_hash(FIXTURE_PASSWORD)
+    users = {name: User(password_hash=password_hash, **fields) for name, fields in FIXTURES.items()}
+    db.session.add_all(users.values())
+    db.session.add(Course(teacher=users['teacher'], **FIXTURE_COURSE))
+    db.session.commit()
+    db.session.remove()
+
+
+class _Clone:
+    """This process's database, and whether anything wrote to it since it
+    was last copied from the template."""
+
+    def __init__(self):
+        self.url = database_url(f'worker{os.getpid()}')
+        self.template_url = os.environ.get(TEMPLATE_ENV)
+        self.private_template = False
+        self.engine = None
+        self.dirty = True
+
+    def listen(self, engine):
+        from sqlalchemy import event
+        if engine is self.engine:
+            return
+        self.engine = engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def note_write(connection, cursor, statement, parameters, context, executemany):
+            if not self.dirty and statement.lstrip()[:6].upper() not in ('SELECT', 'PRAGMA'):
+                self.dirty = True
+
+    def restore(self):
+        if not self.dirty:
+            return
+        self.engine.dispose()
+        if self.template_url is None:
+            # Not started by run_tests.py: seed a template of our own, once.
+            drop_database(self.url)
+            create_database(self.url)
+            seed_fixtures()
+            self.engine.dispose()
+            self.template_url = database_url(f'template{os.getpid()}')
+            self.private_template = True
+            clone_database(self.url, self.template_url)
+        else:
+            clone_database(self.template_url, self.url)
+        self.dirty = False
+
+    def drop(self):
+        if self.engine is not None:
+            self.engine.dispose()
+        drop_database(self.url)
+        if self.private_template:
+            drop_database(self.template_url)
+
+
+def build_template():
+    """Seed the template now; returns its URL, for other processes to clone
+    (see TEMPLATE_ENV)."""
+    from app import app, db
+    with app.app_context():
+        _clone.listen(db.engine)
+        _clone.restore()
+    return _clone.template_url
+
+
+if 'app' in sys.modules:
+    raise RuntimeError('import testing before app, so tests get a database of their own')
+_clone = _Clone()
+os.environ['DATABASE_URL'] = _clone.url
+atexit.register(_clone.drop)
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """A test with an app context and a database holding only FIXTURES.
+
+    ``self.fixtures`` maps the FIXTURES names (and 'course') to row ids.
+    """
+
+    def setUp(self):
+        from app import app, db
+        from models import User, Course
+        from tenancy import forget_tenant_hostnames
+        self.app = app
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        _clone.listen(db.engine)
+        _clone.restore()
+        forget_tenant_hostnames()  # the restore may have dropped schools
+        self.fixtures = {
+            name: db.session.scalar(db.select(User.id).filter_by(email=fields['email']))
+            for name, fields in FIXTURES.items()
+        }
+        self.fixtures['course'] = db.session.scalar(db.select(Course.id).filter_by(title=FIXTURE_COURSE['title']))
+
+    def tearDown(self):
+        from app import db
+        db.session.remove()
+        self.app_context.pop()
+
+    def login(self, email, password=FIXTURE_PASSWORD):
+        return self.client.post('/login', data=dict(email=email, password=password), follow_redirects=True)
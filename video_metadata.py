@@ -0,0 +1,136 @@
+import hashlib
+import importlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# (URL pattern, oEmbed endpoint) pairs; the first match wins.
+PROVIDERS = [
+    (re.compile(r'^https?://(www\.|m\.)?(youtube\.com/(watch|shorts|embed)|youtu\.be/)'), 'https://www.youtube.com/oembed'),
+    (re.compile(r'^https?://(www\.|player\.)?vimeo\.com/'), 'https://vimeo.com/api/oembed.json'),
+]
+
+# Responses that will not change on retry; cached as "no metadata".
+PERMANENT_HTTP_ERRORS = {400, 401, 403, 404, 501}
+
+
+class DiskCache:
+    """JSON files named after the SHA-256 of the key, expiring after ``ttl`` seconds."""
+
+    def __init__(self, directory, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            # Only still there if the write or the rename failed.
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+class OEmbedFetcher:
+    """Resolve video URLs to title/duration/thumbnail through oEmbed.
+
+    At most ``max_concurrency`` requests are in flight per process, each
+    bounded by ``timeout`` seconds; results (including permanent misses)
+    are kept in ``cache``.
+    """
+
+    def __init__(self, cache=None, timeout=5, max_concurrency=4, providers=None):
+        self.cache = cache
+        self.timeout = timeout
+        self.providers = PROVIDERS if providers is None else providers
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def endpoint_for(self, url):
+        for pattern, endpoint in self.providers:
+            if pattern.match(url):
+                return endpoint
+        return None
+
+    def fetch(self, url):
+        """Return a metadata dict, ``{}`` if none is available, or raise on
+        transient failures (timeouts, 5xx) so the caller can retry."""
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached
+        endpoint = self.endpoint_for(url)
+        metadata = self._request(endpoint, url) if endpoint else {}
+        if self.cache is not None:
+            self.cache.set(url, metadata)
+        return metadata
+
+    def _request(self, endpoint, url):
+        query = urllib.parse.urlencode({'url': url, 'format': 'json'})
+        request = urllib.request.Request(f'{endpoint}?{query}', headers={'Accept': 'application/json'})
+        with self._slots:
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    data = json.load(response)
+            except urllib.error.HTTPError as e:
+                if e.code in PERMANENT_HTTP_ERRORS:
+                    return {}
+                raise
+        if not isinstance(data, dict):
+            return {}
+        duration = data.get('duration')
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)) or not math.isfinite(duration):
+            duration = None
+        return {
+            'title': _string(data, 'title', 255),
+            'duration': None if duration is None else int(duration),
+            'thumbnail_url': _string(data, 'thumbnail_url', 500),
+            'provider': _string(data, 'provider_name', 255),
+        }
+
+
+def _string(data, key, limit):
+    # Providers are not trusted to send the types the oEmbed spec asks for.
+    value = data.get(key)
+    return (value[:limit] or None) if isinstance(value, str) else None
+
+
+def load_fetcher(config):
+    """Build the fetcher named by VIDEO_METADATA_FETCHER ("module:Class")."""
+    module_name, _, class_name = config['VIDEO_METADATA_FETCHER'].partition(':')
+    fetcher_class = getattr(importlib.import_module(module_name), class_name)
+    return fetcher_class(
+        cache=DiskCache(config['VIDEO_METADATA_CACHE_DIR'], ttl=config['VIDEO_METADATA_CACHE_TTL']),
+        timeout=config['VIDEO_METADATA_TIMEOUT'],
+        max_concurrency=config['VIDEO_METADATA_CONCURRENCY'],
+    )
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return ''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}'